@@ -1,2 +1,27 @@
 def main() -> None:
-    print("Hello from rag!")
+    """
+    Serve the HTTP API (rag.api) with uvicorn.
+    """
+    import argparse
+
+    import uvicorn
+
+    from rag.settings import settings
+
+    parser = argparse.ArgumentParser(description="RAG Assistant HTTP service")
+    parser.add_argument("--host", default=settings.API_HOST)
+    parser.add_argument("--port", type=int, default=settings.API_PORT)
+    parser.add_argument("--workers", type=int, default=settings.API_WORKERS)
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        from rag.retrievers.context import RetrievalContext
+
+        # Build the persisted indexes once, before the workers start:
+        # each worker then only memory-maps them (builds are also
+        # serialized by a file lock; see sparse_bm25.index_lock)
+        print("Preparing retrieval indexes...")
+        RetrievalContext()
+
+    # Import string so every worker process builds its own app
+    uvicorn.run("rag.api:app", host=args.host, port=args.port, workers=args.workers)
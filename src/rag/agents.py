@@ -1,9 +1,19 @@
-from typing import Optional, Dict, Any
+import logging
+import time
+from typing import Optional, Dict, Any, AsyncIterator, Iterator, List, Sequence
 
-from langchain_openai import ChatOpenAI
+from langchain_core.language_models.chat_models import BaseChatModel
 
+from rag import metrics
 from rag.settings import settings
+from rag.llm import get_llm
+from rag.cache import LRUCache
 from rag.rag_pipeline import RAGPipeline
+from rag.routing import CentroidClassifier, normalize_query
+from rag.singleflight import SingleFlight
+
+
+logger = logging.getLogger(__name__)
 
 
 
@@ -14,9 +24,13 @@ class BaseAgent:
     with an optional category constraint.
     """
 
-    def __init__(self, category: Optional[str] = None):
+    def __init__(
+        self,
+        category: Optional[str] = None,
+        rag: Optional[RAGPipeline] = None
+    ):
         self.category = category
-        self.rag = RAGPipeline()
+        self.rag = rag or RAGPipeline()
 
     def run(self, query: str) -> Dict[str, Any]:
         return self.rag.run(
@@ -24,51 +38,94 @@ class BaseAgent:
             category=self.category
         )
 
+    async def arun(self, query: str) -> Dict[str, Any]:
+        return await self.rag.arun(
+            query=query,
+            category=self.category
+        )
+
+    def stream(self, query: str) -> Iterator[Dict[str, Any]]:
+        return self.rag.stream(
+            query=query,
+            category=self.category
+        )
+
+    def astream(self, query: str) -> AsyncIterator[Dict[str, Any]]:
+        return self.rag.astream(
+            query=query,
+            category=self.category
+        )
+
 
 
 # Domain Agents
 class PolicyAgent(BaseAgent):
-    def __init__(self):
-        super().__init__(category="policies")
+    def __init__(self, rag: Optional[RAGPipeline] = None):
+        super().__init__(category="policies", rag=rag)
 
 
 class MedicalAgent(BaseAgent):
-    def __init__(self):
-        super().__init__(category="medical")
+    def __init__(self, rag: Optional[RAGPipeline] = None):
+        super().__init__(category="medical", rag=rag)
 
 
 class DeviceAgent(BaseAgent):
-    def __init__(self):
-        super().__init__(category="device")
+    def __init__(self, rag: Optional[RAGPipeline] = None):
+        super().__init__(category="device", rag=rag)
 
 
 class MembershipAgent(BaseAgent):
-    def __init__(self):
-        super().__init__(category="membership")
+    def __init__(self, rag: Optional[RAGPipeline] = None):
+        super().__init__(category="membership", rag=rag)
 
 
 # Router
 class QueryRouter:
     """
     Routes a query to the appropriate domain agent.
+
+    Modes (settings.ROUTER_MODE):
+    - "llm": classify every query with the chat model
+    - "centroid": classify locally against per-category embedding
+      centroids, falling back to the LLM below ROUTER_CONFIDENCE
+    Recent decisions are kept in an LRU cache in both modes.
     """
 
-    def __init__(self):
-        self.llm = ChatOpenAI(
-            model=settings.MODEL_NAME,
-            temperature=0,
-            api_key=settings.OPENAI_API_KEY
-        )
+    def __init__(
+        self,
+        rag: Optional[RAGPipeline] = None,
+        llm: Optional[BaseChatModel] = None
+    ):
+        self.llm = llm or get_llm()
+
+        # All agents borrow one pipeline (and its shared retrieval context);
+        # they only differ in category constraints
+        rag = rag or RAGPipeline()
 
         self.agents = {
-            "policies": PolicyAgent(),
-            "medical": MedicalAgent(),
-            "device": DeviceAgent(),
-            "membership": MembershipAgent(),
+            "policies": PolicyAgent(rag=rag),
+            "medical": MedicalAgent(rag=rag),
+            "device": DeviceAgent(rag=rag),
+            "membership": MembershipAgent(rag=rag),
         }
 
-    def route(self, query: str) -> Optional[BaseAgent]:
-        prompt = f"""
+        self.cache = LRUCache(maxsize=settings.ROUTER_CACHE_SIZE)
+        metrics.register_collector("router_cache", self.cache.stats)
+        self.classifier: Optional[CentroidClassifier] = None
+
+        if settings.ROUTER_MODE == "centroid":
+            try:
+                self.classifier = CentroidClassifier.from_vectorstore(
+                    rag.retriever.vectorstore,
+                    categories=self.agents,
+                    temperature=settings.ROUTER_TEMPERATURE
+                )
+            except Exception as e:
+                logger.warning("Centroid router unavailable (%r); using LLM routing", e)
+
+    @staticmethod
+    def _build_prompt(query: str) -> str:
+        return f"""
 Classify the user query into ONE category:
 
 - policies
@@ -82,8 +139,89 @@ Query:
 {query}
 """
 
-        category = self.llm.invoke(prompt).content.strip().lower()
-        return self.agents.get(category)
+    def classify(self, query: str) -> Optional[str]:
+        key = normalize_query(query)
+        category = self.cache.get(key)
+        if category is not None:
+            return category
+
+        if self.classifier is not None:
+            category, confidence = self.classifier.classify(query)
+            if confidence < settings.ROUTER_CONFIDENCE:
+                category = None
+
+        if category is None:
+            response = self.llm.invoke(self._build_prompt(query))
+            category = response.content.strip().lower()
+
+        if category in self.agents:
+            self.cache.set(key, category)
+        return category
+
+    async def aclassify(self, query: str) -> Optional[str]:
+        key = normalize_query(query)
+        category = self.cache.get(key)
+        if category is not None:
+            return category
+
+        if self.classifier is not None:
+            category, confidence = await self.classifier.aclassify(query)
+            if confidence < settings.ROUTER_CONFIDENCE:
+                category = None
+
+        if category is None:
+            response = await self.llm.ainvoke(self._build_prompt(query))
+            category = response.content.strip().lower()
+
+        if category in self.agents:
+            self.cache.set(key, category)
+        return category
+
+    def classify_batch(
+        self,
+        queries: Sequence[str],
+        concurrency: Optional[int] = None
+    ) -> List[Optional[str]]:
+        """
+        classify() for many queries: cache, then one batched centroid
+        pass, then one llm.batch() call for whatever is left.
+        A failed LLM call leaves its query unrouted (None).
+        """
+        keys = [normalize_query(q) for q in queries]
+        categories: List[Optional[str]] = [self.cache.get(key) for key in keys]
+
+        pending = [i for i, c in enumerate(categories) if c is None]
+        if self.classifier is not None and pending:
+            scored = self.classifier.classify_batch([queries[i] for i in pending])
+            for i, (category, confidence) in zip(pending, scored):
+                if confidence >= settings.ROUTER_CONFIDENCE:
+                    categories[i] = category
+
+        pending = [i for i, c in enumerate(categories) if c is None]
+        if pending:
+            responses = self.llm.batch(
+                [self._build_prompt(queries[i]) for i in pending],
+                config={"max_concurrency": concurrency or settings.BATCH_CONCURRENCY},
+                return_exceptions=True
+            )
+            for i, response in zip(pending, responses):
+                if isinstance(response, Exception):
+                    logger.warning("Routing failed for %r (%r)", queries[i], response)
+                    continue
+                categories[i] = response.content.strip().lower()
+
+        for key, category in zip(keys, categories):
+            if category in self.agents:
+                self.cache.set(key, category)
+        return categories
+
+    def route(self, query: str) -> Optional[BaseAgent]:
+        with metrics.span("rag.route_s"):
+            return self.agents.get(self.classify(query))
+
+    async def aroute(self, query: str) -> Optional[BaseAgent]:
+        with metrics.span("rag.route_s"):
+            return self.agents.get(await self.aclassify(query))
 
 
 
@@ -92,19 +230,168 @@ class AgentSystem:
     """
     High-level agent system that routes queries
     and executes the correct agent.
+    Answers are cached by the pipeline's semantic answer cache,
+    so a hit skips routing as well.
     """
 
-    def __init__(self):
-        self.router = QueryRouter()
+    # Answer cache scope for routed (category chosen by the router) answers
+    SCOPE = "routed"
+
+    def __init__(
+        self,
+        rag: Optional[RAGPipeline] = None,
+        llm: Optional[BaseChatModel] = None
+    ):
+        self.rag = rag or RAGPipeline()
+        # Router model (defaults to the shared chat model)
+        self.router = QueryRouter(rag=self.rag, llm=llm)
+        # Coalesces identical in-flight run()/arun() calls
+        self.inflight = SingleFlight() if settings.COALESCE_REQUESTS else None
+
+    @staticmethod
+    def _unrouted() -> Dict[str, Any]:
+        return {
+            "answer": "I could not determine the domain of the question.",
+            "documents": [],
+            "context": ""
+        }
 
     def run(self, query: str) -> Dict[str, Any]:
+        """
+        Route and answer; identical concurrent calls share one execution
+        (one router call, one retrieval, one generation).
+        """
+        if self.inflight is None:
+            return self._run(query)
+
+        return self.inflight.do(normalize_query(query), lambda: self._run(query))
+
+    async def arun(self, query: str) -> Dict[str, Any]:
+        if self.inflight is None:
+            return await self._arun(query)
+
+        return await self.inflight.ado(normalize_query(query), lambda: self._arun(query))
+
+    def _run(self, query: str) -> Dict[str, Any]:
+        index_generation = self.rag.index_generation()
+        cached = self.rag.cached_answer(query, self.SCOPE)
+        if cached is not None:
+            return cached
+
         agent = self.router.route(query)
 
         if agent is None:
-            return {
-                "answer": "I could not determine the domain of the question.",
-                "documents": [],
-                "context": ""
-            }
+            return self._unrouted()
+
+        result = agent.run(query)
+        self.rag.remember_answer(query, self.SCOPE, result, index_generation)
+        return result
+
+    async def _arun(self, query: str) -> Dict[str, Any]:
+        index_generation = self.rag.index_generation()
+        cached = await self.rag.acached_answer(query, self.SCOPE)
+        if cached is not None:
+            return cached
+
+        agent = await self.router.aroute(query)
+
+        if agent is None:
+            return self._unrouted()
+
+        result = await agent.arun(query)
+        await self.rag.aremember_answer(query, self.SCOPE, result, index_generation)
+        return result
+
+    def run_batch(
+        self,
+        queries: Sequence[str],
+        concurrency: Optional[int] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Route and answer many queries, yielding results in input order
+        chunk by chunk: batched routing, then RAGPipeline.run_batch()
+        with each query's routed category. Bypasses the answer cache.
+        """
+        queries = list(queries)
+        size = max(1, settings.BATCH_CHUNK_SIZE)
+
+        for start in range(0, len(queries), size):
+            chunk = queries[start:start + size]
+            categories = self.router.classify_batch(chunk, concurrency)
+
+            routed = [i for i, c in enumerate(categories) if c in self.router.agents]
+            answers = iter(self.rag.run_batch(
+                [chunk[i] for i in routed],
+                [categories[i] for i in routed],
+                concurrency=concurrency
+            ))
+
+            routed_set = set(routed)
+            for i in range(len(chunk)):
+                yield next(answers) if i in routed_set else self._unrouted()
+
+    def stream(self, query: str) -> Iterator[Dict[str, Any]]:
+        started = time.perf_counter()
+        index_generation = self.rag.index_generation()
+        cached = self.rag.cached_answer(query, self.SCOPE)
+        if cached is not None:
+            yield from self.rag.cached_events(cached, started)
+            return
+
+        agent = self.router.route(query)
+
+        if agent is None:
+            yield from RAGPipeline._answer_events(self._unrouted()["answer"])
+            return
+
+        yield from self._remembered(query, agent.stream(query), index_generation)
+
+    async def astream(self, query: str) -> AsyncIterator[Dict[str, Any]]:
+        started = time.perf_counter()
+        index_generation = self.rag.index_generation()
+        cached = await self.rag.acached_answer(query, self.SCOPE)
+        if cached is not None:
+            for event in self.rag.cached_events(cached, started):
+                yield event
+            return
+
+        agent = await self.router.aroute(query)
+
+        if agent is None:
+            for event in RAGPipeline._answer_events(self._unrouted()["answer"]):
+                yield event
+            return
+
+        sources = None
+        async for event in agent.astream(query):
+            if event["type"] == "sources":
+                sources = event
+            elif event["type"] == "done" and sources is not None:
+                await self.rag.aremember_answer(
+                    query, self.SCOPE, self._result(sources, event), index_generation
+                )
+            yield event
+
+    @staticmethod
+    def _result(sources: Dict[str, Any], done: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "answer": done["answer"],
+            "documents": sources["documents"],
+            "context": sources["context"]
+        }
 
-        return agent.run(query)
+    def _remembered(
+        self,
+        query: str,
+        events: Iterator[Dict[str, Any]],
+        index_generation: Optional[int]
+    ) -> Iterator[Dict[str, Any]]:
+        sources = None
+        for event in events:
+            if event["type"] == "sources":
+                sources = event
+            elif event["type"] == "done" and sources is not None:
+                self.rag.remember_answer(
+                    query, self.SCOPE, self._result(sources, event), index_generation
+                )
+            yield event
@@ -0,0 +1,249 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Container, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from rag import metrics
+from rag.settings import settings
+from rag.embeddings import get_embeddings
+
+
+@dataclass
+class _Entry:
+    scope: str
+    vector: np.ndarray
+    result: Dict[str, Any]
+    chunk_ids: Tuple[str, ...]
+    created: float
+
+
+class AnswerCache:
+    """
+    Semantic answer cache:
+    - Keyed on (scope, query embedding); a lookup hits when the closest
+      cached query in the same scope has cosine >= threshold
+    - Entries keep the chunk IDs their answer cites; an entry citing a
+      chunk that is no longer in the collection is dropped on lookup
+      (chunk IDs are content hashes, so edited chunks get new IDs)
+    - LRU bounded by maxsize, optional TTL in seconds
+    - Answers are stored with the index generation they were retrieved
+      from; once clear(generation) ran, older answers are not stored
+    - Hit / miss / stale counters
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        threshold: float = 0.95,
+        maxsize: int = 2048,
+        ttl: Optional[float] = None
+    ):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.generation = 0
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._matrices: Dict[str, Tuple[List[int], np.ndarray]] = {}
+        self._next_key = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    # The raw query, as retrieval embeds it: with the shared cached
+    # embeddings, a miss costs no second embedding call
+    def _embed(self, query: str) -> np.ndarray:
+        return self._normalize(self.embeddings.embed_query(query))
+
+    async def _aembed(self, query: str) -> np.ndarray:
+        return self._normalize(await self.embeddings.aembed_query(query))
+
+    # ---------------------------------------------------------
+    # Internals (caller holds the lock)
+    # ---------------------------------------------------------
+    def _matrix(self, scope: str) -> Tuple[List[int], Optional[np.ndarray]]:
+        cached = self._matrices.get(scope)
+        if cached is None:
+            keys = [k for k, e in self._entries.items() if e.scope == scope]
+            matrix = np.vstack([self._entries[k].vector for k in keys]) if keys else None
+            cached = self._matrices[scope] = (keys, matrix)
+        return cached
+
+    def _remove(self, key: int) -> None:
+        entry = self._entries.pop(key)
+        self._matrices.pop(entry.scope, None)
+
+    def _match(
+        self,
+        vector: np.ndarray,
+        scope: str,
+        valid_ids: Optional[Container[str]]
+    ) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            keys, matrix = self._matrix(scope)
+            if matrix is None:
+                self.misses += 1
+                return None
+
+            scores = matrix @ vector
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            key = keys[best]
+            entry = self._entries[key]
+
+            if self.ttl is not None and time.monotonic() - entry.created > self.ttl:
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            if valid_ids is not None and any(c not in valid_ids for c in entry.chunk_ids):
+                self._remove(key)
+                self.stale += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry.result)
+
+    def _insert(
+        self,
+        vector: np.ndarray,
+        scope: str,
+        result: Dict[str, Any],
+        generation: Optional[int]
+    ) -> None:
+        chunk_ids = tuple(
+            meta["chunk_id"] for meta in result.get("documents", []) if meta.get("chunk_id")
+        )
+        # Answers without citations (no results / unrouted) are not cached
+        if not chunk_ids or self.maxsize <= 0:
+            return
+
+        with self._lock:
+            # Retrieved before the index was reloaded: already outdated
+            if generation is not None and generation < self.generation:
+                return
+
+            self._entries[self._next_key] = _Entry(
+                scope, vector, dict(result), chunk_ids, time.monotonic()
+            )
+            self._next_key += 1
+            self._matrices.pop(scope, None)
+
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    # ---------------------------------------------------------
+    # Public API
+    # ---------------------------------------------------------
+    def lookup(
+        self,
+        query: str,
+        scope: str,
+        valid_ids: Optional[Container[str]] = None
+    ) -> Optional[Dict[str, Any]]:
+        return self._match(self._embed(query), scope, valid_ids)
+
+    async def alookup(
+        self,
+        query: str,
+        scope: str,
+        valid_ids: Optional[Container[str]] = None
+    ) -> Optional[Dict[str, Any]]:
+        return self._match(await self._aembed(query), scope, valid_ids)
+
+    def store(
+        self,
+        query: str,
+        scope: str,
+        result: Dict[str, Any],
+        generation: Optional[int] = None
+    ) -> None:
+        self._insert(self._embed(query), scope, result, generation)
+
+    async def astore(
+        self,
+        query: str,
+        scope: str,
+        result: Dict[str, Any],
+        generation: Optional[int] = None
+    ) -> None:
+        self._insert(await self._aembed(query), scope, result, generation)
+
+    def invalidate(self, chunk_ids: Iterable[str]) -> int:
+        """
+        Drop every entry citing any of chunk_ids; returns how many.
+        """
+        changed = set(chunk_ids)
+        with self._lock:
+            doomed = [k for k, e in self._entries.items() if changed.intersection(e.chunk_ids)]
+            for key in doomed:
+                self._remove(key)
+            self.stale += len(doomed)
+        return len(doomed)
+
+    def clear(self, generation: Optional[int] = None) -> None:
+        """
+        Drop every entry; with generation, answers retrieved from an
+        older generation are no longer stored either.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._matrices.clear()
+            if generation is not None:
+                self.generation = max(self.generation, generation)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+_answer_cache: Optional[AnswerCache] = None
+_lock = threading.Lock()
+
+
+def get_answer_cache() -> Optional[AnswerCache]:
+    """
+    Return the process-wide answer cache (None when ANSWER_CACHE_SIZE is 0).
+    """
+    global _answer_cache
+
+    if settings.ANSWER_CACHE_SIZE <= 0:
+        return None
+
+    if _answer_cache is None:
+        with _lock:
+            if _answer_cache is None:
+                _answer_cache = AnswerCache(
+                    get_embeddings(),
+                    threshold=settings.ANSWER_CACHE_THRESHOLD,
+                    maxsize=settings.ANSWER_CACHE_SIZE,
+                    ttl=settings.ANSWER_CACHE_TTL_S or None
+                )
+                metrics.register_collector("answer_cache", _answer_cache.stats)
+
+    return _answer_cache
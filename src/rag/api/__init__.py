@@ -0,0 +1 @@
+from rag.api.server import app, create_app  # noqa: F401
@@ -0,0 +1,167 @@
+"""
+Async HTTP service over the shared pipeline objects.
+
+Endpoints:
+    GET  /health     liveness + size and generation of the live snapshot
+    GET  /metrics    latency histograms + cache gauges (Prometheus text)
+    POST /query      routed (or category-scoped) answer with per-stage
+                     timings; "profile": true adds a sampled profile
+    POST /retrieve   retrieved chunks only, no generation
+    POST /stream     answer events as NDJSON (sources, tokens, done)
+
+Every request in a worker shares one AgentSystem: one retrieval context
+(BM25 / dense indexes, neighbour index), one router and one pooled
+OpenAI client. The indexes are built or memory-mapped once at startup,
+so the first request does not pay for them; after an ingest each worker
+rebuilds them in the background and swaps them in (hot reload). Run
+several uvicorn workers (API_WORKERS) to serve concurrently on more than
+one core.
+
+Run:
+    rag [--host 0.0.0.0] [--port 8000] [--workers 1]
+"""
+import json
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+from rag import metrics
+from rag.agents import AgentSystem
+from rag.settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueryRequest(BaseModel):
+    query: str = Field(min_length=1)
+    # Set: answer within this category and skip routing
+    category: Optional[str] = None
+    # Chunks retrieved for category-scoped requests
+    k: int = Field(6, ge=1, le=50)
+
+
+class AnswerRequest(QueryRequest):
+    # Sample a profile of this request
+    profile: bool = False
+
+
+class RetrieveRequest(QueryRequest):
+    # Neighbour expansion budget (None = NEIGHBOUR_BUDGET)
+    expand: Optional[int] = Field(None, ge=0)
+
+
+def warmup(system: AgentSystem) -> None:
+    """
+    Build what the first request would otherwise pay for.
+    """
+    rag = system.rag
+    # Neighbour index and tokenizer are built lazily
+    rag.retriever.context.neighbours
+    rag.context_builder.count_tokens("warmup")
+    logger.info("Warmed up: %d chunks loaded", len(rag.retriever.context.documents))
+
+
+def profiled_query(system: AgentSystem, body: AnswerRequest) -> Dict[str, Any]:
+    """
+    Answer on the calling (worker) thread with the sampling profiler on,
+    so the samples only cover this request.
+    """
+    interval_s = settings.PROFILE_INTERVAL_MS / 1000
+
+    with metrics.trace() as timings, metrics.profile(interval_s=interval_s) as profiler:
+        if body.category:
+            result = system.rag.run(body.query, category=body.category, k=body.k)
+        else:
+            result = system.run(body.query)
+
+    return {
+        **result,
+        "timings": timings,
+        "profile": {
+            "samples": profiler.samples,
+            "top": profiler.top(),
+            "folded": profiler.folded(),
+        },
+    }
+
+
+def create_app(system: Optional[AgentSystem] = None) -> FastAPI:
+    """
+    Build the app; system is created (and warmed up) at startup unless
+    one is passed in.
+    """
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        # Index loading is blocking: keep it off the event loop
+        app.state.system = system or await run_in_threadpool(AgentSystem)
+        await run_in_threadpool(warmup, app.state.system)
+        yield
+
+    app = FastAPI(title="RAG Assistant", lifespan=lifespan)
+
+    @app.get("/health")
+    async def health(request: Request) -> Dict[str, Any]:
+        context = request.app.state.system.rag.retriever.context
+        return {"status": "ok", "chunks": len(context.documents), "generation": context.generation}
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def prometheus() -> PlainTextResponse:
+        return PlainTextResponse(metrics.prometheus_text(), media_type="text/plain; version=0.0.4")
+
+    @app.post("/query")
+    async def query(body: AnswerRequest, request: Request) -> Dict[str, Any]:
+        system: AgentSystem = request.app.state.system
+
+        if body.profile:
+            return await run_in_threadpool(profiled_query, system, body)
+
+        with metrics.trace() as timings:
+            if body.category:
+                result = await system.rag.arun(body.query, category=body.category, k=body.k)
+            else:
+                result = await system.arun(body.query)
+
+        return {**result, "timings": timings}
+
+    @app.post("/retrieve")
+    async def retrieve(body: RetrieveRequest, request: Request) -> Dict[str, Any]:
+        system: AgentSystem = request.app.state.system
+
+        docs = await system.rag.retriever.aretrieve(
+            body.query,
+            category=body.category,
+            k=body.k,
+            expand=body.expand
+        )
+        return {
+            "documents": [
+                {"content": d.page_content, "metadata": d.metadata} for d in docs
+            ]
+        }
+
+    @app.post("/stream")
+    async def stream(body: QueryRequest, request: Request) -> StreamingResponse:
+        system: AgentSystem = request.app.state.system
+
+        if body.category:
+            events = system.rag.astream(body.query, category=body.category, k=body.k)
+        else:
+            events = system.astream(body.query)
+
+        async def ndjson() -> AsyncIterator[str]:
+            async for event in events:
+                yield json.dumps(event, default=str) + "\n"
+
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    return app
+
+
+app = create_app()
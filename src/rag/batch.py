@@ -0,0 +1,131 @@
+"""
+Bulk question answering / offline evaluation over a JSONL file.
+
+Input: one JSON object per line, {"id": ..., "query": ..., "category": ...}
+("id" defaults to the line number, "category" is optional and only used
+with --mode rag). Output: one JSON object per input line, in input order,
+with the answer, cited chunk metadata and an "error" field on failures.
+
+Results are appended and flushed line by line, so an interrupted run is
+resumed by re-running the same command: ids already answered in the
+output file are skipped, failed ones are retried.
+
+Usage:
+    rag-batch questions.jsonl answers.jsonl [--mode agents|rag] [--concurrency 8] [--k 6]
+"""
+import argparse
+import json
+import os
+import time
+from typing import Any, Dict, Iterator, List, Set
+
+from rag.settings import settings
+from rag.retrievers.sparse_bm25 import replacing
+
+
+def read_queries(path: str) -> List[Dict[str, Any]]:
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            item.setdefault("id", line_no)
+            items.append(item)
+    return items
+
+
+def completed_ids(path: str) -> Set[str]:
+    """
+    Ids already answered in an existing output file. A partially written
+    last line (interrupted run) and records without an id are dropped so
+    appending stays valid JSONL; failed records are dropped too, so they
+    are retried and the file keeps one line per id.
+    """
+    if not os.path.exists(path):
+        return set()
+
+    done, valid, dropped = set(), [], False
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                dropped = True
+                continue
+            if not isinstance(record, dict) or "id" not in record or "error" in record:
+                dropped = True
+                continue
+            done.add(str(record["id"]))
+            valid.append(line if line.endswith("\n") else line + "\n")
+
+    if dropped:
+        # Rewritten next to the original and swapped in, so an interrupt
+        # here never loses the answers already written
+        with replacing(path) as tmp_path:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.writelines(valid)
+    return done
+
+
+def answer(
+    items: List[Dict[str, Any]],
+    mode: str,
+    k: int,
+    concurrency: int
+) -> Iterator[Dict[str, Any]]:
+    queries = [item["query"] for item in items]
+
+    if mode == "agents":
+        from rag.agents import AgentSystem
+
+        return AgentSystem().run_batch(queries, concurrency=concurrency)
+
+    from rag.rag_pipeline import RAGPipeline
+
+    return RAGPipeline().run_batch(
+        queries,
+        categories=[item.get("category") for item in items],
+        k=k,
+        concurrency=concurrency
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input")
+    parser.add_argument("output")
+    parser.add_argument("--mode", choices=["agents", "rag"], default="agents")
+    parser.add_argument("--concurrency", type=int, default=settings.BATCH_CONCURRENCY)
+    parser.add_argument("--k", type=int, default=6)
+    args = parser.parse_args()
+
+    items = read_queries(args.input)
+    done = completed_ids(args.output)
+    pending = [item for item in items if str(item["id"]) not in done]
+
+    print(f"📄 {len(items)} queries ({len(done)} already answered, {len(pending)} to go)")
+    if not pending:
+        return
+
+    started = time.perf_counter()
+    failed = 0
+
+    with open(args.output, "a", encoding="utf-8") as out:
+        results = answer(pending, args.mode, args.k, args.concurrency)
+        for n, (item, result) in enumerate(zip(pending, results), 1):
+            failed += "error" in result
+            record = {**item, **result}
+            out.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            out.flush()
+
+            if n % settings.BATCH_CHUNK_SIZE == 0:
+                print(f"  {n}/{len(pending)} answered")
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ {len(pending)} answered in {elapsed:.1f}s ({len(pending) / elapsed:.1f} q/s, {failed} failed)")
+
+
+if __name__ == "__main__":
+    main()
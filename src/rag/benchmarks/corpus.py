@@ -0,0 +1,146 @@
+"""
+Synthetic document corpus for benchmarks (no external tools needed).
+"""
+import os
+import random
+from typing import List, Sequence
+
+from rag.fakes import CATEGORY_WORDS
+
+
+WORDS = (
+    "policy privacy data member benefit device sensor accuracy medical record "
+    "clinical consent retention access account renewal battery calibration "
+    "report service coverage claim support security encryption review notice"
+).split()
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: str, pages: List[str]) -> None:
+    """
+    Write a minimal multi-page PDF with one text stream per page.
+    """
+    objects: List[bytes] = []
+
+    def add(body: str) -> int:
+        objects.append(body.encode("latin-1"))
+        return len(objects)
+
+    catalog = add("")  # placeholder, filled once page ids are known
+    pages_id = add("")
+    font = add("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    page_ids = []
+    for text in pages:
+        lines = ["BT /F1 10 Tf 12 TL 50 780 Td"]
+        for line in text.split("\n"):
+            lines.append(f"({_escape(line)}) Tj T*")
+        lines.append("ET")
+        stream = "\n".join(lines)
+        content = add(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        page_ids.append(add(
+            f"<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 612 792] "
+            f"/Contents {content} 0 R /Resources << /Font << /F1 {font} 0 R >> >> >>"
+        ))
+
+    kids = " ".join(f"{i} 0 R" for i in page_ids)
+    objects[catalog - 1] = f"<< /Type /Catalog /Pages {pages_id} 0 R >>".encode("latin-1")
+    objects[pages_id - 1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode("latin-1")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n".encode("latin-1") + body + b"\nendobj\n"
+
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode("latin-1")
+    out += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root {catalog} 0 R >>\n"
+        f"startxref\n{xref}\n%%EOF\n"
+    ).encode("latin-1")
+
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def random_text(
+    rng: random.Random,
+    lines: int = 40,
+    words: int = 12,
+    vocab: Sequence[str] = WORDS
+) -> str:
+    return "\n".join(
+        " ".join(rng.choice(vocab) for _ in range(words)).capitalize() + "."
+        for _ in range(lines)
+    )
+
+
+def category_text(rng: random.Random, category: str, lines: int = 40, words: int = 12) -> str:
+    """
+    Text mixing the category's own vocabulary (CATEGORY_WORDS) with
+    shared words, so routing and retrieval have real signal.
+    """
+    return random_text(rng, lines, words, vocab=list(CATEGORY_WORDS[category]) * 2 + list(WORDS))
+
+
+def random_query(rng: random.Random, category: str, words: int = 5) -> str:
+    return " ".join(rng.choice(CATEGORY_WORDS[category]) for _ in range(words)) + "?"
+
+
+def generate_pdf_corpus(
+    root: str,
+    files: int = 40,
+    pages_per_file: int = 10,
+    categories: Sequence[str] = ("policies", "medical", "device", "membership"),
+    seed: int = 0
+) -> List[str]:
+    """
+    Write files under root/<category>/<sub_category>/<year>/doc_N.pdf
+    (the layout extract_metadata expects). Returns the file paths.
+    """
+    rng = random.Random(seed)
+    paths = []
+
+    for i in range(files):
+        category = categories[i % len(categories)]
+        folder = os.path.join(root, category, "General", str(2020 + i % 5))
+        os.makedirs(folder, exist_ok=True)
+
+        path = os.path.join(folder, f"doc_{i}.pdf")
+        write_pdf(path, [random_text(rng) for _ in range(pages_per_file)])
+        paths.append(path)
+
+    return paths
+
+
+def generate_category_corpus(
+    root: str,
+    files: int = 40,
+    pages_per_file: int = 5,
+    categories: Sequence[str] = tuple(CATEGORY_WORDS),
+    seed: int = 0
+) -> List[str]:
+    """
+    Write files under root/<category>/doc_N.pdf (the data/<category>/
+    layout rag.scripts.ingestion reads), with category-specific text.
+    Returns the file paths.
+    """
+    rng = random.Random(seed)
+    paths = []
+
+    for i in range(files):
+        category = categories[i % len(categories)]
+        folder = os.path.join(root, category)
+        os.makedirs(folder, exist_ok=True)
+
+        path = os.path.join(folder, f"doc_{i}.pdf")
+        write_pdf(path, [category_text(rng, category) for _ in range(pages_per_file)])
+        paths.append(path)
+
+    return paths
@@ -0,0 +1,159 @@
+"""
+Vector backend benchmark: Chroma queries vs the in-process dense index
+(float16 / int8 exact matmul, optional HNSW).
+
+Reports recall@k against exact float32 search and queries per second,
+unfiltered and with a category filter.
+
+Usage:
+    python -m rag.benchmarks.dense [--rows 20000] [--dim 384] [--queries 200] [--k 10]
+    python -m rag.benchmarks.dense --from-chroma   # vectors of the ingested collection
+"""
+import argparse
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from rag.retrievers.dense import DenseIndex
+
+
+CATEGORIES = ["policies", "medical", "device", "membership"]
+
+
+def synthetic(rows: int, dim: int, seed: int = 0) -> Tuple[np.ndarray, List[str]]:
+    rng = np.random.default_rng(seed)
+    # Clustered like real embeddings: one centre per category plus noise
+    centres = rng.normal(size=(len(CATEGORIES), dim))
+    labels = rng.integers(len(CATEGORIES), size=rows)
+    vectors = centres[labels] + rng.normal(scale=1.5, size=(rows, dim))
+    return vectors.astype(np.float32), [CATEGORIES[i] for i in labels]
+
+
+def from_chroma() -> Tuple[np.ndarray, List[str]]:
+    from rag.retrievers.vectorstore import load_vectorstore
+
+    raw = load_vectorstore().get(include=["embeddings", "metadatas"])
+    vectors = np.asarray(raw["embeddings"], dtype=np.float32)
+    return vectors, [str(m.get("category", "")).lower() for m in raw["metadatas"]]
+
+
+def exact_top_k(vectors: np.ndarray, query: np.ndarray, k: int, rows: Optional[np.ndarray]) -> List[int]:
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = unit @ (query / np.linalg.norm(query))
+    if rows is not None:
+        order = rows[np.argsort(-scores[rows])]
+    else:
+        order = np.argsort(-scores)
+    return [int(i) for i in order[:k]]
+
+
+def run(
+    name: str,
+    search: Callable[[np.ndarray, Optional[str]], List[int]],
+    queries: np.ndarray,
+    truth: Dict[Optional[str], List[List[int]]],
+    k: int
+) -> Dict[str, float]:
+    result = {"backend": name}
+
+    for category, expected in truth.items():
+        start = time.perf_counter()
+        found = [search(q, category) for q in queries]
+        elapsed = time.perf_counter() - start
+
+        recall = np.mean([len(set(f) & set(e)) / k for f, e in zip(found, expected)])
+        label = "filtered" if category else "all"
+        result[f"recall_{label}"] = float(recall)
+        result[f"qps_{label}"] = len(queries) / elapsed
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--from-chroma", action="store_true")
+    args = parser.parse_args()
+
+    vectors, categories = from_chroma() if args.from_chroma else synthetic(args.rows, args.dim)
+    ids = [f"row-{i}" for i in range(len(vectors))]
+    docs = [
+        Document(page_content="", metadata={"chunk_id": uid, "category": cat})
+        for uid, cat in zip(ids, categories)
+    ]
+    row_of = {uid: i for i, uid in enumerate(ids)}
+
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.integers(len(vectors), size=args.queries)]
+    queries = queries + rng.normal(scale=0.5, size=queries.shape).astype(np.float32)
+
+    category = categories[0]
+    category_rows = np.flatnonzero(np.asarray(categories) == category)
+    truth = {
+        None: [exact_top_k(vectors, q, args.k, None) for q in queries],
+        category: [exact_top_k(vectors, q, args.k, category_rows) for q in queries],
+    }
+
+    results = []
+
+    # Chroma (HNSW, client + serialization overhead)
+    import chromadb
+
+    with tempfile.TemporaryDirectory() as tmp:
+        client = chromadb.PersistentClient(path=tmp)
+        # Cosine space so Chroma answers the same question as the ground truth
+        collection = client.create_collection("bench", metadata={"hnsw:space": "cosine"})
+        for start in range(0, len(ids), 5000):
+            end = start + 5000
+            collection.add(
+                ids=ids[start:end],
+                embeddings=vectors[start:end].tolist(),
+                metadatas=[{"category": c} for c in categories[start:end]],
+            )
+
+        def chroma_search(q, cat):
+            res = collection.query(
+                query_embeddings=[q.tolist()],
+                n_results=args.k,
+                where={"category": cat} if cat else None,
+            )
+            return [row_of[uid] for uid in res["ids"][0]]
+
+        results.append(run("chroma", chroma_search, queries, truth, args.k))
+
+    backends = [("numpy-float16", "float16", False), ("numpy-int8", "int8", False)]
+    try:
+        import hnswlib  # noqa: F401
+        backends.append(("hnsw-float16", "float16", True))
+    except ImportError:
+        print("hnswlib not installed: skipping HNSW")
+
+    for name, dtype, hnsw in backends:
+        index = DenseIndex.build(docs, ids, vectors, dtype=dtype, hnsw=hnsw)
+
+        def dense_search(q, cat, index=index):
+            hits = index.search(q, args.k, {"category": cat} if cat else None)
+            return [row_of[d.metadata["chunk_id"]] for d, _ in hits]
+
+        result = run(name, dense_search, queries, truth, args.k)
+        result["index_mb"] = index.vectors.nbytes / 1024 / 1024
+        results.append(result)
+
+    print(f"\n{len(vectors)} vectors x {vectors.shape[1]} dims, {args.queries} queries, k={args.k}")
+    print(f"{'backend':<16}{'recall':>8}{'qps':>10}{'recall(f)':>11}{'qps(f)':>10}{'MB':>8}")
+    for r in results:
+        print(
+            f"{r['backend']:<16}{r['recall_all']:>8.3f}{r['qps_all']:>10.0f}"
+            f"{r['recall_filtered']:>11.3f}{r['qps_filtered']:>10.0f}"
+            f"{r.get('index_mb', float('nan')):>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Document loading throughput: pages/sec vs worker count on a generated
+local PDF corpus.
+
+Usage:
+    python -m rag.benchmarks.loading [--files 40] [--pages 10] [--workers 1,2,4,8]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+# rag.scripts builds its OpenAI clients at import; loading makes no API calls
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from rag.benchmarks.corpus import generate_pdf_corpus
+from rag.scripts import load_file
+from rag.scripts.loaders import iter_documents_parallel
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=40)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument(
+        "--workers",
+        default=",".join(str(w) for w in sorted({1, 2, 4, os.cpu_count() or 1})),
+        help="Comma separated worker counts"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        paths = generate_pdf_corpus(root, files=args.files, pages_per_file=args.pages)
+
+        print(f"Corpus: {args.files} files x {args.pages} pages\n")
+        print(f"{'workers':>8}{'seconds':>10}{'pages/sec':>12}{'speedup':>10}")
+
+        baseline = None
+        for workers in (int(w) for w in args.workers.split(",")):
+            start = time.perf_counter()
+            pages = sum(1 for _ in iter_documents_parallel(paths, load_file, workers=workers))
+            elapsed = time.perf_counter() - start
+
+            baseline = baseline or elapsed
+            print(f"{workers:>8}{elapsed:>10.2f}{pages / elapsed:>12.1f}{baseline / elapsed:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
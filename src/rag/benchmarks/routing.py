@@ -0,0 +1,86 @@
+"""
+Routing benchmark: LLM router vs centroid router.
+
+Reports per-query latency (p50/p95), agreement with the LLM router
+and how often the centroid router falls back to the LLM.
+
+Usage:
+    python -m rag.benchmarks.routing [--queries queries.txt]
+"""
+import argparse
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from rag.settings import settings
+
+
+SAMPLE_QUERIES = [
+    "What is the privacy policy?",
+    "How long do you keep my personal data?",
+    "Can I opt out of data sharing?",
+    "How is medical data processed?",
+    "Are my health records encrypted?",
+    "Who can access my clinical information?",
+    "Tell me about the device accuracy",
+    "How do I calibrate the sensor?",
+    "What is the battery life of the device?",
+    "What are the membership benefits?",
+    "How do I cancel my membership?",
+    "Is there a family membership plan?",
+]
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    ms = np.asarray(samples) * 1000
+    return {"p50_ms": float(np.percentile(ms, 50)), "p95_ms": float(np.percentile(ms, 95))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--queries", help="File with one query per line")
+    args = parser.parse_args()
+
+    queries = SAMPLE_QUERIES
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+
+    from rag.agents import QueryRouter
+    from rag.routing import CentroidClassifier
+
+    router = QueryRouter()
+    classifier = CentroidClassifier.from_vectorstore(
+        router.agents["policies"].rag.retriever.vectorstore,
+        categories=router.agents,
+        temperature=settings.ROUTER_TEMPERATURE
+    )
+
+    llm_latency, centroid_latency = [], []
+    agree = fallbacks = 0
+
+    for query in queries:
+        start = time.perf_counter()
+        llm_category = router.llm.invoke(router._build_prompt(query)).content.strip().lower()
+        llm_latency.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        category, confidence = classifier.classify(query)
+        centroid_latency.append(time.perf_counter() - start)
+
+        if confidence < settings.ROUTER_CONFIDENCE:
+            fallbacks += 1
+            category = llm_category
+
+        agree += category == llm_category
+
+    print(f"Queries: {len(queries)}")
+    print(f"LLM router:      {_percentiles(llm_latency)}")
+    print(f"Centroid router: {_percentiles(centroid_latency)}")
+    print(f"Agreement with LLM router (after fallback): {agree / len(queries):.1%}")
+    print(f"Fallback rate (confidence < {settings.ROUTER_CONFIDENCE}): {fallbacks / len(queries):.1%}")
+
+
+if __name__ == "__main__":
+    main()
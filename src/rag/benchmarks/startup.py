@@ -0,0 +1,86 @@
+"""
+Startup / memory benchmark: private retrieval contexts vs one shared context.
+
+Usage:
+    python -m rag.benchmarks.startup [--copies 5]
+"""
+import argparse
+import time
+import tracemalloc
+from typing import Callable, Dict
+
+
+def _measure(build: Callable[[], object]) -> Dict[str, float]:
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    obj = build()
+
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Keep the objects alive until memory has been sampled
+    del obj
+
+    return {
+        "seconds": elapsed,
+        "resident_mb": current / 1024 / 1024,
+        "peak_mb": peak / 1024 / 1024,
+    }
+
+
+def build_private(copies: int):
+    """
+    Previous behaviour: every pipeline snapshots the corpus
+    and builds its own BM25 index.
+    """
+    from rag.retrievers.context import RetrievalContext
+    from rag.retrievers.production import ProductionRetriever
+
+    return [ProductionRetriever(context=RetrievalContext()) for _ in range(copies)]
+
+
+def build_shared(copies: int):
+    """
+    Current behaviour: every pipeline borrows the process-wide context.
+    """
+    from rag.retrievers.context import get_retrieval_context
+    from rag.retrievers.production import ProductionRetriever
+
+    context = get_retrieval_context()
+    return [ProductionRetriever(context=context) for _ in range(copies)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--copies",
+        type=int,
+        default=5,
+        help="Number of pipelines (4 agents + debugger by default)"
+    )
+    args = parser.parse_args()
+
+    results = {
+        "private": _measure(lambda: build_private(args.copies)),
+        "shared": _measure(lambda: build_shared(args.copies)),
+    }
+
+    print(f"{'mode':<10}{'startup (s)':>14}{'resident (MB)':>16}{'peak (MB)':>12}")
+    for mode, r in results.items():
+        print(
+            f"{mode:<10}{r['seconds']:>14.3f}"
+            f"{r['resident_mb']:>16.1f}{r['peak_mb']:>12.1f}"
+        )
+
+    private, shared = results["private"], results["shared"]
+    if shared["seconds"] and shared["resident_mb"]:
+        print(
+            f"\nStartup speedup: {private['seconds'] / shared['seconds']:.1f}x | "
+            f"Memory reduction: {private['resident_mb'] / shared['resident_mb']:.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+Offline latency / throughput suite: runs without network access or API
+keys, using the fake chat model and embeddings (rag.fakes) with simulated
+latency over a synthetic data/<category>/ corpus.
+
+Benchmarks:
+- ingest:     files/s and chunks/s through the streaming IngestPipeline
+- cold_start: RetrievalContext + ProductionRetriever construction, with
+              and without the persisted BM25 index
+- retrieve:   p50/p99 per leg (query embedding, vector, BM25) and fused
+- agents:     AgentSystem.run QPS and latency at each concurrency
+
+Results are written as JSON (--out); --compare prints the relative change
+of every metric against a previous results file.
+
+Usage:
+    python -m rag.benchmarks.suite [--files 40] [--pages 5] [--queries 100]
+        [--concurrency 1,4,16] [--llm-ms 200] [--embed-ms 20]
+        [--out bench.json] [--compare baseline.json]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Nothing here calls OpenAI; the key only satisfies client construction
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from rag.benchmarks.corpus import generate_category_corpus, random_query
+from rag.fakes import CATEGORY_WORDS
+from rag.settings import settings
+
+
+def configure(workdir: str, llm_ms: float, token_ms: float, embed_ms: float) -> None:
+    """
+    Point every store at workdir and select the offline backends.
+    Must run before any process-wide client is built.
+    """
+    settings.LLM_BACKEND = "fake"
+    settings.EMBED_BACKEND = "fake"
+    settings.FAKE_LLM_LATENCY_MS = llm_ms
+    settings.FAKE_LLM_TOKEN_MS = token_ms
+    settings.FAKE_EMBED_LATENCY_MS = embed_ms
+
+    settings.CHROMA_DIR = os.path.join(workdir, "chroma_db")
+    settings.BM25_INDEX_DIR = os.path.join(workdir, "bm25_index")
+    settings.DENSE_INDEX_DIR = os.path.join(workdir, "dense_index")
+    settings.EMBED_CACHE_PATH = os.path.join(workdir, "embed_cache.sqlite")
+    settings.SUMMARY_CACHE_PATH = os.path.join(workdir, "summary_cache.sqlite")
+    settings.INGEST_MANIFEST_PATH = os.path.join(workdir, "ingest_manifest.json")
+    settings.INDEX_GENERATION_PATH = os.path.join(workdir, "index_generation.json")
+
+    # Measure the pipeline, not the answer cache
+    settings.ANSWER_CACHE_SIZE = 0
+
+
+def latency_summary(samples: Sequence[float]) -> Dict[str, float]:
+    ms = np.asarray(samples) * 1000
+    return {
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "mean_ms": float(ms.mean()),
+    }
+
+
+def timed(fn: Callable[[Any], Any], items: Sequence[Any]) -> List[float]:
+    samples = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_ingest(data_dir: str, paths: List[str], embeddings, workers: int) -> Dict[str, float]:
+    from rag.retrievers.vectorstore import load_vectorstore
+    from rag.scripts.ingestion import chunk_documents, load_pdf
+    from rag.scripts.manifest import IngestManifest
+    from rag.scripts.pipeline import IngestPipeline
+
+    manifest = IngestManifest(settings.INGEST_MANIFEST_PATH, data_dir)
+    plan = manifest.diff(paths)
+
+    pipeline = IngestPipeline(
+        db=load_vectorstore(embeddings),
+        manifest=manifest,
+        load_fn=load_pdf,
+        split_fn=chunk_documents,
+        embeddings=embeddings,
+        workers=workers,
+        queue_size=settings.INGEST_QUEUE_SIZE,
+        embed_batch=settings.INGEST_EMBED_BATCH,
+        upsert_batch=settings.INGEST_UPSERT_BATCH,
+        checkpoint_every=settings.INGEST_CHECKPOINT_EVERY,
+    )
+
+    start = time.perf_counter()
+    stats = pipeline.run(plan.to_ingest, plan.removed)
+    elapsed = time.perf_counter() - start
+
+    chunks = stats["upsert"].items
+    return {
+        "files": len(paths),
+        "chunks": chunks,
+        "seconds": elapsed,
+        "files_per_s": len(paths) / elapsed,
+        "chunks_per_s": chunks / elapsed,
+    }
+
+
+def bench_cold_start(embeddings) -> Dict[str, float]:
+    from rag.retrievers.context import RetrievalContext
+    from rag.retrievers.production import ProductionRetriever
+    from rag.retrievers.vectorstore import load_vectorstore
+
+    def build():
+        start = time.perf_counter()
+        context = RetrievalContext(vectorstore=load_vectorstore(embeddings))
+        ProductionRetriever(context=context, reranker=None)
+        return time.perf_counter() - start
+
+    # No persisted index: snapshot + BM25 build; then memory-mapped reload
+    shutil.rmtree(settings.BM25_INDEX_DIR, ignore_errors=True)
+    return {"build_s": build(), "reload_s": build()}
+
+
+def bench_retrieve(retriever, queries: List[str], k: int = 6) -> Dict[str, Dict[str, float]]:
+    n = retriever._candidates(retriever._pool(k))
+    embeddings = retriever.vectorstore.embeddings
+
+    return {
+        "embed": latency_summary(timed(embeddings.embed_query, queries)),
+        "vector": latency_summary(timed(lambda q: retriever._vector_search(q, n, {}), queries)),
+        "bm25": latency_summary(timed(lambda q: retriever._bm25_search(q, n, {}), queries)),
+        "fused": latency_summary(timed(lambda q: retriever.retrieve(q, k=k), queries)),
+    }
+
+
+def bench_agents(system, queries: List[str], concurrency: Sequence[int]) -> Dict[str, Dict[str, float]]:
+    results = {}
+
+    for workers in concurrency:
+        # Every level starts cold: no routing decisions from the last one
+        system.router.cache.clear()
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            start = time.perf_counter()
+            samples = list(pool.map(lambda q: timed(system.run, [q])[0], queries))
+            elapsed = time.perf_counter() - start
+
+        results[str(workers)] = {"qps": len(queries) / elapsed, **latency_summary(samples)}
+
+    return results
+
+
+def run_suite(
+    workdir: str,
+    files: int = 40,
+    pages: int = 5,
+    queries: int = 100,
+    concurrency: Sequence[int] = (1, 4, 16),
+    llm_ms: float = 200,
+    token_ms: float = 5,
+    embed_ms: float = 20,
+    workers: int = 0,
+    seed: int = 0
+) -> Dict[str, Any]:
+    configure(workdir, llm_ms, token_ms, embed_ms)
+
+    from rag.agents import AgentSystem
+    from rag.embeddings import build_embedding_backend
+    from rag.llm import build_chat_model
+    from rag.rag_pipeline import RAGPipeline
+    from rag.retrievers.context import RetrievalContext
+    from rag.retrievers.production import ProductionRetriever
+    from rag.retrievers.vectorstore import load_vectorstore
+
+    # Uncached stand-ins: every query pays the simulated embedding latency
+    embeddings = build_embedding_backend()
+    llm = build_chat_model()
+
+    data_dir = os.path.join(workdir, "data")
+    paths = generate_category_corpus(data_dir, files=files, pages_per_file=pages, seed=seed)
+
+    rng = random.Random(seed)
+    categories = list(CATEGORY_WORDS)
+    query_set = [random_query(rng, categories[i % len(categories)]) for i in range(queries)]
+
+    results: Dict[str, Any] = {"ingest": bench_ingest(data_dir, paths, embeddings, workers)}
+    results["cold_start"] = bench_cold_start(embeddings)
+
+    retriever = ProductionRetriever(
+        context=RetrievalContext(vectorstore=load_vectorstore(embeddings)),
+        reranker=None
+    )
+    results["retrieve"] = bench_retrieve(retriever, query_set)
+
+    system = AgentSystem(rag=RAGPipeline(retriever=retriever, llm=llm), llm=llm)
+    results["agents"] = bench_agents(system, query_set, concurrency)
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "params": {
+                "files": files, "pages": pages, "queries": queries,
+                "concurrency": list(concurrency), "llm_ms": llm_ms,
+                "token_ms": token_ms, "embed_ms": embed_ms, "workers": workers,
+                "vector_backend": settings.VECTOR_BACKEND,
+            },
+        },
+        "results": results,
+    }
+
+
+def flatten(tree: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in tree.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)):
+            flat[name] = float(value)
+    return flat
+
+
+def print_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> None:
+    current = flatten(report["results"])
+    previous = flatten(baseline["results"]) if baseline else {}
+
+    print(f"\n{'metric':<32}{'value':>12}{'change':>10}")
+    for name, value in current.items():
+        change = ""
+        if previous.get(name):
+            change = f"{(value - previous[name]) / previous[name]:+.1%}"
+        print(f"{name:<32}{value:>12.2f}{change:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=40)
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma separated thread counts")
+    parser.add_argument("--llm-ms", type=float, default=200, help="Simulated time to first token")
+    parser.add_argument("--token-ms", type=float, default=5, help="Simulated time per further token")
+    parser.add_argument("--embed-ms", type=float, default=20, help="Simulated embedding call latency")
+    parser.add_argument("--workers", type=int, default=settings.INGEST_WORKERS)
+    parser.add_argument("--out", default="bench.json")
+    parser.add_argument("--compare", help="Previous results file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="rag-bench-") as workdir:
+        report = run_suite(
+            workdir,
+            files=args.files,
+            pages=args.pages,
+            queries=args.queries,
+            concurrency=[int(c) for c in args.concurrency.split(",")],
+            llm_ms=args.llm_ms,
+            token_ms=args.token_ms,
+            embed_ms=args.embed_ms,
+            workers=args.workers,
+        )
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print_report(report, baseline)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
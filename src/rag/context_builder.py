@@ -0,0 +1,169 @@
+import logging
+from functools import lru_cache
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from rag.settings import settings
+from rag.retrievers.neighbours import chunk_position
+
+
+logger = logging.getLogger(__name__)
+
+# Longest overlap searched for between neighbouring chunks (splitter uses 150)
+MAX_OVERLAP_CHARS = 400
+MIN_OVERLAP_CHARS = 20
+
+
+@lru_cache(maxsize=None)
+def make_token_counter(model: str) -> Callable[[str], int]:
+    """
+    tiktoken counter for model; falls back to ~4 chars/token when the
+    encoding is unknown or cannot be loaded (e.g. offline).
+    """
+    try:
+        import tiktoken
+
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning("tiktoken unavailable (%r); approximating token counts", e)
+        return lambda text: (len(text) + 3) // 4
+
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def overlap_length(head: str, tail: str) -> int:
+    """
+    Length of the longest suffix of head that is a prefix of tail.
+    """
+    limit = min(len(head), len(tail), MAX_OVERLAP_CHARS)
+    for size in range(limit, MIN_OVERLAP_CHARS - 1, -1):
+        if head.endswith(tail[:size]):
+            return size
+    return 0
+
+
+@dataclass
+class PackedContext:
+    text: str
+    tokens: int
+    # chunk position in the input -> "full" | "trimmed" | "summary" | "dropped"
+    modes: Dict[int, str] = field(default_factory=dict)
+
+
+class ContextBuilder:
+    """
+    Token-budgeted context packing:
+    - Chunks are taken in rank order until the budget is spent: the
+      reranker's order when they were reranked (neighbours right after
+      their hit), fused score otherwise
+    - Text shared with an adjacent chunk (same parent_id / file,
+      chunk_index ± 1) that is already in the context is removed
+    - The top full_chunks chunks go in verbatim; lower-ranked chunks use
+      their ingest-time summary when they have one, and any chunk falls
+      back to its summary when its text no longer fits
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 2500,
+        full_chunks: int = 3,
+        count_tokens: Optional[Callable[[str], int]] = None
+    ):
+        self.token_budget = token_budget
+        self.full_chunks = full_chunks
+        self.count_tokens = count_tokens or make_token_counter(settings.MODEL_NAME)
+
+    @staticmethod
+    def _position(doc: Document) -> Optional[Tuple[Hashable, int]]:
+        return chunk_position(doc.metadata)
+
+    @staticmethod
+    def _block(doc: Document, text: str, summary: bool = False) -> str:
+        label = " | Summary" if summary else ""
+        return (
+            f"[Source: {doc.metadata.get('document_name')} | "
+            f"Category: {doc.metadata.get('category')}{label}]\n"
+            f"{text}"
+        )
+
+    def _dedupe(self, doc: Document, placed: Dict[Tuple[Hashable, int], str]) -> str:
+        text = doc.page_content
+        position = self._position(doc)
+        if position is None:
+            return text
+
+        group, index = position
+        before = placed.get((group, index - 1))
+        after = placed.get((group, index + 1))
+
+        if before is not None:
+            text = text[overlap_length(before, text):]
+        if after is not None:
+            cut = overlap_length(text, after)
+            text = text[:len(text) - cut] if cut else text
+
+        return text.strip()
+
+    @staticmethod
+    def _ranked(docs: List[Document]) -> List[int]:
+        reranked = {
+            doc.metadata.get("chunk_id"): doc.metadata["rerank_rank"]
+            for doc in docs
+            if doc.metadata.get("rerank_rank") is not None
+        }
+        if not reranked:
+            return sorted(range(len(docs)), key=lambda i: -float(docs[i].metadata.get("fused_score", 0.0)))
+
+        def rank(i: int) -> int:
+            meta = docs[i].metadata
+            if meta.get("rerank_rank") is not None:
+                return meta["rerank_rank"]
+            # Expanded neighbours share their hit's rank (stable sort: after it)
+            return reranked.get(meta.get("expanded_from"), len(docs))
+
+        return sorted(range(len(docs)), key=rank)
+
+    def build(self, docs: List[Document]) -> PackedContext:
+        ranked = self._ranked(docs)
+
+        blocks: List[str] = []
+        modes: Dict[int, str] = {}
+        placed: Dict[Tuple[Hashable, int], str] = {}
+        used = 0
+        separator = self.count_tokens("\n\n")
+
+        for rank, i in enumerate(ranked):
+            doc = docs[i]
+            summary = (doc.metadata.get("summary") or "").strip()
+            text = self._dedupe(doc, placed)
+            mode = "trimmed" if text != doc.page_content.strip() else "full"
+
+            candidates = []
+            if rank < self.full_chunks or not summary:
+                candidates.append((self._block(doc, text), mode))
+            if summary:
+                candidates.append((self._block(doc, summary, summary=True), "summary"))
+
+            modes[i] = "dropped"
+            for block, block_mode in candidates:
+                if not text and block_mode != "summary":
+                    # Fully contained in neighbours already in the context
+                    modes[i] = "trimmed"
+                    break
+
+                cost = self.count_tokens(block) + (separator if blocks else 0)
+                if used + cost <= self.token_budget:
+                    blocks.append(block)
+                    modes[i] = block_mode
+                    used += cost
+                    position = self._position(doc)
+                    if block_mode != "summary" and position is not None:
+                        placed[position] = doc.page_content
+                    break
+
+        return PackedContext("\n\n".join(blocks), used, modes)
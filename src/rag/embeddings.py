@@ -0,0 +1,370 @@
+import hashlib
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+
+from rag import metrics
+from rag.settings import settings
+from rag.cache import LRUCache, PersistentCache
+from rag.llm import get_http_clients
+
+
+logger = logging.getLogger(__name__)
+
+# Pre-quantized export shipped with most sentence-transformers models
+DEFAULT_ONNX_INT8_FILE = "onnx/model_qint8_avx2.onnx"
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper with two cache tiers:
+    - In-memory LRU in front (repeat queries)
+    - Disk cache (SQLite, float32 blobs, size bounded) shared by
+      ingestion and query paths
+    Keys are model namespace + kind (query/document) + text hash.
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        namespace: str,
+        store: Optional[PersistentCache] = None,
+        memory_size: int = 4096
+    ):
+        self.underlying = underlying
+        self.namespace = namespace
+        self.store = store
+        self.memory = LRUCache(maxsize=memory_size)
+
+    def _key(self, kind: str, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{self.namespace}:{kind}:{digest}"
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        for key in keys:
+            vector = self.memory.get(key)
+            if vector is not None:
+                found[key] = vector
+
+        missing = [key for key in keys if key not in found]
+        if self.store is not None and missing:
+            for key, blob in self.store.get_many(missing).items():
+                vector = np.frombuffer(blob, dtype=np.float32).tolist()
+                self.memory.set(key, vector)
+                found[key] = vector
+
+        return found
+
+    def _remember(self, items: Dict[str, List[float]]) -> None:
+        for key, vector in items.items():
+            self.memory.set(key, vector)
+
+        if self.store is not None:
+            self.store.set_many({
+                key: np.asarray(vector, dtype=np.float32).tobytes()
+                for key, vector in items.items()
+            })
+
+    def _pending(self, kind: str, texts: List[str]):
+        keys = [self._key(kind, t) for t in texts]
+        found = self._lookup(list(dict.fromkeys(keys)))
+        # Identical texts are embedded once
+        missing = dict((k, t) for k, t in zip(keys, texts) if k not in found)
+        return keys, found, missing
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = self._pending("doc", texts)
+
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            computed = dict(zip(missing, vectors))
+            self._remember(computed)
+            found.update(computed)
+
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        with metrics.span("rag.embed_query_s"):
+            keys, found, missing = self._pending("query", [text])
+
+            if missing:
+                vector = self.underlying.embed_query(text)
+                self._remember({keys[0]: vector})
+                return vector
+
+            return found[keys[0]]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed many queries with one backend call for the cache misses
+        (query and document embeddings are identical for our backends).
+        """
+        keys, found, missing = self._pending("query", texts)
+
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            computed = dict(zip(missing, vectors))
+            self._remember(computed)
+            found.update(computed)
+
+        return [found[key] for key in keys]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = self._pending("doc", texts)
+
+        if missing:
+            vectors = await self.underlying.aembed_documents(list(missing.values()))
+            computed = dict(zip(missing, vectors))
+            self._remember(computed)
+            found.update(computed)
+
+        return [found[key] for key in keys]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        with metrics.span("rag.embed_query_s"):
+            keys, found, missing = self._pending("query", [text])
+
+            if missing:
+                vector = await self.underlying.aembed_query(text)
+                self._remember({keys[0]: vector})
+                return vector
+
+            return found[keys[0]]
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {
+            "memory": self.memory.stats(),
+            "disk": self.store.stats() if self.store is not None else {},
+        }
+
+
+class MicroBatcher:
+    """
+    Dynamic micro-batching for single-text calls from many threads:
+    a worker collects requests for up to max_wait_s (or max_batch texts)
+    and runs them through one batched call.
+    close() answers what is queued and stops the worker.
+    """
+
+    _CLOSE = object()
+
+    def __init__(
+        self,
+        fn: Callable[[List[str]], List[List[float]]],
+        max_batch: int = 32,
+        max_wait_s: float = 0.005
+    ):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait_s = max_wait_s
+        self.batches = 0
+        self._closed = False
+        self._queue: "queue.Queue" = queue.Queue()
+        self._worker = threading.Thread(target=self._loop, name="embed-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, text: str) -> List[float]:
+        if self._closed:
+            raise RuntimeError("MicroBatcher is closed")
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future.result()
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(self._CLOSE)
+        self._worker.join(timeout)
+
+    def _loop(self) -> None:
+        closing = False
+        while not closing:
+            item = self._queue.get()
+            if item is self._CLOSE:
+                return
+
+            pending = [item]
+            try:
+                while len(pending) < self.max_batch:
+                    item = self._queue.get(timeout=self.max_wait_s)
+                    if item is self._CLOSE:
+                        closing = True
+                        break
+                    pending.append(item)
+            except queue.Empty:
+                pass
+
+            self.batches += 1
+            try:
+                vectors = self.fn([text for text, _ in pending])
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+            else:
+                for (_, future), vector in zip(pending, vectors):
+                    future.set_result(vector)
+
+
+class LocalEmbeddings(Embeddings):
+    """
+    sentence-transformers model on CPU:
+    - Documents are encoded in batches of batch_size
+    - Concurrent embed_query calls are micro-batched into one forward pass
+    - runtime "onnx" uses the ONNX Runtime backend; with int8 it loads
+      a pre-quantized export (onnx_file, default DEFAULT_ONNX_INT8_FILE).
+      int8 on "torch" applies dynamic int8 quantization to Linear layers
+    - threads caps torch intra-op CPU threads (0 = library default)
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        runtime: str = "torch",
+        int8: bool = False,
+        onnx_file: str = "",
+        threads: int = 0,
+        batch_size: int = 32,
+        max_wait_ms: float = 5.0
+    ):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if threads > 0:
+            torch.set_num_threads(threads)
+
+        if runtime == "onnx":
+            if int8 and not onnx_file:
+                onnx_file = DEFAULT_ONNX_INT8_FILE
+            model_kwargs = {"file_name": onnx_file} if onnx_file else None
+            self.model = SentenceTransformer(
+                model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs
+            )
+        else:
+            self.model = SentenceTransformer(model_name, device="cpu")
+            if int8:
+                self.model = torch.quantization.quantize_dynamic(
+                    self.model, {torch.nn.Linear}, dtype=torch.qint8
+                )
+
+        self.batch_size = batch_size
+        self.batcher = MicroBatcher(self._encode, max_batch=batch_size, max_wait_s=max_wait_ms / 1000)
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return vectors.astype(np.float32).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(texts) if texts else []
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.batcher.submit(text)
+
+    def close(self) -> None:
+        self.batcher.close()
+
+
+def embed_queries(embeddings: Embeddings, texts: List[str]) -> List[List[float]]:
+    """
+    Batch query embedding for any embedding function.
+    """
+    if isinstance(embeddings, CachedEmbeddings):
+        return embeddings.embed_queries(texts)
+    return embeddings.embed_documents(texts)
+
+
+def embedding_signature() -> str:
+    """
+    Identifies the vectors a backend produces; recorded on the Chroma
+    collection so a store built with another backend is rejected at load.
+    """
+    if settings.EMBED_BACKEND == "local":
+        signature = f"local:{settings.EMBED_MODEL}"
+        if settings.EMBED_INT8:
+            signature += ":int8"
+        return signature
+    if settings.EMBED_BACKEND == "fake":
+        return f"fake:hash-{settings.FAKE_EMBED_DIM}"
+    return f"{settings.EMBED_BACKEND}:{settings.EMBED_MODEL}"
+
+
+def build_embedding_backend() -> Embeddings:
+    """
+    Uncached embedding backend selected by settings.EMBED_BACKEND.
+    """
+    if settings.EMBED_BACKEND == "openai":
+        http_client, http_async_client = get_http_clients()
+        return OpenAIEmbeddings(
+            model=settings.EMBED_MODEL,
+            api_key=settings.OPENAI_API_KEY,
+            http_client=http_client,
+            http_async_client=http_async_client
+        )
+
+    if settings.EMBED_BACKEND == "local":
+        logger.info("Loading local embedding model %s (%s)", settings.EMBED_MODEL, settings.EMBED_RUNTIME)
+        return LocalEmbeddings(
+            settings.EMBED_MODEL,
+            runtime=settings.EMBED_RUNTIME,
+            int8=settings.EMBED_INT8,
+            onnx_file=settings.EMBED_ONNX_FILE,
+            threads=settings.EMBED_THREADS,
+            batch_size=settings.EMBED_BATCH_SIZE,
+            max_wait_ms=settings.EMBED_MAX_WAIT_MS
+        )
+
+    if settings.EMBED_BACKEND == "fake":
+        from rag.fakes import FakeEmbeddings
+
+        return FakeEmbeddings(
+            dim=settings.FAKE_EMBED_DIM,
+            latency_s=settings.FAKE_EMBED_LATENCY_MS / 1000
+        )
+
+    raise ValueError(f"Unknown EMBED_BACKEND: {settings.EMBED_BACKEND!r}")
+
+
+_embeddings: Optional[CachedEmbeddings] = None
+_lock = threading.Lock()
+
+
+def get_embeddings() -> CachedEmbeddings:
+    """
+    Return the process-wide cached embedding function.
+    Every embedding call site (ingestion + query) goes through it.
+    """
+    global _embeddings
+
+    if _embeddings is None:
+        with _lock:
+            if _embeddings is None:
+                _embeddings = CachedEmbeddings(
+                    build_embedding_backend(),
+                    # OpenAI vectors keep their original cache namespace
+                    namespace=(
+                        settings.EMBED_MODEL
+                        if settings.EMBED_BACKEND == "openai"
+                        else embedding_signature()
+                    ),
+                    store=PersistentCache(
+                        settings.EMBED_CACHE_PATH,
+                        max_entries=settings.EMBED_CACHE_MAX_ENTRIES
+                    ),
+                    memory_size=settings.EMBED_CACHE_MEMORY_SIZE
+                )
+                metrics.register_collector("embed_cache", _embeddings.stats)
+
+    return _embeddings
@@ -0,0 +1,184 @@
+"""
+Deterministic offline stand-ins for ChatOpenAI and OpenAIEmbeddings.
+
+Selected with LLM_BACKEND=fake / EMBED_BACKEND=fake, so tests and
+benchmarks run without network access or API keys. Both simulate
+latency (FAKE_* settings); the vectors and answers depend only on the
+input text, so runs are reproducible.
+"""
+import asyncio
+import hashlib
+import re
+import time
+from functools import lru_cache
+from typing import Any, AsyncIterator, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+# Words the fake router associates with each category; the synthetic
+# corpus (rag.benchmarks.corpus) draws from the same vocabulary
+CATEGORY_WORDS = {
+    "policies": "policy privacy consent retention terms notice rights opt sharing".split(),
+    "medical": "medical clinical health patient record diagnosis treatment physician care".split(),
+    "device": "device sensor battery accuracy calibration firmware heart rate tracker".split(),
+    "membership": "membership member plan renewal benefit discount cancel family billing".split(),
+}
+
+NOT_FOUND = "I cannot find this information in the provided documents."
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+@lru_cache(maxsize=65536)
+def _feature(token: str, dim: int) -> Tuple[int, float]:
+    digest = hashlib.md5(token.encode("utf-8")).digest()
+    index = int.from_bytes(digest[:4], "little") % dim
+    return index, 1.0 if digest[4] & 1 else -1.0
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Feature-hashed bag of words, L2-normalized: texts sharing words get
+    similar vectors, so retrieval and centroid routing behave sensibly.
+    Each call sleeps latency_s plus per_text_s per text.
+    """
+
+    def __init__(self, dim: int = 256, latency_s: float = 0.0, per_text_s: float = 0.0):
+        self.dim = dim
+        self.latency_s = latency_s
+        self.per_text_s = per_text_s
+        self.calls = 0
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in _TOKEN.findall(text.lower()):
+            index, sign = _feature(token, self.dim)
+            vector[index] += sign
+
+        norm = np.linalg.norm(vector)
+        if not norm:
+            vector[0], norm = 1.0, 1.0
+        return (vector / norm).tolist()
+
+    def _delay(self, texts: List[str]) -> float:
+        self.calls += 1
+        return self.latency_s + self.per_text_s * len(texts)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self._delay(texts))
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self._delay(texts))
+        return [self._vector(t) for t in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+def _first_sentences(text: str, words: int = 40) -> str:
+    text = " ".join(text.split())
+    sentence = re.split(r"(?<=[.!?])\s", text, maxsplit=1)[0]
+    return " ".join(sentence.split()[:words])
+
+
+def fake_answer(prompt: str) -> str:
+    """
+    Deterministic reply to the prompts this package sends:
+    routing → best keyword category, summary → first sentence,
+    grounded answer → first sentence of the context.
+    """
+    if "Classify the user query" in prompt:
+        query = prompt.rsplit("Query:", 1)[-1].lower()
+        tokens = set(_TOKEN.findall(query))
+        scores = {c: len(tokens & set(words)) for c, words in CATEGORY_WORDS.items()}
+        return max(scores, key=lambda c: scores[c])
+
+    if prompt.startswith("Summarize this text"):
+        return _first_sentences(prompt.split("\n\n", 1)[-1], words=25)
+
+    match = re.search(r"Context:\n(.*?)\n\s*Question:", prompt, re.S)
+    if match is not None:
+        # Skip the [Source ...] header lines of each block
+        lines = [line for line in match.group(1).splitlines() if line.strip() and not line.startswith("[")]
+        return _first_sentences(" ".join(lines)) if lines else NOT_FOUND
+
+    return _first_sentences(prompt)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model answering with fake_answer(): waits latency_s before the
+    first token and token_latency_s per following token (streamed per word).
+    """
+
+    latency_s: float = 0.0
+    token_latency_s: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    @staticmethod
+    def _tokens(messages: List[BaseMessage]) -> List[str]:
+        answer = fake_answer(str(messages[-1].content))
+        return re.findall(r"\S+\s*", answer)
+
+    def _duration(self, tokens: List[str]) -> float:
+        return self.latency_s + self.token_latency_s * max(len(tokens) - 1, 0)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        tokens = self._tokens(messages)
+        time.sleep(self._duration(tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        tokens = self._tokens(messages)
+        await asyncio.sleep(self._duration(tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        for i, token in enumerate(self._tokens(messages)):
+            time.sleep(self.token_latency_s if i else self.latency_s)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        for i, token in enumerate(self._tokens(messages)):
+            await asyncio.sleep(self.token_latency_s if i else self.latency_s)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
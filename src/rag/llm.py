@@ -0,0 +1,82 @@
+import threading
+from typing import Optional, Tuple
+
+import httpx
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_openai import ChatOpenAI
+
+from rag.settings import settings
+
+
+_llm: Optional[BaseChatModel] = None
+_http: Optional[Tuple[httpx.Client, httpx.AsyncClient]] = None
+_lock = threading.Lock()
+_http_lock = threading.Lock()
+
+
+def get_http_clients() -> Tuple[httpx.Client, httpx.AsyncClient]:
+    """
+    Return the process-wide (sync, async) HTTP clients for OpenAI calls.
+
+    Chat and embedding requests share one keep-alive connection pool per
+    client, sized by OPENAI_MAX_CONNECTIONS, so concurrent requests reuse
+    warm TLS connections instead of opening new ones.
+    """
+    global _http
+
+    if _http is None:
+        with _http_lock:
+            if _http is None:
+                limits = httpx.Limits(
+                    max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.OPENAI_KEEPALIVE_CONNECTIONS
+                )
+                timeout = httpx.Timeout(settings.OPENAI_TIMEOUT_S)
+                _http = (
+                    httpx.Client(limits=limits, timeout=timeout),
+                    httpx.AsyncClient(limits=limits, timeout=timeout)
+                )
+
+    return _http
+
+
+def build_chat_model(**kwargs) -> BaseChatModel:
+    """
+    Chat model selected by settings.LLM_BACKEND, on the pooled clients.
+    """
+    if settings.LLM_BACKEND == "fake":
+        from rag.fakes import FakeChatModel
+
+        return FakeChatModel(
+            latency_s=settings.FAKE_LLM_LATENCY_MS / 1000,
+            token_latency_s=settings.FAKE_LLM_TOKEN_MS / 1000
+        )
+
+    if settings.LLM_BACKEND != "openai":
+        raise ValueError(f"Unknown LLM_BACKEND: {settings.LLM_BACKEND!r}")
+
+    http_client, http_async_client = get_http_clients()
+    return ChatOpenAI(
+        model=settings.MODEL_NAME,
+        api_key=settings.OPENAI_API_KEY,
+        http_client=http_client,
+        http_async_client=http_async_client,
+        **kwargs
+    )
+
+
+def get_llm() -> BaseChatModel:
+    """
+    Return the process-wide chat model.
+
+    A single ChatOpenAI instance means a single underlying HTTP
+    connection pool shared by the router, agents and debugger.
+    """
+    global _llm
+
+    if _llm is None:
+        with _lock:
+            if _llm is None:
+                _llm = build_chat_model(temperature=0)
+
+    return _llm
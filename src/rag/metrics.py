@@ -0,0 +1,250 @@
+import contextvars
+import functools
+import os
+import re
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+# Histogram bucket upper bounds ("le"); +Inf is implicit.
+# Metrics named *_s are latencies in seconds, everything else sizes/counts
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+
+class Metric:
+    """
+    Rolling window of observations (e.g. latencies in seconds)
+    with lifetime count / total and cumulative histogram buckets.
+    """
+
+    def __init__(self, name: str, window: int = 1024, buckets: Optional[Sequence[float]] = None):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+        self.buckets = tuple(buckets or (LATENCY_BUCKETS if name.endswith("_s") else SIZE_BUCKETS))
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self._values: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.total += value
+            self.bucket_counts[bisect_left(self.buckets, value)] += 1
+            self._values.append(value)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            values = sorted(self._values)
+
+        if not values:
+            return None
+        index = min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))
+        return values[index]
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+_metrics: Dict[str, Metric] = {}
+_collectors: Dict[str, Callable[[], Dict[str, Any]]] = {}
+_lock = threading.Lock()
+
+# Per-request timings (see trace())
+_trace: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("rag_trace", default=None)
+
+
+def get_metric(name: str) -> Metric:
+    metric = _metrics.get(name)
+    if metric is None:
+        with _lock:
+            metric = _metrics.setdefault(name, Metric(name))
+    return metric
+
+
+def observe(name: str, value: float) -> None:
+    get_metric(name).observe(value)
+
+    timings = _trace.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + value
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """
+    Time the block into the histogram name (seconds; name ends in _s).
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+@contextmanager
+def trace() -> Iterator[Dict[str, float]]:
+    """
+    Collect everything observed in this context (spans, token counts)
+    into a dict of name -> summed value, e.g. to show one query's timings.
+    """
+    timings: Dict[str, float] = {}
+    token = _trace.set(timings)
+    try:
+        yield timings
+    finally:
+        _trace.reset(token)
+
+
+def with_context(fn: Callable) -> Callable:
+    """
+    Wrap fn to run in a copy of the caller's context, so spans recorded on
+    executor threads still reach the caller's trace().
+    """
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+def register_collector(name: str, fn: Callable[[], Dict[str, Any]]) -> None:
+    """
+    Export the numeric values of fn() (e.g. a cache's stats()) as gauges.
+    """
+    _collectors[name] = fn
+
+
+def _numbers(values: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in values.items():
+        if isinstance(value, dict):
+            flat.update(_numbers(value, f"{prefix}{key}_"))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = float(value)
+    return flat
+
+
+def collect() -> Dict[str, Dict[str, float]]:
+    return {name: _numbers(fn()) for name, fn in sorted(_collectors.items())}
+
+
+def snapshot() -> Dict[str, Dict[str, Optional[float]]]:
+    return {name: metric.summary() for name, metric in sorted(_metrics.items())}
+
+
+def _prom_name(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def prometheus_text() -> str:
+    """
+    Prometheus text exposition: one histogram per metric, one gauge per
+    collector value.
+    """
+    lines: List[str] = []
+
+    for name, metric in sorted(_metrics.items()):
+        prom = _prom_name(name)
+        with metric._lock:
+            counts, total, count = list(metric.bucket_counts), metric.total, metric.count
+
+        lines.append(f"# TYPE {prom} histogram")
+        cumulative = 0
+        for le, bucket in zip(metric.buckets, counts):
+            cumulative += bucket
+            lines.append(f'{prom}_bucket{{le="{le}"}} {cumulative}')
+        lines.append(f'{prom}_bucket{{le="+Inf"}} {count}')
+        lines.append(f"{prom}_sum {total}")
+        lines.append(f"{prom}_count {count}")
+
+    for name, values in collect().items():
+        for key, value in sorted(values.items()):
+            prom = _prom_name(f"rag_{name}_{key}")
+            lines.append(f"# TYPE {prom} gauge")
+            lines.append(f"{prom} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+class SamplingProfiler:
+    """
+    Low-overhead sampling profiler for a single request:
+    - A background thread records the stacks of the target threads
+      (default: the thread that started it) every interval_s
+    - Stacks are kept folded ("outer;...;inner" -> samples), the format
+      flame graph tools read
+    """
+
+    def __init__(self, interval_s: float = 0.005, thread_ids: Optional[Sequence[int]] = None):
+        self.interval_s = interval_s
+        self.thread_ids = tuple(thread_ids) if thread_ids else None
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _frame_name(frame) -> str:
+        code = frame.f_code
+        return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+    def _run(self, targets: Tuple[int, ...]) -> None:
+        while not self._stop.wait(self.interval_s):
+            frames = sys._current_frames()
+            for thread_id in targets:
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    stack.append(self._frame_name(frame))
+                    frame = frame.f_back
+                if stack:
+                    self.stacks[";".join(reversed(stack))] += 1
+                    self.samples += 1
+
+    def __enter__(self) -> "SamplingProfiler":
+        targets = self.thread_ids or (threading.get_ident(),)
+        self._thread = threading.Thread(target=self._run, args=(targets,), name="rag-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def top(self, n: int = 15) -> List[Tuple[str, float]]:
+        """
+        Functions by inclusive share of samples (fraction 0–1).
+        """
+        inclusive: Counter = Counter()
+        for stack, samples in self.stacks.items():
+            for frame in set(stack.split(";")):
+                inclusive[frame] += samples
+
+        total = self.samples or 1
+        return [(frame, samples / total) for frame, samples in inclusive.most_common(n)]
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {samples}" for stack, samples in self.stacks.most_common())
+
+
+@contextmanager
+def profile(enabled: bool = True, interval_s: float = 0.005) -> Iterator[Optional[SamplingProfiler]]:
+    """
+    Per-request switch: samples the block when enabled, else yields None.
+    """
+    if not enabled:
+        yield None
+        return
+
+    with SamplingProfiler(interval_s=interval_s) as profiler:
+        yield profiler
@@ -1,71 +1,88 @@
-from typing import Dict, Any, List, Optional
+import logging
+import time
+from typing import Dict, Any, AsyncIterator, Iterator, List, Optional, Sequence
 
 from langchain_openai import ChatOpenAI
 from langchain_core.documents import Document
 
-from rag.settings import settings
+from rag import metrics
+from rag.answer_cache import AnswerCache, get_answer_cache
+from rag.context_builder import ContextBuilder
+from rag.llm import get_llm
 from rag.retrievers.production import ProductionRetriever
+from rag.routing import normalize_query
+from rag.settings import settings
+from rag.singleflight import SingleFlight
+
+
+logger = logging.getLogger(__name__)
 
 
 class RAGPipeline:
     """
     RAG pipeline:
     - Uses ProductionRetriever for retrieval
+    - Packs retrieved chunks into a token-budgeted context
     - Builds grounded prompt
     - Calls LLM for final answer
-    """
+    - Serves paraphrases of answered questions from the semantic
+      answer cache (skipping retrieval and generation)
+
+    stream() / astream() yield events instead of a single result:
+      {"type": "sources", "documents": [...], "context": "..."}
+      {"type": "token", "content": "..."}            (repeated)
+      {"type": "done", "answer": "...", "ttft_s": ...}
 
-    def __init__(self):
-        self.retriever = ProductionRetriever()
+    retrieve_only() stops before generation and reports every retrieval
+    stage (retrieval debugger).
 
-        self.llm = ChatOpenAI(
-            model=settings.MODEL_NAME,
-            temperature=0,
-            api_key=settings.OPENAI_API_KEY
+    run_batch() answers many queries with batched retrieval and
+    concurrency-limited batched generation (offline evaluation, bulk Q&A).
+    """
+
+    def __init__(
+        self,
+        retriever: Optional[ProductionRetriever] = None,
+        llm: Optional[ChatOpenAI] = None,
+        answer_cache: Optional[AnswerCache] = None,
+        context_builder: Optional[ContextBuilder] = None
+    ):
+        self.retriever = retriever or ProductionRetriever()
+        self.llm = llm or get_llm()
+        self.answer_cache = answer_cache if answer_cache is not None else get_answer_cache()
+        self.context_builder = context_builder or ContextBuilder(
+            token_budget=settings.CONTEXT_TOKEN_BUDGET,
+            full_chunks=settings.CONTEXT_FULL_CHUNKS
         )
+        # Coalesces identical in-flight run()/arun() calls
+        self.inflight = SingleFlight() if settings.COALESCE_REQUESTS else None
 
     def _build_context(self, docs: List[Document]) -> str:
         """
-        Build context string from retrieved documents.
+        Build context string from retrieved documents
+        (within the token budget; see ContextBuilder).
         """
-        context_blocks = []
-
-        for d in docs:
-            block = (
-                f"[Source: {d.metadata.get('document_name')} | "
-                f"Category: {d.metadata.get('category')}]\n"
-                f"{d.page_content}"
-            )
-            context_blocks.append(block)
+        with metrics.span("rag.context_s"):
+            packed = self.context_builder.build(docs)
 
-        return "\n\n".join(context_blocks)
+        # Shown by the retrieval debugger
+        for i, d in enumerate(docs):
+            d.metadata["context_mode"] = packed.modes.get(i, "dropped")
 
-    def run(
-        self,
-        query: str,
-        category: Optional[str] = None,
-        k: int = 6
-    ) -> Dict[str, Any]:
+        return packed.text
 
-        #Retrieve documents
-        retrieved_docs = self.retriever.retrieve(
-            query=query,
-            category=category,
-            k=k
-        )
+    def _build_prompt(self, query: str, context: str) -> str:
+        prompt = self._prompt_template(query, context)
 
-        if not retrieved_docs:
-            return {
-                "answer": "I could not find relevant information in the documents.",
-                "documents": [],
-                "context": ""
-            }
+        tokens = self.context_builder.count_tokens(prompt)
+        metrics.observe("rag.prompt_tokens", tokens)
+        logger.info("Prompt tokens: %d (budget %d for context)", tokens, self.context_builder.token_budget)
 
-        #Build context
-        context = self._build_context(retrieved_docs)
+        return prompt
 
-        #Build prompt (grounded)
-        prompt = f"""
+    @staticmethod
+    def _prompt_template(query: str, context: str) -> str:
+        return f"""
 You are an AI assistant answering questions strictly from internal documents.
 
 Rules:
@@ -83,11 +100,464 @@ Question:
 Answer clearly and concisely.
 """
 
+    @staticmethod
+    def _no_results() -> Dict[str, Any]:
+        return {
+            "answer": "I could not find relevant information in the documents.",
+            "documents": [],
+            "context": ""
+        }
+
+    @staticmethod
+    def _answer_events(answer: str) -> List[Dict[str, Any]]:
+        return [
+            {"type": "sources", "documents": [], "context": ""},
+            {"type": "token", "content": answer},
+            {"type": "done", "answer": answer, "ttft_s": None},
+        ]
+
+    def _record_completion(self, answer: str) -> None:
+        metrics.observe("rag.completion_tokens", self.context_builder.count_tokens(answer))
+
+    @staticmethod
+    def _first_token(started: float) -> float:
+        # Measured from the start of the request, retrieval included
+        ttft = time.perf_counter() - started
+        metrics.observe("rag.ttft_s", ttft)
+        return ttft
+
+    # ---------------------------------------------------------
+    # Answer cache
+    # ---------------------------------------------------------
+    @staticmethod
+    def _scope(category: Optional[str], k: int) -> str:
+        return f"{category or '*'}:{k}"
+
+    def _valid_ids(self):
+        # Cited chunks must still be in the collection snapshot
+        context = self.retriever.context
+        return context.id_set if context is not None else None
+
+    def cached_answer(self, query: str, scope: str) -> Optional[Dict[str, Any]]:
+        if self.answer_cache is None:
+            return None
+        return self.answer_cache.lookup(query, scope, self._valid_ids())
+
+    async def acached_answer(self, query: str, scope: str) -> Optional[Dict[str, Any]]:
+        if self.answer_cache is None:
+            return None
+        return await self.answer_cache.alookup(query, scope, self._valid_ids())
+
+    def index_generation(self) -> Optional[int]:
+        # Read before retrieval, so an answer is never tagged with a
+        # newer index generation than the one it was retrieved from
+        context = self.retriever.context
+        return context.generation if context is not None else None
+
+    def remember_answer(
+        self,
+        query: str,
+        scope: str,
+        result: Dict[str, Any],
+        generation: Optional[int] = None
+    ) -> None:
+        if self.answer_cache is not None:
+            self.answer_cache.store(query, scope, result, generation)
+
+    async def aremember_answer(
+        self,
+        query: str,
+        scope: str,
+        result: Dict[str, Any],
+        generation: Optional[int] = None
+    ) -> None:
+        if self.answer_cache is not None:
+            await self.answer_cache.astore(query, scope, result, generation)
+
+    def cached_events(self, result: Dict[str, Any], started: float) -> List[Dict[str, Any]]:
+        sources = {
+            "type": "sources",
+            "documents": result["documents"],
+            "context": result["context"]
+        }
+        token = {"type": "token", "content": result["answer"]}
+        done = {"type": "done", "answer": result["answer"], "ttft_s": self._first_token(started)}
+        return [sources, token, done]
+
+    def _flight_key(self, query: str, category: Optional[str], k: int):
+        return (normalize_query(query), category, k)
+
+    def run(
+        self,
+        query: str,
+        category: Optional[str] = None,
+        k: int = 6
+    ) -> Dict[str, Any]:
+        """
+        Answer a query; identical concurrent calls share one execution.
+        """
+        with metrics.span("rag.request_s"):
+            if self.inflight is None:
+                return self._run(query, category, k)
+
+            return self.inflight.do(
+                self._flight_key(query, category, k),
+                lambda: self._run(query, category, k)
+            )
+
+    async def arun(
+        self,
+        query: str,
+        category: Optional[str] = None,
+        k: int = 6
+    ) -> Dict[str, Any]:
+        """
+        Async variant of run(): retrieval legs run concurrently.
+        """
+        with metrics.span("rag.request_s"):
+            if self.inflight is None:
+                return await self._arun(query, category, k)
+
+            return await self.inflight.ado(
+                self._flight_key(query, category, k),
+                lambda: self._arun(query, category, k)
+            )
+
+    def retrieve_only(
+        self,
+        query: str,
+        category: Optional[str] = None,
+        k: int = 6,
+        filters: Optional[Dict[str, str]] = None,
+        weights: Optional[Dict[str, float]] = None,
+        expand: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Retrieval debugger: run() up to the packed context, no generation
+        and no answer cache. Returns the leg candidates, fused pool, final
+        documents, packed context, filter effect and per-stage timings
+        (see ProductionRetriever.explain). answer_context() generates
+        from the result on request.
+        """
+        with metrics.trace() as timings:
+            with metrics.span("rag.retrieve_s"):
+                report = self.retriever.explain(
+                    query,
+                    category=category,
+                    k=k,
+                    filters=filters,
+                    weights=weights,
+                    expand=expand
+                )
+            docs = report.pop("results")
+            context = self._build_context(docs) if docs else ""
+
+        report.update(
+            documents=[d.metadata for d in docs],
+            context=context,
+            context_tokens=self.context_builder.count_tokens(context),
+            timings=timings,
+            filter_effect=self.retriever.filter_effect(query, report["filters"], report["candidates"])
+        )
+        return report
+
+    def answer_context(self, query: str, context: str) -> str:
+        """
+        Generate an answer from an already packed context (e.g. from
+        retrieve_only()).
+        """
+        if not context:
+            return self._no_results()["answer"]
+
+        with metrics.span("rag.llm_s"):
+            response = self.llm.invoke(self._build_prompt(query, context))
+
+        answer = response.content.strip()
+        self._record_completion(answer)
+        return answer
+
+    def _run(
+        self,
+        query: str,
+        category: Optional[str] = None,
+        k: int = 6
+    ) -> Dict[str, Any]:
+
+        scope = self._scope(category, k)
+        index_generation = self.index_generation()
+        cached = self.cached_answer(query, scope)
+        if cached is not None:
+            return cached
+
+        #Retrieve documents
+        with metrics.span("rag.retrieve_s"):
+            retrieved_docs = self.retriever.retrieve(
+                query=query,
+                category=category,
+                k=k
+            )
+
+        if not retrieved_docs:
+            return self._no_results()
+
+        #Build context
+        context = self._build_context(retrieved_docs)
+
+        #Build prompt (grounded)
+        prompt = self._build_prompt(query, context)
+
         #LLM call
-        response = self.llm.invoke(prompt)
+        with metrics.span("rag.llm_s"):
+            response = self.llm.invoke(prompt)
 
-        return {
+        result = {
+            "answer": response.content.strip(),
+            "documents": [d.metadata for d in retrieved_docs],
+            "context": context
+        }
+        self._record_completion(result["answer"])
+        self.remember_answer(query, scope, result, index_generation)
+        return result
+
+    async def _arun(
+        self,
+        query: str,
+        category: Optional[str] = None,
+        k: int = 6
+    ) -> Dict[str, Any]:
+        scope = self._scope(category, k)
+        index_generation = self.index_generation()
+        cached = await self.acached_answer(query, scope)
+        if cached is not None:
+            return cached
+
+        with metrics.span("rag.retrieve_s"):
+            retrieved_docs = await self.retriever.aretrieve(
+                query=query,
+                category=category,
+                k=k
+            )
+
+        if not retrieved_docs:
+            return self._no_results()
+
+        context = self._build_context(retrieved_docs)
+        prompt = self._build_prompt(query, context)
+
+        with metrics.span("rag.llm_s"):
+            response = await self.llm.ainvoke(prompt)
+
+        result = {
             "answer": response.content.strip(),
             "documents": [d.metadata for d in retrieved_docs],
             "context": context
         }
+        self._record_completion(result["answer"])
+        await self.aremember_answer(query, scope, result, index_generation)
+        return result
+
+    def stream(
+        self,
+        query: str,
+        category: Optional[str] = None,
+        k: int = 6
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Streaming variant of run(): sources first, then answer tokens.
+        """
+        started = time.perf_counter()
+
+        scope = self._scope(category, k)
+        index_generation = self.index_generation()
+        cached = self.cached_answer(query, scope)
+        if cached is not None:
+            yield from self.cached_events(cached, started)
+            return
+
+        with metrics.span("rag.retrieve_s"):
+            retrieved_docs = self.retriever.retrieve(
+                query=query,
+                category=category,
+                k=k
+            )
+
+        if not retrieved_docs:
+            yield from self._answer_events(self._no_results()["answer"])
+            return
+
+        context = self._build_context(retrieved_docs)
+        yield {
+            "type": "sources",
+            "documents": [d.metadata for d in retrieved_docs],
+            "context": context
+        }
+
+        parts: List[str] = []
+        ttft = None
+
+        prompt = self._build_prompt(query, context)
+        generation_started = time.perf_counter()
+
+        for chunk in self.llm.stream(prompt):
+            if not chunk.content:
+                continue
+            if ttft is None:
+                ttft = self._first_token(started)
+                metrics.observe("rag.llm_ttft_s", time.perf_counter() - generation_started)
+            parts.append(chunk.content)
+            yield {"type": "token", "content": chunk.content}
+
+        answer = "".join(parts).strip()
+        metrics.observe("rag.llm_s", time.perf_counter() - generation_started)
+        metrics.observe("rag.request_s", time.perf_counter() - started)
+        self._record_completion(answer)
+        self.remember_answer(query, scope, {
+            "answer": answer,
+            "documents": [d.metadata for d in retrieved_docs],
+            "context": context
+        }, index_generation)
+        yield {"type": "done", "answer": answer, "ttft_s": ttft}
+
+    async def astream(
+        self,
+        query: str,
+        category: Optional[str] = None,
+        k: int = 6
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Async variant of stream().
+        """
+        started = time.perf_counter()
+
+        scope = self._scope(category, k)
+        index_generation = self.index_generation()
+        cached = await self.acached_answer(query, scope)
+        if cached is not None:
+            for event in self.cached_events(cached, started):
+                yield event
+            return
+
+        with metrics.span("rag.retrieve_s"):
+            retrieved_docs = await self.retriever.aretrieve(
+                query=query,
+                category=category,
+                k=k
+            )
+
+        if not retrieved_docs:
+            for event in self._answer_events(self._no_results()["answer"]):
+                yield event
+            return
+
+        context = self._build_context(retrieved_docs)
+        yield {
+            "type": "sources",
+            "documents": [d.metadata for d in retrieved_docs],
+            "context": context
+        }
+
+        parts: List[str] = []
+        ttft = None
+
+        prompt = self._build_prompt(query, context)
+        generation_started = time.perf_counter()
+
+        async for chunk in self.llm.astream(prompt):
+            if not chunk.content:
+                continue
+            if ttft is None:
+                ttft = self._first_token(started)
+                metrics.observe("rag.llm_ttft_s", time.perf_counter() - generation_started)
+            parts.append(chunk.content)
+            yield {"type": "token", "content": chunk.content}
+
+        answer = "".join(parts).strip()
+        metrics.observe("rag.llm_s", time.perf_counter() - generation_started)
+        metrics.observe("rag.request_s", time.perf_counter() - started)
+        self._record_completion(answer)
+        await self.aremember_answer(query, scope, {
+            "answer": answer,
+            "documents": [d.metadata for d in retrieved_docs],
+            "context": context
+        }, index_generation)
+        yield {"type": "done", "answer": answer, "ttft_s": ttft}
+
+    # ---------------------------------------------------------
+    # Batch
+    # ---------------------------------------------------------
+    @staticmethod
+    def _failed(error: Exception) -> Dict[str, Any]:
+        return {"answer": "", "documents": [], "context": "", "error": repr(error)}
+
+    def run_batch(
+        self,
+        queries: Sequence[str],
+        categories: Optional[Sequence[Optional[str]]] = None,
+        k: int = 6,
+        concurrency: Optional[int] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Answer many queries, yielding run()-shaped results in input order
+        as each chunk of BATCH_CHUNK_SIZE queries completes:
+        - One batched retrieval per chunk (see retrieve_batch)
+        - One llm.batch() call per chunk, at most concurrency requests
+          in flight
+        - A query that fails carries "error" instead of aborting the batch
+        The answer cache and single-flight are bypassed, so every query is
+        answered from the current index.
+        """
+        queries = list(queries)
+        categories = list(categories) if categories is not None else [None] * len(queries)
+        concurrency = concurrency or settings.BATCH_CONCURRENCY
+        size = max(1, settings.BATCH_CHUNK_SIZE)
+
+        for start in range(0, len(queries), size):
+            yield from self._run_chunk(
+                queries[start:start + size],
+                categories[start:start + size],
+                k,
+                concurrency
+            )
+
+    def _run_chunk(
+        self,
+        queries: List[str],
+        categories: List[Optional[str]],
+        k: int,
+        concurrency: int
+    ) -> List[Dict[str, Any]]:
+        try:
+            retrieved = self.retriever.retrieve_batch(queries, categories, k=k)
+        except Exception as e:
+            logger.warning("Batch retrieval failed for %d queries (%r)", len(queries), e)
+            return [self._failed(e) for _ in queries]
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(queries)
+        contexts: Dict[int, str] = {}
+        prompts: List[str] = []
+
+        for i, (query, docs) in enumerate(zip(queries, retrieved)):
+            if not docs:
+                results[i] = self._no_results()
+                continue
+            contexts[i] = self._build_context(docs)
+            prompts.append(self._build_prompt(query, contexts[i]))
+
+        responses = self.llm.batch(
+            prompts,
+            config={"max_concurrency": concurrency},
+            return_exceptions=True
+        ) if prompts else []
+
+        for i, response in zip(contexts, responses):
+            if isinstance(response, Exception):
+                logger.warning("Batch generation failed for %r (%r)", queries[i], response)
+                results[i] = self._failed(response)
+                continue
+            results[i] = {
+                "answer": response.content.strip(),
+                "documents": [d.metadata for d in retrieved[i]],
+                "context": contexts[i]
+            }
+
+        return results
@@ -0,0 +1,337 @@
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+
+from rag import metrics
+from rag.answer_cache import get_answer_cache
+from rag.settings import settings
+from rag.retrievers.vectorstore import load_vectorstore
+from rag.retrievers.sparse_bm25 import load_or_build_bm25
+from rag.retrievers.neighbours import NeighbourIndex
+from rag.retrievers.dense import DenseIndex, load_or_build_dense
+from rag.embeddings import embedding_signature
+
+
+logger = logging.getLogger(__name__)
+
+
+def read_generation(path: str) -> int:
+    """
+    Index generation last published by ingestion (0 before the first).
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            return int(json.load(f).get("generation", 0))
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def publish_generation(path: str, **info) -> int:
+    """
+    Bump the generation after ingestion changed the collection; serving
+    processes pick it up on their next poll (see IndexReloader).
+    """
+    generation = read_generation(path) + 1
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"generation": generation, "published_at": time.time(), **info}, f)
+    os.replace(tmp_path, path)
+
+    return generation
+
+
+class RetrievalContext:
+    """
+    Retrieval state shared by every pipeline in the process:
+    - One Chroma client
+    - One corpus snapshot
+    - One persisted, metadata-sharded sparse BM25 index
+    - One in-process dense index when VECTOR_BACKEND is not "chroma"
+    - One neighbour index over the snapshot (built on first use)
+
+    Built from base (the generation it replaces on a hot reload), only
+    new chunks are fetched from Chroma; the rest of the snapshot and the
+    dense index rows are reused.
+    """
+
+    def __init__(
+        self,
+        vectorstore: Optional[Chroma] = None,
+        base: Optional["RetrievalContext"] = None
+    ):
+        # Read before the collection: an ingest finishing mid-build
+        # leaves a newer generation behind, so it is not missed
+        self.generation = read_generation(settings.INDEX_GENERATION_PATH)
+        self.vectorstore: Optional[Chroma] = vectorstore or load_vectorstore()
+
+        self.added: List[str] = []
+        self.removed: List[str] = []
+
+        if base is None:
+            # Load all documents ONCE for BM25
+            raw = self.vectorstore.get()
+            self.ids: List[str] = raw["ids"]
+            self.documents: List[Document] = [
+                Document(page_content=content, metadata=meta)
+                for content, meta in zip(raw["documents"], raw["metadatas"])
+            ]
+        else:
+            self.ids, self.documents = self._snapshot_delta(base)
+
+        self.id_set = frozenset(self.ids)
+
+        # Memory-mapped from disk unless the collection changed
+        self.bm25 = load_or_build_bm25(
+            self.documents,
+            self.ids,
+            index_dir=settings.BM25_INDEX_DIR,
+            shard_fields=settings.BM25_SHARD_FIELDS,
+            k1=settings.BM25_K1,
+            b=settings.BM25_B
+        )
+
+        # Exact (or HNSW) vector search without Chroma round-trips
+        self.dense: Optional[DenseIndex] = None
+        if settings.VECTOR_BACKEND != "chroma":
+            self.dense = load_or_build_dense(
+                self.vectorstore,
+                self.documents,
+                self.ids,
+                index_dir=settings.DENSE_INDEX_DIR,
+                dtype=settings.DENSE_DTYPE,
+                mask_fields=settings.DENSE_MASK_FIELDS,
+                signature=embedding_signature(),
+                hnsw=settings.VECTOR_BACKEND == "hnsw",
+                previous=base.dense if base is not None else None
+            )
+
+        self._neighbours: Optional[NeighbourIndex] = None
+        self._neighbours_lock = threading.Lock()
+
+        # Queries pinned to this generation; once replaced (retired) it
+        # is closed when the last one finishes
+        self._users = 0
+        self._retired = False
+        self._users_lock = threading.Lock()
+
+    def _snapshot_delta(self, base: "RetrievalContext") -> Tuple[List[str], List[Document]]:
+        # Chunk IDs hash text and position: a known ID is an unchanged chunk
+        ids = self.vectorstore.get(include=[])["ids"]
+        known = dict(zip(base.ids, base.documents))
+
+        self.added = [uid for uid in ids if uid not in known]
+        current = set(ids)
+        self.removed = [uid for uid in base.ids if uid not in current]
+
+        if self.added:
+            raw = self.vectorstore.get(ids=self.added, include=["documents", "metadatas"])
+            known.update(
+                (uid, Document(page_content=content, metadata=meta or {}))
+                for uid, content, meta in zip(raw["ids"], raw["documents"], raw["metadatas"])
+            )
+
+        return ids, [known[uid] for uid in ids]
+
+    def acquire(self) -> None:
+        with self._users_lock:
+            self._users += 1
+
+    def release(self) -> None:
+        with self._users_lock:
+            self._users -= 1
+            idle = self._retired and self._users == 0
+        if idle:
+            self.close()
+
+    def retire(self) -> None:
+        with self._users_lock:
+            self._retired = True
+            idle = self._users == 0
+        if idle:
+            self.close()
+
+    def close(self) -> None:
+        # Drop the Chroma client: a replaced generation's System is no
+        # longer cached, so it is released with this last reference
+        self.vectorstore = None
+
+    @property
+    def neighbours(self) -> NeighbourIndex:
+        if self._neighbours is None:
+            with self._neighbours_lock:
+                if self._neighbours is None:
+                    self._neighbours = NeighbourIndex(self.documents)
+        return self._neighbours
+
+
+class ContextHolder:
+    """
+    The live retrieval generation. swap() replaces it atomically; a
+    query pins the generation it started on (pin()), so it finishes on
+    that one even if a reload lands halfway through. A replaced
+    generation is closed after its last pinned query.
+    """
+
+    def __init__(self, context: RetrievalContext):
+        self.latest = context
+        self._pinned: contextvars.ContextVar[Optional[RetrievalContext]] = contextvars.ContextVar(
+            "rag_pinned_context", default=None
+        )
+        self._lock = threading.Lock()
+
+    @property
+    def current(self) -> RetrievalContext:
+        pinned = self._pinned.get()
+        return pinned if pinned is not None else self.latest
+
+    def swap(self, context: RetrievalContext) -> RetrievalContext:
+        """
+        Make context the live generation and retire the previous one
+        (closed as soon as no query has it pinned).
+        """
+        with self._lock:
+            previous, self.latest = self.latest, context
+        previous.retire()
+        return previous
+
+    @contextmanager
+    def pin(self) -> Iterator[RetrievalContext]:
+        # Read and acquired together: a swap cannot close it in between
+        with self._lock:
+            context = self.current
+            context.acquire()
+
+        token = self._pinned.set(context)
+        try:
+            yield context
+        finally:
+            self._pinned.reset(token)
+            context.release()
+
+
+class IndexReloader:
+    """
+    Hot index reload: polls the generation file ingestion publishes and,
+    when it moves, builds the next RetrievalContext on this background
+    thread (delta against the live one, fresh Chroma client) and swaps
+    it in. Requests never wait on a rebuild.
+    """
+
+    def __init__(
+        self,
+        holder: ContextHolder,
+        path: str,
+        interval_s: float,
+        load_fn: Optional[Callable[[], Chroma]] = None
+    ):
+        self.holder = holder
+        self.path = path
+        self.interval_s = interval_s
+        self.load_fn = load_fn or functools.partial(load_vectorstore, fresh=True)
+        self.reloads = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def check(self) -> bool:
+        """
+        Reload if a newer generation was published; returns whether the
+        live context was swapped.
+        """
+        if read_generation(self.path) == self.holder.latest.generation:
+            return False
+
+        with self._lock:
+            live = self.holder.latest
+            if read_generation(self.path) == live.generation:
+                return False
+
+            started = time.perf_counter()
+            context = RetrievalContext(vectorstore=self.load_fn(), base=live)
+            # Built here rather than by the first query after the swap
+            context.neighbours
+            self.holder.swap(context)
+            self.reloads += 1
+
+        elapsed = time.perf_counter() - started
+        metrics.observe("rag.index_reload_s", elapsed)
+        logger.info(
+            "Index generation %d live: %d chunks (+%d / -%d) in %.2fs",
+            context.generation, len(context.ids), len(context.added), len(context.removed), elapsed
+        )
+
+        # Removed chunks already fail the answer cache's validity check;
+        # new ones can change any answer (including those still being
+        # generated from the previous generation)
+        cache = get_answer_cache()
+        if cache is not None and context.added:
+            cache.clear(generation=context.generation)
+        elif cache is not None and context.removed:
+            cache.invalidate(context.removed)
+
+        return True
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.check()
+            except Exception:
+                logger.exception(
+                    "Index reload failed; still serving generation %d", self.holder.latest.generation
+                )
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="rag-index-reloader", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+_holder: Optional[ContextHolder] = None
+_reloader: Optional[IndexReloader] = None
+_lock = threading.Lock()
+
+
+def get_context_holder() -> ContextHolder:
+    """
+    Return the process-wide context holder, building the first
+    generation (and starting the reloader, unless
+    INDEX_RELOAD_INTERVAL_S is 0) on first use.
+    """
+    global _holder, _reloader
+
+    if _holder is None:
+        with _lock:
+            if _holder is None:
+                holder = ContextHolder(RetrievalContext())
+                if settings.INDEX_RELOAD_INTERVAL_S > 0:
+                    _reloader = IndexReloader(
+                        holder,
+                        settings.INDEX_GENERATION_PATH,
+                        settings.INDEX_RELOAD_INTERVAL_S
+                    )
+                    _reloader.start()
+                _holder = holder
+
+    return _holder
+
+
+def get_retrieval_context() -> RetrievalContext:
+    """
+    Return the live process-wide retrieval context, building it on first use.
+    """
+    return get_context_holder().current
@@ -0,0 +1,403 @@
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from rag.retrievers.hybrid import top_k_indices
+from rag.retrievers.sparse_bm25 import (
+    collection_fingerprint,
+    generation_dir,
+    index_lock,
+    prune_generations,
+    replacing,
+    save_array,
+)
+
+
+logger = logging.getLogger(__name__)
+
+_VECTORS_FILE = "vectors.npy"
+_HNSW_FILE = "hnsw.bin"
+_META_FILE = "meta.json"
+
+# Rows converted + scored per matmul block (small enough to stay in cache)
+_BLOCK_ROWS = 1024
+
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 200
+
+
+def quantize(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, float]:
+    """
+    Normalize rows and store them as float16, or as int8 with one scale
+    (normalized components lie in [-1, 1]).
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms == 0, 1, norms)
+
+    if dtype == "int8":
+        return np.round(vectors * 127).astype(np.int8), 1 / 127
+    if dtype == "float16":
+        return vectors.astype(np.float16), 1.0
+    raise ValueError(f"Unsupported dense index dtype: {dtype!r}")
+
+
+class DenseIndex:
+    """
+    In-process exact vector index over the collection snapshot:
+    - Normalized float16 / int8 matrix, memory-mapped from disk
+    - Exact top-k by blocked matmul (cosine similarity)
+    - Metadata filters via precomputed boolean row masks
+    - Optional HNSW graph (hnswlib) for approximate search
+    Distances are squared L2 between unit vectors (2 - 2·cos), the same
+    scale as Chroma's default space.
+    """
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        scale: float,
+        documents: List[Document],
+        doc_ids: List[str],
+        mask_fields: Sequence[str],
+        fingerprint: str,
+        signature: str,
+        hnsw=None
+    ):
+        self.vectors = vectors
+        self.scale = scale
+        self.documents = documents
+        self.doc_ids = doc_ids
+        self.mask_fields = tuple(mask_fields)
+        self.fingerprint = fingerprint
+        self.signature = signature
+        self.hnsw = hnsw
+
+        self._masks: Dict[Tuple[str, str], np.ndarray] = {}
+        for field in self.mask_fields:
+            self._build_masks(field)
+        # Masks for other fields are built on first use, from any thread
+        self._masks_lock = threading.Lock()
+
+    @property
+    def dtype(self) -> str:
+        return str(self.vectors.dtype)
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    # ---------------------------------------------------------
+    # Build / persist
+    # ---------------------------------------------------------
+    @classmethod
+    def build(
+        cls,
+        documents: List[Document],
+        ids: Sequence[str],
+        vectors: np.ndarray,
+        dtype: str = "float16",
+        mask_fields: Sequence[str] = ("category",),
+        signature: str = "",
+        hnsw: bool = False,
+        fingerprint: Optional[str] = None
+    ) -> "DenseIndex":
+        matrix, scale = quantize(vectors, dtype)
+
+        graph = None
+        if hnsw and len(ids):
+            import hnswlib
+
+            graph = hnswlib.Index(space="ip", dim=matrix.shape[1])
+            graph.init_index(max_elements=len(ids), ef_construction=HNSW_EF_CONSTRUCTION, M=HNSW_M)
+            graph.add_items(matrix.astype(np.float32) * scale, np.arange(len(ids)))
+
+        return cls(
+            matrix,
+            scale,
+            list(documents),
+            list(ids),
+            mask_fields,
+            fingerprint or collection_fingerprint(ids),
+            signature,
+            graph
+        )
+
+    def save(self, index_dir: str) -> None:
+        os.makedirs(index_dir, exist_ok=True)
+        save_array(os.path.join(index_dir, _VECTORS_FILE), self.vectors)
+
+        if self.hnsw is not None:
+            with replacing(os.path.join(index_dir, _HNSW_FILE)) as tmp_path:
+                self.hnsw.save_index(tmp_path)
+
+        meta = {
+            "fingerprint": self.fingerprint,
+            "signature": self.signature,
+            "scale": self.scale,
+            "mask_fields": list(self.mask_fields),
+            "hnsw": self.hnsw is not None,
+            "doc_ids": self.doc_ids,
+        }
+
+        # Write metadata last: its presence marks a complete index
+        with replacing(os.path.join(index_dir, _META_FILE)) as tmp_path:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+
+    @classmethod
+    def load(
+        cls,
+        index_dir: str,
+        documents_by_id: Dict[str, Document]
+    ) -> Optional["DenseIndex"]:
+        """
+        Memory-map a saved index. Returns None if it is missing or
+        references documents that are no longer in the collection.
+        """
+        meta_path = os.path.join(index_dir, _META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+
+        try:
+            documents = [documents_by_id[uid] for uid in meta["doc_ids"]]
+        except KeyError:
+            return None
+
+        try:
+            vectors = np.load(os.path.join(index_dir, _VECTORS_FILE), mmap_mode="r")
+        except FileNotFoundError:
+            # Pruned by another process between reading meta and vectors
+            return None
+
+        graph = None
+        if meta["hnsw"]:
+            import hnswlib
+
+            graph = hnswlib.Index(space="ip", dim=vectors.shape[1])
+            graph.load_index(os.path.join(index_dir, _HNSW_FILE), max_elements=len(documents))
+
+        return cls(
+            vectors,
+            meta["scale"],
+            documents,
+            meta["doc_ids"],
+            meta["mask_fields"],
+            meta["fingerprint"],
+            meta["signature"],
+            graph
+        )
+
+    # ---------------------------------------------------------
+    # Search
+    # ---------------------------------------------------------
+    def _build_masks(self, field: str) -> None:
+        values = np.array([str(d.metadata.get(field, "")) for d in self.documents], dtype=object)
+        # Published in one update, so readers never see a partial field
+        self._masks.update({(field, value): values == value for value in set(values)})
+
+    def _mask(self, filters: Dict[str, str]) -> Optional[np.ndarray]:
+        mask = None
+        for field, value in filters.items():
+            if field not in self.mask_fields:
+                with self._masks_lock:
+                    if field not in self.mask_fields:
+                        self._build_masks(field)
+                        self.mask_fields += (field,)
+
+            rows = self._masks.get((field, str(value)))
+            if rows is None:
+                return np.zeros(len(self.doc_ids), dtype=bool)
+            mask = rows if mask is None else mask & rows
+        return mask
+
+    def _scores(self, queries: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        """
+        Cosine scores, one column per query (queries: dim x n).
+        """
+        matrix = self.vectors if rows is None else self.vectors[rows]
+        scores = np.empty((len(matrix), queries.shape[1]), dtype=np.float32)
+
+        for start in range(0, len(matrix), _BLOCK_ROWS):
+            block = np.asarray(matrix[start:start + _BLOCK_ROWS], dtype=np.float32)
+            scores[start:start + len(block)] = block @ queries
+
+        return scores * self.scale
+
+    def search(
+        self,
+        vector: Sequence[float],
+        k: int,
+        filters: Optional[Dict[str, str]] = None,
+        ef: int = 64
+    ) -> List[Tuple[Document, float]]:
+        """
+        Top-k (Document, distance) pairs, nearest first.
+        """
+        return self.search_batch([vector], k, filters, ef)[0]
+
+    def search_batch(
+        self,
+        vectors: Sequence[Sequence[float]],
+        k: int,
+        filters: Optional[Dict[str, str]] = None,
+        ef: int = 64
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        search() for many query vectors sharing the same filters: one
+        pass over the matrix scores every query.
+        """
+        if not self.doc_ids or k <= 0 or not len(vectors):
+            return [[] for _ in vectors]
+
+        queries = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+
+        mask = self._mask(filters) if filters else None
+
+        if self.hnsw is not None:
+            allowed = int(mask.sum()) if mask is not None else len(self.doc_ids)
+            k = min(k, allowed)
+            if k == 0:
+                return [[] for _ in vectors]
+            self.hnsw.set_ef(max(ef, k))
+            labels, distances = self.hnsw.knn_query(
+                queries,
+                k=k,
+                filter=(lambda label: bool(mask[label])) if mask is not None else None
+            )
+            # hnswlib "ip" distance is 1 - cos
+            return [
+                [(self.documents[int(row)], float(2 * d)) for row, d in zip(row_labels, row_distances)]
+                for row_labels, row_distances in zip(labels, distances)
+            ]
+
+        rows = np.flatnonzero(mask) if mask is not None else None
+        scores = self._scores(queries.T, rows)
+
+        results = []
+        for column in scores.T:
+            # Shift to positive so top_k_indices keeps every candidate
+            best = top_k_indices(column + 2.0, k)
+            best_rows = rows[best] if rows is not None else best
+            results.append([
+                (self.documents[int(row)], float(2 - 2 * column[i]))
+                for row, i in zip(best_rows, best)
+            ])
+        return results
+
+
+def load_or_build_dense(
+    vectorstore,
+    documents: List[Document],
+    ids: Sequence[str],
+    index_dir: str,
+    dtype: str = "float16",
+    mask_fields: Sequence[str] = ("category",),
+    signature: str = "",
+    hnsw: bool = False,
+    previous: Optional[DenseIndex] = None
+) -> DenseIndex:
+    """
+    Memory-map the persisted index if it matches the collection (and
+    embedding backend), otherwise rebuild it from the vectors stored in
+    Chroma and write it back to disk (older versions are pruned).
+
+    previous (the index being replaced on a hot reload) supplies the
+    rows of unchanged chunks, so only new chunks' vectors are fetched.
+    """
+    fingerprint = collection_fingerprint(ids)
+    documents_by_id = dict(zip(ids, documents))
+    path = generation_dir(index_dir, fingerprint)
+
+    def current(index: Optional[DenseIndex]) -> bool:
+        return (
+            index is not None
+            and index.fingerprint == fingerprint
+            and index.signature == signature
+            and index.dtype == dtype
+            and (index.hnsw is not None) == hnsw
+        )
+
+    index = DenseIndex.load(path, documents_by_id)
+    if current(index):
+        return index
+
+    with index_lock(index_dir):
+        # Another process may have built it while this one waited
+        index = DenseIndex.load(path, documents_by_id)
+        if current(index):
+            return index
+
+        index = _build_dense(
+            vectorstore, documents, ids, fingerprint, dtype, mask_fields, signature, hnsw, previous
+        )
+        index.save(path)
+        prune_generations(index_dir, keep=path)
+
+    return index
+
+
+def _build_dense(
+    vectorstore,
+    documents: List[Document],
+    ids: Sequence[str],
+    fingerprint: str,
+    dtype: str,
+    mask_fields: Sequence[str],
+    signature: str,
+    hnsw: bool,
+    previous: Optional[DenseIndex]
+) -> DenseIndex:
+    """
+    Vectors of unchanged chunks come from previous (float16 only); the
+    rest are fetched from Chroma.
+    """
+    by_id: Dict[str, np.ndarray] = {}
+    # float16 rows are exact copies of the normalized vectors; int8 ones
+    # would drift with each requantization, so those are fetched again
+    if (
+        previous is not None
+        and previous.signature == signature
+        and previous.dtype == dtype == "float16"
+    ):
+        rows = {uid: row for row, uid in enumerate(previous.doc_ids)}
+        kept = [uid for uid in ids if uid in rows]
+        if kept:
+            block = np.asarray(previous.vectors[[rows[uid] for uid in kept]], dtype=np.float32)
+            by_id = dict(zip(kept, block))
+
+    missing = [uid for uid in ids if uid not in by_id]
+    if missing:
+        raw = vectorstore.get(ids=missing if by_id else None, include=["embeddings"])
+        by_id.update(zip(raw["ids"], raw["embeddings"]))
+
+    # Chunks deleted since the snapshot was taken (concurrent ingest) have
+    # no vector any more; they are left out of the index
+    gone = {uid for uid in ids if uid not in by_id}
+    if gone:
+        logger.warning("%d chunks were deleted while the dense index was built; skipping them", len(gone))
+        documents = [doc for doc, uid in zip(documents, ids) if uid not in gone]
+        ids = [uid for uid in ids if uid not in gone]
+
+    vectors = (
+        np.asarray([by_id[uid] for uid in ids], dtype=np.float32)
+        if len(ids) else np.zeros((0, 0), dtype=np.float32)
+    )
+
+    return DenseIndex.build(
+        documents, ids, vectors,
+        dtype=dtype,
+        mask_fields=mask_fields,
+        signature=signature,
+        hnsw=hnsw,
+        fingerprint=fingerprint
+    )
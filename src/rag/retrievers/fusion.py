@@ -0,0 +1,124 @@
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+
+# leg name -> [(document, score)] ordered best first; higher score = better
+Legs = Dict[str, List[Tuple[Document, float]]]
+
+
+def doc_key(doc: Document) -> str:
+    """
+    Identity used to deduplicate hits across legs.
+    Falls back to a content hash for chunks without a chunk_id.
+    """
+    uid = doc.metadata.get("chunk_id")
+    if uid:
+        return str(uid)
+
+    digest = hashlib.sha1()
+    digest.update(str(doc.metadata.get("source", doc.metadata.get("document_name", ""))).encode("utf-8"))
+    digest.update(str(doc.metadata.get("page", "")).encode("utf-8"))
+    digest.update(doc.page_content.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def reciprocal_rank_fusion(
+    legs: Legs,
+    weights: Dict[str, float],
+    rrf_k: int = 60
+) -> Dict[str, float]:
+    """
+    Weighted RRF: sum(weight / (rrf_k + rank)) over the legs a doc appears in.
+    """
+    fused: Dict[str, float] = {}
+    for leg, hits in legs.items():
+        weight = weights.get(leg, 1.0)
+        for rank, (doc, _) in enumerate(hits, 1):
+            key = doc_key(doc)
+            fused[key] = fused.get(key, 0.0) + weight / (rrf_k + rank)
+    return fused
+
+
+def score_fusion(
+    legs: Legs,
+    weights: Dict[str, float]
+) -> Dict[str, float]:
+    """
+    Weighted sum of per-leg min-max normalized scores.
+    """
+    fused: Dict[str, float] = {}
+    for leg, hits in legs.items():
+        if not hits:
+            continue
+
+        weight = weights.get(leg, 1.0)
+        scores = [score for _, score in hits]
+        low, high = min(scores), max(scores)
+        span = high - low
+
+        for doc, score in hits:
+            norm = (score - low) / span if span else 1.0
+            key = doc_key(doc)
+            fused[key] = fused.get(key, 0.0) + weight * norm
+    return fused
+
+
+def fuse(
+    legs: Legs,
+    k: int,
+    method: str = "rrf",
+    weights: Optional[Dict[str, float]] = None,
+    rrf_k: int = 60,
+    raw_scores: Optional[Dict[str, str]] = None
+) -> List[Document]:
+    """
+    Merge ranked legs into the top-k documents.
+
+    Returned documents are copies annotated with:
+    - fused_score
+    - <leg>_rank (1-based) and <leg>_score for every leg that found them
+    raw_scores optionally renames a leg's score field (e.g. vector -> vector_distance)
+    and stores the negated value, for legs ranked by a lower-is-better metric.
+    """
+    weights = weights or {}
+    raw_scores = raw_scores or {}
+
+    if method == "rrf":
+        fused = reciprocal_rank_fusion(legs, weights, rrf_k)
+    elif method == "score":
+        fused = score_fusion(legs, weights)
+    else:
+        raise ValueError(f"Unknown fusion method: {method}")
+
+    docs: Dict[str, Document] = {}
+    annotations: Dict[str, Dict[str, float]] = {}
+
+    for leg, hits in legs.items():
+        field = raw_scores.get(leg, f"{leg}_score")
+        sign = -1.0 if leg in raw_scores else 1.0
+
+        for rank, (doc, score) in enumerate(hits, 1):
+            key = doc_key(doc)
+            docs.setdefault(key, doc)
+            notes = annotations.setdefault(key, {})
+            if f"{leg}_rank" not in notes:
+                notes[f"{leg}_rank"] = rank
+                notes[field] = sign * float(score)
+
+    # Ties keep leg order (vector first), so results stay deterministic
+    order = {key: i for i, key in enumerate(docs)}
+    ranked = sorted(fused, key=lambda key: (-fused[key], order[key]))[:k]
+
+    return [
+        Document(
+            page_content=docs[key].page_content,
+            metadata={
+                **docs[key].metadata,
+                **annotations[key],
+                "fused_score": fused[key],
+            }
+        )
+        for key in ranked
+    ]
@@ -1,10 +1,19 @@
+import re
 from typing import List
 
-from langchain_community.retrievers import BM25Retriever
-from langchain_core.documents import Document
+import numpy as np
 
 
-def build_bm25_retriever(documents: List[Document], k: int = 6) -> BM25Retriever:
-    bm25 = BM25Retriever.from_documents(documents)
-    bm25.k = k
-    return bm25
+def tokenize(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k highest positive scores, best first.
+    """
+    positive = np.flatnonzero(scores > 0)
+    if positive.size > k:
+        part = np.argpartition(scores[positive], -k)[-k:]
+        positive = positive[part]
+    return positive[np.argsort(-scores[positive], kind="stable")]
@@ -0,0 +1,101 @@
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from rag.retrievers.fusion import doc_key
+
+
+Position = Tuple[Hashable, int]
+
+
+def chunk_position(metadata: Dict[str, Any]) -> Optional[Position]:
+    """
+    (parent, chunk_index) of a chunk. The parent is parent_id when the
+    chunker sets one, otherwise the file/document the chunk came from.
+    """
+    parent = (
+        metadata.get("parent_id")
+        or metadata.get("file_path")
+        or metadata.get("document_name")
+        or metadata.get("source")
+    )
+    index = metadata.get("chunk_index")
+    if parent is None or index is None:
+        return None
+    return parent, int(index)
+
+
+class NeighbourIndex:
+    """
+    In-memory (parent, chunk_index) -> chunk map over the corpus snapshot.
+    Used to expand retrieved chunks with their neighbours without any
+    extra vector store queries.
+    """
+
+    def __init__(self, documents: List[Document]):
+        self.chunks: Dict[Position, Document] = {}
+        for doc in documents:
+            position = chunk_position(doc.metadata)
+            if position is not None:
+                self.chunks[position] = doc
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def neighbours(self, doc: Document, window: int = 1) -> List[Document]:
+        """
+        Chunks within window positions of doc, nearest first
+        (previous before next at equal distance).
+        """
+        position = chunk_position(doc.metadata)
+        if position is None:
+            return []
+
+        parent, index = position
+        found = []
+        for distance in range(1, window + 1):
+            for neighbour in (index - distance, index + distance):
+                chunk = self.chunks.get((parent, neighbour))
+                if chunk is not None:
+                    found.append(chunk)
+        return found
+
+    def expand(
+        self,
+        results: List[Document],
+        budget: int,
+        window: int = 1
+    ) -> List[Document]:
+        """
+        Add up to budget neighbour chunks, visiting hits in rank order.
+        Each neighbour is inserted right after its hit, inherits the hit's
+        fused_score and records expanded_from = the hit's chunk_id.
+        """
+        if budget <= 0 or not self.chunks:
+            return results
+
+        seen = {doc_key(doc) for doc in results}
+        expanded: List[Document] = []
+
+        for hit in results:
+            expanded.append(hit)
+
+            for chunk in self.neighbours(hit, window):
+                if budget <= 0:
+                    break
+                key = doc_key(chunk)
+                if key in seen:
+                    continue
+
+                seen.add(key)
+                budget -= 1
+                expanded.append(Document(
+                    page_content=chunk.page_content,
+                    metadata={
+                        **chunk.metadata,
+                        "fused_score": hit.metadata.get("fused_score", 0.0),
+                        "expanded_from": hit.metadata.get("chunk_id"),
+                    }
+                ))
+
+        return expanded
@@ -1,62 +1,475 @@
-from typing import List, Optional
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 from langchain_core.documents import Document
 
-from rag.retrievers.vectorstore import load_vectorstore
-from rag.retrievers.hybrid import build_bm25_retriever
+from rag import metrics
+from rag.settings import settings
+from rag.embeddings import embed_queries
+from rag.retrievers.context import ContextHolder, RetrievalContext, get_context_holder
+from rag.retrievers.fusion import fuse
+from rag.retrievers.rerank import CrossEncoderReranker, get_reranker
+
+
+logger = logging.getLogger(__name__)
+
+# CPU-bound lexical scoring runs here, off the event loop
+_executor = ThreadPoolExecutor(
+    max_workers=settings.RETRIEVAL_WORKERS,
+    thread_name_prefix="retrieval"
+)
+
+
+def _pinned(method):
+    """
+    Run a query entry point on one generation (see ContextHolder.pin);
+    executor work inherits the pin through metrics.with_context.
+    """
+    if asyncio.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def apinned(self, *args, **kwargs):
+            with self.holder.pin():
+                return await method(self, *args, **kwargs)
+        return apinned
+
+    @functools.wraps(method)
+    def pinned(self, *args, **kwargs):
+        with self.holder.pin():
+            return method(self, *args, **kwargs)
+    return pinned
 
 
 class ProductionRetriever:
     """
     Enterprise-grade retriever:
-    - Hybrid search (BM25 + Vector)
+    - Hybrid search (BM25 + Vector; Chroma or in-process dense index)
+    - Weighted reciprocal-rank (or score) fusion
     - Optional category filtering
+    - Optional cross-encoder rerank of an over-retrieved candidate pool
+      (latency-budgeted); only the top few survive
+    - Top hits expanded with neighbouring chunks (in-memory, budgeted)
+    - Follows hot index reloads; each query runs on one generation
     - Deterministic and debuggable
     """
 
-    def __init__(self):
-        self.vectorstore = load_vectorstore()
+    def __init__(
+        self,
+        context: Optional[RetrievalContext] = None,
+        reranker: Optional[CrossEncoderReranker] = None,
+        holder: Optional[ContextHolder] = None
+    ):
+        # Borrow the shared corpus snapshot + indexes instead of
+        # loading a private copy per retriever; a given context stays
+        # fixed, a holder's (by default the process-wide one) is
+        # swapped on reload
+        if context is not None:
+            holder = ContextHolder(context)
+        self.holder = holder or get_context_holder()
+        self.reranker = reranker if reranker is not None else get_reranker()
+
+    # The query's pinned generation (the live one outside a query)
+    @property
+    def context(self) -> RetrievalContext:
+        return self.holder.current
+
+    @property
+    def vectorstore(self):
+        return self.context.vectorstore
+
+    @property
+    def documents(self) -> List[Document]:
+        return self.context.documents
+
+    @property
+    def bm25(self):
+        return self.context.bm25
+
+    @property
+    def dense(self):
+        return self.context.dense
+
+    @staticmethod
+    def _filters(
+        category: Optional[str],
+        filters: Optional[Dict[str, str]]
+    ) -> Dict[str, str]:
+        merged = dict(filters or {})
+        if category:
+            merged["category"] = category
+        return merged
+
+    @staticmethod
+    def _chroma_filter(filters: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        if not filters:
+            return None
+        if len(filters) == 1:
+            return dict(filters)
+        return {"$and": [{field: value} for field, value in filters.items()]}
+
+    def _pool(self, k: int) -> int:
+        # Fused candidates handed to the reranker (just k without one)
+        return max(k, settings.RERANK_CANDIDATES) if self.reranker is not None else k
+
+    @staticmethod
+    def _candidates(k: int) -> int:
+        # Each leg over-fetches so fusion can promote hits from either side
+        return max(k, k * settings.FUSION_FETCH_MULTIPLIER)
+
+    def _rerank(self, query: str, fused: List[Document], k: int) -> List[Document]:
+        if self.reranker is None:
+            return fused
+        with metrics.span("rag.rerank_s"):
+            return self.reranker.rerank(query, fused, min(k, settings.RERANK_TOP_N))
+
+    def _vector_hits(
+        self,
+        query: str,
+        k: int,
+        filters: Dict[str, str]
+    ) -> List[Tuple[Document, float]]:
+        # Both backends return distances (lower = better)
+        if self.dense is not None:
+            vector = self.vectorstore.embeddings.embed_query(query)
+            return self.dense.search(vector, k, filters, ef=settings.HNSW_EF_SEARCH)
+
+        return self.vectorstore.similarity_search_with_score(
+            query,
+            k=k,
+            filter=self._chroma_filter(filters)
+        )
 
-        # Load all documents ONCE for BM25
-        raw = self.vectorstore.get()
-        self.documents: List[Document] = [
-            Document(page_content=content, metadata=meta)
-            for content, meta in zip(raw["documents"], raw["metadatas"])
+    def _vector_search(
+        self,
+        query: str,
+        k: int,
+        filters: Dict[str, str]
+    ) -> List[Tuple[Document, float]]:
+        # The span includes the query embedding (also timed on its own)
+        with metrics.span("rag.vector_s"):
+            return self._vector_hits(query, k, filters)
+
+    async def _avector_search(
+        self,
+        query: str,
+        k: int,
+        filters: Dict[str, str]
+    ) -> List[Tuple[Document, float]]:
+        with metrics.span("rag.vector_s"):
+            if self.dense is not None:
+                vector = await self.vectorstore.embeddings.aembed_query(query)
+                # Scoring is CPU-bound: keep it off the event loop
+                return await asyncio.get_running_loop().run_in_executor(
+                    _executor,
+                    metrics.with_context(self.dense.search),
+                    vector, k, filters, settings.HNSW_EF_SEARCH
+                )
+
+            return await self.vectorstore.asimilarity_search_with_score(
+                query,
+                k=k,
+                filter=self._chroma_filter(filters)
+            )
+
+    def _vector_search_batch(
+        self,
+        vectors: List[List[float]],
+        k: int,
+        filters: Dict[str, str]
+    ) -> List[List[Tuple[Document, float]]]:
+        if self.dense is not None:
+            return self.dense.search_batch(vectors, k, filters, ef=settings.HNSW_EF_SEARCH)
+
+        # One Chroma query for the whole batch
+        results = self.vectorstore._collection.query(
+            query_embeddings=vectors,
+            n_results=k,
+            where=self._chroma_filter(filters),
+            include=["documents", "metadatas", "distances"]
+        )
+        return [
+            [
+                (Document(page_content=text, metadata=metadata or {}, id=uid), distance)
+                for text, metadata, uid, distance in zip(texts, metadatas, ids, distances)
+                if text is not None
+            ]
+            for texts, metadatas, ids, distances in zip(
+                results["documents"], results["metadatas"], results["ids"], results["distances"]
+            )
         ]
 
-        self.bm25 = build_bm25_retriever(self.documents)
+    def _bm25_search(
+        self,
+        query: str,
+        k: int,
+        filters: Dict[str, str]
+    ) -> List[Tuple[Document, float]]:
+        # Only the matching shards are scored
+        with metrics.span("rag.bm25_s"):
+            return self.bm25.search(query, k=k, filters=filters)
+
+    def _bm25_search_batch(
+        self,
+        queries: List[str],
+        k: int,
+        filters: Dict[str, str]
+    ) -> List[List[Tuple[Document, float]]]:
+        with metrics.span("rag.bm25_s"):
+            return self.bm25.search_batch(queries, k=k, filters=filters)
 
+    @staticmethod
+    def _merge(
+        vector_results: List[Tuple[Document, float]],
+        bm25_results: List[Tuple[Document, float]],
+        k: int,
+        weights: Optional[Dict[str, float]] = None
+    ) -> List[Document]:
+        with metrics.span("rag.merge_s"):
+            return fuse(
+                {
+                    "vector": [(doc, -distance) for doc, distance in vector_results],
+                    "bm25": bm25_results,
+                },
+                k=k,
+                method=settings.FUSION_METHOD,
+                weights=weights or {
+                    "vector": settings.FUSION_VECTOR_WEIGHT,
+                    "bm25": settings.FUSION_BM25_WEIGHT,
+                },
+                rrf_k=settings.RRF_K,
+                raw_scores={"vector": "vector_distance"}
+            )
+
+    def _expand(self, results: List[Document], expand: Optional[int]) -> List[Document]:
+        budget = settings.NEIGHBOUR_BUDGET if expand is None else expand
+        if budget <= 0:
+            return results
+        with metrics.span("rag.expand_s"):
+            return self.context.neighbours.expand(results, budget, settings.NEIGHBOUR_WINDOW)
+
+    @staticmethod
+    def _matches(metadata: Dict[str, Any], filters: Dict[str, str]) -> bool:
+        return all(str(metadata.get(field)) == str(value) for field, value in filters.items())
+
+    @staticmethod
+    def _hit_rows(hits: List[Tuple[Document, float]], score_field: str) -> List[Dict[str, Any]]:
+        return [
+            {
+                "rank": rank,
+                "chunk_id": doc.metadata.get("chunk_id"),
+                "document_name": doc.metadata.get("document_name", doc.metadata.get("file_name")),
+                "category": doc.metadata.get("category"),
+                score_field: float(score),
+                "preview": doc.page_content[:200],
+            }
+            for rank, (doc, score) in enumerate(hits, 1)
+        ]
+
+    def _hybrid(
+        self,
+        query: str,
+        category: Optional[str],
+        k: int,
+        filters: Optional[Dict[str, str]],
+        weights: Optional[Dict[str, float]],
+        expand: Optional[int]
+    ) -> Dict[str, Any]:
+        """
+        The retrieval shared by retrieve() and explain(), with every
+        intermediate step kept.
+        """
+        filters = self._filters(category, filters)
+        pool = self._pool(k)
+        n = self._candidates(pool)
+
+        #BM25 search (keyword) runs on the pool while the vector
+        #leg waits on the embedding round-trip
+        bm25_future = _executor.submit(metrics.with_context(self._bm25_search), query, n, filters)
+
+        #Vector search (semantic)
+        vector_results = self._vector_search(query, n, filters)
+
+        bm25_results = bm25_future.result()
+
+        #Fuse (weighted, deterministic), rerank, then add neighbours
+        fused = self._merge(vector_results, bm25_results, pool, weights)
+
+        return {
+            "filters": filters,
+            "candidates": n,
+            "vector": vector_results,
+            "bm25": bm25_results,
+            "fused": fused,
+            "results": self._expand(self._rerank(query, fused, k), expand),
+        }
+
+    @_pinned
+    def explain(
+        self,
+        query: str,
+        category: Optional[str] = None,
+        k: int = 6,
+        filters: Optional[Dict[str, str]] = None,
+        weights: Optional[Dict[str, float]] = None,
+        expand: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        retrieve() with every intermediate step kept, for debugging:
+        - vector / bm25: each leg's candidates (rank, distance / score, chunk)
+        - fused: the fused pool before rerank
+        - results: the Documents retrieve() would return
+        Stage timings go to the caller's metrics.trace().
+        """
+        steps = self._hybrid(query, category, k, filters, weights, expand)
+
+        return {
+            **steps,
+            "vector": self._hit_rows(steps["vector"], "distance"),
+            "bm25": self._hit_rows(steps["bm25"], "score"),
+            "fused": [d.metadata for d in steps["fused"]],
+        }
+
+    @_pinned
+    def filter_effect(self, query: str, filters: Dict[str, str], n: int) -> Optional[Dict[str, Any]]:
+        """
+        What the filters cost: chunks in the snapshot that pass them, and
+        the unfiltered top-n hits of each leg that they removed.
+        Runs both legs again, untimed, so neither explain()'s trace nor
+        the rag.* latency histograms count it.
+        """
+        if not filters:
+            return None
+
+        unfiltered = {
+            "vector": (self._vector_hits(query, n, {}), "distance"),
+            "bm25": (self.bm25.search(query, k=n, filters={}), "score"),
+        }
+        excluded = [
+            {"leg": leg, **row}
+            for leg, (hits, score_field) in unfiltered.items()
+            for row, (doc, _) in zip(self._hit_rows(hits, score_field), hits)
+            if not self._matches(doc.metadata, filters)
+        ]
+
+        return {
+            "corpus": len(self.documents),
+            "eligible": sum(self._matches(d.metadata, filters) for d in self.documents),
+            "excluded": excluded,
+        }
+
+    @_pinned
     def retrieve(
         self,
         query: str,
         category: Optional[str] = None,
-        k: int = 6
+        k: int = 6,
+        filters: Optional[Dict[str, str]] = None,
+        weights: Optional[Dict[str, float]] = None,
+        expand: Optional[int] = None
     ) -> List[Document]:
+        """
+        Return the top-k fused chunks. Each result's metadata carries
+        fused_score plus vector_rank/vector_distance and bm25_rank/bm25_score
+        for the legs that found it.
+        With a reranker, RERANK_CANDIDATES fused chunks are reranked and
+        at most RERANK_TOP_N are returned (rerank_score / rerank_rank).
+        Up to expand (default NEIGHBOUR_BUDGET) neighbouring chunks of the
+        top hits follow them, marked with expanded_from.
+        """
+        return self._hybrid(query, category, k, filters, weights, expand)["results"]
 
-        #Vector search (semantic)
-        vector_results = self.vectorstore.similarity_search(
-            query,
-            k=k,
-            filter={"category": category} if category else None
+    async def _leg(self, name: str, awaitable, timeout: float):
+        try:
+            return await asyncio.wait_for(awaitable, timeout=timeout), None
+        except Exception as e:
+            logger.warning("%s leg failed (%r); continuing without it", name, e)
+            return [], e
+
+    @_pinned
+    async def aretrieve(
+        self,
+        query: str,
+        category: Optional[str] = None,
+        k: int = 6,
+        filters: Optional[Dict[str, str]] = None,
+        weights: Optional[Dict[str, float]] = None,
+        expand: Optional[int] = None
+    ) -> List[Document]:
+        """
+        Async retrieval: both legs run concurrently.
+        A leg that fails or exceeds its timeout is dropped, so the
+        request degrades to single-leg results instead of failing.
+        """
+        filters = self._filters(category, filters)
+        pool = self._pool(k)
+        n = self._candidates(pool)
+        loop = asyncio.get_running_loop()
+
+        (vector_results, vector_error), (bm25_results, bm25_error) = await asyncio.gather(
+            self._leg(
+                "vector",
+                self._avector_search(query, n, filters),
+                settings.VECTOR_TIMEOUT_S
+            ),
+            self._leg(
+                "bm25",
+                loop.run_in_executor(_executor, metrics.with_context(self._bm25_search), query, n, filters),
+                settings.BM25_TIMEOUT_S
+            ),
         )
 
-        #BM25 search (keyword)
-        bm25_results = self.bm25.invoke(query)
+        if vector_error and bm25_error:
+            raise vector_error
 
-        if category:
-            bm25_results = [
-                d for d in bm25_results
-                if d.metadata.get("category") == category
-            ]
+        fused = self._merge(vector_results, bm25_results, pool, weights)
+        if self.reranker is not None:
+            # Cross-encoder inference is CPU-bound: keep it off the loop
+            fused = await loop.run_in_executor(_executor, metrics.with_context(self._rerank), query, fused, k)
+        return self._expand(fused, expand)
+
+    @_pinned
+    def retrieve_batch(
+        self,
+        queries: Sequence[str],
+        categories: Optional[Sequence[Optional[str]]] = None,
+        k: int = 6,
+        filters: Optional[Dict[str, str]] = None,
+        expand: Optional[int] = None
+    ) -> List[List[Document]]:
+        """
+        retrieve() for many queries at once, results in input order:
+        - All queries are embedded in one call
+        - Queries sharing a category run as one batched vector search and
+          one sparse BM25 product
+        - Fusion, rerank and expansion stay per query
+        """
+        queries = list(queries)
+        categories = list(categories) if categories is not None else [None] * len(queries)
+        pool = self._pool(k)
+        n = self._candidates(pool)
+
+        vectors = embed_queries(self.vectorstore.embeddings, queries) if queries else []
+
+        groups: Dict[Optional[str], List[int]] = {}
+        for i, category in enumerate(categories):
+            groups.setdefault(category or None, []).append(i)
+
+        results: List[List[Document]] = [[] for _ in queries]
+
+        for category, indices in groups.items():
+            group_filters = self._filters(category, filters)
+            group_queries = [queries[i] for i in indices]
 
-        #Merge (simple + deterministic)
-        seen = set()
-        combined: List[Document] = []
+            bm25_future = _executor.submit(
+                metrics.with_context(self._bm25_search_batch), group_queries, n, group_filters
+            )
+            vector_results = self._vector_search_batch([vectors[i] for i in indices], n, group_filters)
+            bm25_results = bm25_future.result()
 
-        for doc in vector_results + bm25_results:
-            uid = doc.metadata.get("chunk_id")
-            if uid and uid not in seen:
-                seen.add(uid)
-                combined.append(doc)
+            for i, query, vector_hits, bm25_hits in zip(indices, group_queries, vector_results, bm25_results):
+                fused = self._merge(vector_hits, bm25_hits, pool)
+                results[i] = self._expand(self._rerank(query, fused, k), expand)
 
-        return combined[:k]
+        return results
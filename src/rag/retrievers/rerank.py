@@ -0,0 +1,138 @@
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+from rag import metrics
+from rag.settings import settings
+from rag.cache import LRUCache
+from rag.routing import normalize_query
+from rag.retrievers.fusion import doc_key
+
+
+Scorer = Callable[[List[Tuple[str, str]]], Sequence[float]]
+
+
+class CrossEncoderReranker:
+    """
+    Bounded-cost reranking of fused candidates:
+    - Local cross-encoder (sentence-transformers) scores (query, chunk)
+      pairs in batches, best fused candidates first
+    - A batch is only started if it is expected to finish within the
+      latency budget; candidates left unscored keep their fused order
+      behind the scored ones
+    - (query, chunk_id) scores are cached
+    """
+
+    def __init__(
+        self,
+        model_name: str = "",
+        batch_size: int = 16,
+        budget_s: float = 0.3,
+        cache_size: int = 4096,
+        scorer: Optional[Scorer] = None
+    ):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.budget_s = budget_s
+        self.cache = LRUCache(maxsize=cache_size)
+        self.scored = 0
+        self.budget_exhausted = 0
+        self._scorer = scorer
+        self._lock = threading.Lock()
+
+    @property
+    def scorer(self) -> Scorer:
+        if self._scorer is None:
+            with self._lock:
+                if self._scorer is None:
+                    from sentence_transformers import CrossEncoder
+
+                    model = CrossEncoder(self.model_name, device="cpu")
+                    self._scorer = lambda pairs: model.predict(
+                        pairs, batch_size=self.batch_size, show_progress_bar=False
+                    )
+        return self._scorer
+
+    def rerank(self, query: str, docs: List[Document], top_n: int) -> List[Document]:
+        """
+        Return the top_n docs by cross-encoder score, annotated with
+        rerank_score (None if the budget ran out first) and rerank_rank.
+        """
+        started = time.perf_counter()
+        normalized = normalize_query(query)
+
+        scores: Dict[int, float] = {}
+        pending: List[int] = []
+        for i, doc in enumerate(docs):
+            cached = self.cache.get((normalized, doc_key(doc)))
+            if cached is None:
+                pending.append(i)
+            else:
+                scores[i] = cached
+
+        slowest = 0.0
+        for start in range(0, len(pending), self.batch_size):
+            elapsed = time.perf_counter() - started
+            if start and elapsed + slowest > self.budget_s:
+                self.budget_exhausted += 1
+                break
+
+            batch = pending[start:start + self.batch_size]
+            batch_started = time.perf_counter()
+            results = self.scorer([(query, docs[i].page_content) for i in batch])
+            slowest = max(slowest, time.perf_counter() - batch_started)
+
+            for i, score in zip(batch, results):
+                scores[i] = float(score)
+                self.cache.set((normalized, doc_key(docs[i])), float(score))
+            self.scored += len(batch)
+
+        # Scored first (by score), then the rest in fused order
+        order = sorted(scores, key=lambda i: -scores[i])
+        order += [i for i in range(len(docs)) if i not in scores]
+
+        reranked = []
+        for rank, i in enumerate(order[:top_n], 1):
+            doc = docs[i]
+            reranked.append(Document(
+                page_content=doc.page_content,
+                metadata={**doc.metadata, "rerank_score": scores.get(i), "rerank_rank": rank}
+            ))
+        return reranked
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "scored": self.scored,
+            "budget_exhausted": self.budget_exhausted,
+            "cache": self.cache.stats(),
+        }
+
+
+_reranker: Optional[CrossEncoderReranker] = None
+_lock = threading.Lock()
+
+
+def get_reranker() -> Optional[CrossEncoderReranker]:
+    """
+    Return the process-wide reranker (None when RERANK_MODEL is unset).
+    The model itself is loaded on first use.
+    """
+    global _reranker
+
+    if not settings.RERANK_MODEL:
+        return None
+
+    if _reranker is None:
+        with _lock:
+            if _reranker is None:
+                _reranker = CrossEncoderReranker(
+                    settings.RERANK_MODEL,
+                    batch_size=settings.RERANK_BATCH_SIZE,
+                    budget_s=settings.RERANK_BUDGET_MS / 1000,
+                    cache_size=settings.RERANK_CACHE_SIZE
+                )
+                metrics.register_collector("rerank", _reranker.stats)
+
+    return _reranker
@@ -0,0 +1,413 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+from langchain_core.documents import Document
+
+from rag.retrievers.hybrid import tokenize, top_k_indices
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds are not serialized across processes
+    fcntl = None
+
+
+ShardKey = Tuple[str, ...]
+
+_META_FILE = "meta.json"
+_LOCK_FILE = ".lock"
+_ARRAYS = ("data", "indices", "indptr")
+
+# Indexes are saved per collection version: index_dir/<fingerprint[:16]>/
+_GENERATION_DIR = re.compile(r"^[0-9a-f]{16}$")
+
+
+def collection_fingerprint(ids: Sequence[str]) -> str:
+    """
+    Stable fingerprint of the collection contents.
+
+    Chunk IDs change whenever chunk content changes, so hashing the
+    sorted IDs is enough to detect a stale index.
+    """
+    digest = hashlib.sha256()
+    for uid in sorted(ids):
+        digest.update(uid.encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def generation_dir(index_dir: str, fingerprint: str) -> str:
+    """
+    Directory of the index for one collection version. A rebuild never
+    overwrites files another generation may still have memory-mapped.
+    """
+    return os.path.join(index_dir, fingerprint[:16])
+
+
+def prune_generations(index_dir: str, keep: str) -> None:
+    """
+    Remove the other versions' directories. Open memory maps of the
+    removed files stay valid until unmapped.
+    """
+    for name in os.listdir(index_dir):
+        path = os.path.join(index_dir, name)
+        if _GENERATION_DIR.match(name) and os.path.isdir(path) and path != keep:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+@contextmanager
+def index_lock(index_dir: str) -> Iterator[None]:
+    """
+    Exclusive cross-process lock on index_dir, held while an index is
+    built, saved and older versions pruned: API workers starting on the
+    same collection build it once and the others load the result.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    with open(os.path.join(index_dir, _LOCK_FILE), "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+@contextmanager
+def replacing(path: str) -> Iterator[str]:
+    """
+    Yield a unique temporary path next to path; once written it replaces
+    path atomically. Never truncates a file a reader may have mapped.
+    """
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path), prefix=f".{os.path.basename(path)}.", suffix=".tmp"
+    )
+    os.close(fd)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def save_array(path: str, array: np.ndarray) -> None:
+    with replacing(path) as tmp_path:
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+
+
+class SparseBM25:
+    """
+    Vectorized BM25 over a CSR term-document matrix:
+    - Rows = terms, columns = documents, values = precomputed BM25 weights
+    - Columns are grouped by shard key, so a filtered query only
+      scores its shard's column range
+    - Query scoring = sparse row slice + one matrix/vector product
+      (one sparse matrix product for a batch of queries)
+    """
+
+    def __init__(
+        self,
+        weights: sparse.csr_matrix,
+        vocabulary: Dict[str, int],
+        documents: List[Document],
+        doc_ids: List[str],
+        shard_fields: Sequence[str],
+        shard_ranges: Dict[ShardKey, Tuple[int, int]],
+        params: Dict[str, float],
+        fingerprint: str = ""
+    ):
+        self.weights = weights
+        self.vocabulary = vocabulary
+        self.documents = documents
+        self.doc_ids = doc_ids
+        self.params = params
+        self.shard_fields = tuple(shard_fields)
+        self.shard_ranges = shard_ranges
+        self.fingerprint = fingerprint
+
+    # ---------------------------------------------------------
+    # Build
+    # ---------------------------------------------------------
+    @classmethod
+    def build(
+        cls,
+        documents: List[Document],
+        ids: Sequence[str],
+        shard_fields: Sequence[str] = ("category",),
+        k1: float = 1.5,
+        b: float = 0.75,
+        fingerprint: str = ""
+    ) -> "SparseBM25":
+        shard_fields = tuple(shard_fields)
+
+        def key(doc: Document) -> ShardKey:
+            return tuple(str(doc.metadata.get(f, "")) for f in shard_fields)
+
+        # Group columns by shard so each shard is a contiguous range
+        pairs = sorted(zip(documents, ids), key=lambda pair: key(pair[0]))
+        ordered = [doc for doc, _ in pairs]
+        doc_ids = [uid for _, uid in pairs]
+
+        shard_ranges: Dict[ShardKey, Tuple[int, int]] = {}
+        for col, doc in enumerate(ordered):
+            start, _ = shard_ranges.get(key(doc), (col, col))
+            shard_ranges[key(doc)] = (start, col + 1)
+
+        vocabulary: Dict[str, int] = {}
+        rows: List[int] = []
+        cols: List[int] = []
+        tfs: List[int] = []
+        lengths = np.zeros(len(ordered), dtype=np.float32)
+
+        for col, doc in enumerate(ordered):
+            counts = Counter(tokenize(doc.page_content))
+            lengths[col] = sum(counts.values())
+            for term, tf in counts.items():
+                rows.append(vocabulary.setdefault(term, len(vocabulary)))
+                cols.append(col)
+                tfs.append(tf)
+
+        n_docs = len(ordered)
+        tf = np.asarray(tfs, dtype=np.float32)
+        row_idx = np.asarray(rows, dtype=np.int32)
+        col_idx = np.asarray(cols, dtype=np.int32)
+
+        # IDF over the whole corpus keeps shard scores comparable
+        df = np.bincount(row_idx, minlength=len(vocabulary)).astype(np.float32)
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+
+        avgdl = float(lengths.mean()) if n_docs else 0.0
+        norm = k1 * (1 - b + b * lengths[col_idx] / (avgdl or 1.0))
+        values = idf[row_idx] * tf * (k1 + 1) / (tf + norm)
+
+        weights = sparse.csr_matrix(
+            (values.astype(np.float32), (row_idx, col_idx)),
+            shape=(len(vocabulary), n_docs)
+        )
+
+        return cls(
+            weights,
+            vocabulary,
+            ordered,
+            doc_ids,
+            shard_fields,
+            shard_ranges,
+            {"k1": k1, "b": b},
+            fingerprint
+        )
+
+    # ---------------------------------------------------------
+    # Persistence
+    # ---------------------------------------------------------
+    def save(self, index_dir: str) -> None:
+        os.makedirs(index_dir, exist_ok=True)
+
+        for name in _ARRAYS:
+            save_array(os.path.join(index_dir, f"{name}.npy"), getattr(self.weights, name))
+
+        meta = {
+            "fingerprint": self.fingerprint,
+            "shape": list(self.weights.shape),
+            "shard_fields": list(self.shard_fields),
+            "shard_ranges": [[list(k), list(r)] for k, r in self.shard_ranges.items()],
+            "params": self.params,
+            "vocabulary": self.vocabulary,
+            "doc_ids": self.doc_ids,
+        }
+
+        # Write metadata last: its presence marks a complete index
+        with replacing(os.path.join(index_dir, _META_FILE)) as tmp_path:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+
+    @classmethod
+    def load(
+        cls,
+        index_dir: str,
+        documents_by_id: Dict[str, Document]
+    ) -> Optional["SparseBM25"]:
+        """
+        Memory-map a saved index. Returns None if it is missing or
+        references documents that are no longer in the collection.
+        """
+        meta_path = os.path.join(index_dir, _META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+
+        try:
+            documents = [documents_by_id[uid] for uid in meta["doc_ids"]]
+        except KeyError:
+            return None
+
+        try:
+            data, indices, indptr = (
+                np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode="r")
+                for name in _ARRAYS
+            )
+        except FileNotFoundError:
+            # Pruned by another process between reading meta and arrays
+            return None
+        weights = sparse.csr_matrix((data, indices, indptr), shape=tuple(meta["shape"]), copy=False)
+
+        return cls(
+            weights,
+            meta["vocabulary"],
+            documents,
+            meta["doc_ids"],
+            meta["shard_fields"],
+            {tuple(k): tuple(r) for k, r in meta["shard_ranges"]},
+            meta["params"],
+            meta["fingerprint"]
+        )
+
+    # ---------------------------------------------------------
+    # Search
+    # ---------------------------------------------------------
+    def _columns(self, filters: Dict[str, str]) -> List[Tuple[int, int]]:
+        if not any(f in filters for f in self.shard_fields):
+            return [(0, len(self.documents))]
+
+        ranges = []
+        for key, col_range in self.shard_ranges.items():
+            if all(
+                field not in filters or str(filters[field]) == value
+                for field, value in zip(self.shard_fields, key)
+            ):
+                ranges.append(col_range)
+        return sorted(ranges)
+
+    def _residual_mask(self, start: int, end: int, residual: Dict[str, str]) -> np.ndarray:
+        return np.fromiter(
+            (
+                all(str(d.metadata.get(f, "")) == v for f, v in residual.items())
+                for d in self.documents[start:end]
+            ),
+            dtype=bool,
+            count=end - start
+        )
+
+    def search(
+        self,
+        query: str,
+        k: int = 6,
+        filters: Optional[Dict[str, str]] = None
+    ) -> List[Tuple[Document, float]]:
+        """
+        Return up to k (document, score) pairs, best first.
+        """
+        return self.search_batch([query], k, filters)[0]
+
+    def search_batch(
+        self,
+        queries: Sequence[str],
+        k: int = 6,
+        filters: Optional[Dict[str, str]] = None
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        search() for many queries sharing the same filters: the queries
+        become one sparse query-term matrix, scored with a single sparse
+        product per shard range.
+        """
+        filters = filters or {}
+
+        term_ids: Dict[int, int] = {}
+        rows, cols, values = [], [], []
+        for row, query in enumerate(queries):
+            counts = Counter(
+                self.vocabulary[t] for t in tokenize(query) if t in self.vocabulary
+            )
+            for term, count in counts.items():
+                rows.append(row)
+                cols.append(term_ids.setdefault(term, len(term_ids)))
+                values.append(count)
+
+        if not term_ids:
+            return [[] for _ in queries]
+
+        query_matrix = sparse.csr_matrix(
+            (np.asarray(values, dtype=np.float32), (rows, cols)),
+            shape=(len(queries), len(term_ids))
+        )
+
+        # Only the query terms' postings are touched
+        postings = self.weights[np.fromiter(term_ids, dtype=np.int32)]
+
+        # Filters on non-shard fields are applied as a mask before top-k
+        residual = {f: str(v) for f, v in filters.items() if f not in self.shard_fields}
+
+        candidates: List[List[Tuple[Document, float]]] = [[] for _ in queries]
+
+        for start, end in self._columns(filters):
+            block = (query_matrix @ postings[:, start:end]).tocsr()
+            mask = self._residual_mask(start, end, residual) if residual else None
+
+            for row in range(len(queries)):
+                if block.indptr[row] == block.indptr[row + 1]:
+                    continue
+
+                scores = block[row].toarray().ravel()
+                if mask is not None:
+                    scores = np.where(mask, scores, 0.0)
+
+                for i in top_k_indices(scores, k):
+                    candidates[row].append((self.documents[start + i], float(scores[i])))
+
+        for found in candidates:
+            found.sort(key=lambda pair: pair[1], reverse=True)
+            del found[k:]
+        return candidates
+
+
+def load_or_build_bm25(
+    documents: List[Document],
+    ids: Sequence[str],
+    index_dir: str,
+    shard_fields: Sequence[str] = ("category",),
+    k1: float = 1.5,
+    b: float = 0.75
+) -> SparseBM25:
+    """
+    Memory-map the persisted index if it matches the collection,
+    otherwise rebuild it and write it back to disk (older versions'
+    directories are pruned).
+    """
+    fingerprint = collection_fingerprint(ids)
+    documents_by_id = dict(zip(ids, documents))
+    path = generation_dir(index_dir, fingerprint)
+
+    def current(index: Optional[SparseBM25]) -> bool:
+        return (
+            index is not None
+            and index.fingerprint == fingerprint
+            and index.shard_fields == tuple(shard_fields)
+            and index.params == {"k1": k1, "b": b}
+        )
+
+    index = SparseBM25.load(path, documents_by_id)
+    if current(index):
+        return index
+
+    with index_lock(index_dir):
+        # Another process may have built it while this one waited
+        index = SparseBM25.load(path, documents_by_id)
+        if current(index):
+            return index
+
+        index = SparseBM25.build(documents, ids, shard_fields, k1=k1, b=b, fingerprint=fingerprint)
+        index.save(path)
+        prune_generations(index_dir, keep=path)
+
+    return index
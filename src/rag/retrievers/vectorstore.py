@@ -1,16 +1,95 @@
+import logging
+import threading
+from typing import Optional
+
+import chromadb
+from chromadb.api import ClientAPI
+from chromadb.api.shared_system_client import SharedSystemClient
+from chromadb.config import Settings
 from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
+from langchain_core.embeddings import Embeddings
 
 from rag.settings import settings
+from rag.embeddings import embedding_signature, get_embeddings
 
 
-def load_vectorstore() -> Chroma:
-    embeddings = OpenAIEmbeddings(
-        model=settings.EMBED_MODEL,
-        api_key=settings.OPENAI_API_KEY
-    )
+logger = logging.getLogger(__name__)
+
+# Collection metadata key holding the embedding backend signature
+SIGNATURE_KEY = "embedding"
+
+# Clearing Chroma's System cache and opening the next client is one step
+_client_lock = threading.Lock()
+
+
+class EmbeddingMismatchError(RuntimeError):
+    """
+    The collection was built by a different embedding backend/model.
+    """
+
+
+def check_embedding_signature(vectorstore: Chroma, signature: str) -> None:
+    """
+    Compare the backend recorded on the collection with signature.
+    Empty unlabelled collections are labelled; non-empty unlabelled ones
+    (built before signatures were recorded) are accepted with a warning.
+    """
+    collection = vectorstore._collection
+    metadata = dict(collection.metadata or {})
+    recorded = metadata.get(SIGNATURE_KEY)
+
+    if recorded is None:
+        if collection.count() == 0:
+            metadata[SIGNATURE_KEY] = signature
+            collection.modify(metadata=metadata)
+        else:
+            logger.warning(
+                "Collection has no embedding signature; assuming it matches %s", signature
+            )
+        return
 
-    return Chroma(
-        persist_directory=settings.CHROMA_DIR,
-        embedding_function=embeddings
+    if recorded != signature:
+        raise EmbeddingMismatchError(
+            f"Chroma collection at {settings.CHROMA_DIR} was embedded with {recorded!r}, "
+            f"but the configured backend is {signature!r}. Re-ingest or change EMBED_BACKEND/EMBED_MODEL."
+        )
+
+
+def chroma_settings() -> Settings:
+    # Same settings Chroma(persist_directory=...) would use, so fresh and
+    # shared clients agree
+    return Settings(is_persistent=True, persist_directory=settings.CHROMA_DIR)
+
+
+def open_chroma_client(fresh: bool = False) -> ClientAPI:
+    """
+    PersistentClient for CHROMA_DIR. Clients share the process's cached
+    System unless fresh: then the cache is cleared first, so the client
+    starts a System of its own. Clients opened before keep theirs; it is
+    released with their last reference (see RetrievalContext.close).
+    """
+    with _client_lock:
+        if fresh:
+            SharedSystemClient.clear_system_cache()
+        return chromadb.PersistentClient(path=settings.CHROMA_DIR, settings=chroma_settings())
+
+
+def load_vectorstore(embeddings: Optional[Embeddings] = None, fresh: bool = False) -> Chroma:
+    """
+    Open the Chroma collection (ingestion and retrieval) and verify it was
+    built by the configured embedding backend.
+
+    fresh opens a new client instead of the process's cached one: a
+    client does not see writes made by another process (e.g. ingestion)
+    after it opened the collection. Existing clients keep working.
+    """
+    signature = embedding_signature()
+
+    vectorstore = Chroma(
+        client=open_chroma_client(fresh),
+        embedding_function=embeddings or get_embeddings(),
+        collection_metadata={SIGNATURE_KEY: signature}
     )
+    check_embedding_signature(vectorstore, signature)
+
+    return vectorstore
@@ -0,0 +1,84 @@
+import re
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from rag.embeddings import embed_queries
+
+
+def normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", query.strip().lower())
+
+
+class CentroidClassifier:
+    """
+    Local query classifier:
+    - One centroid per category, averaged from ingested chunk embeddings
+    - Query embedding is compared to centroids by cosine similarity
+    - Confidence = softmax probability of the best category
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        centroids: Dict[str, np.ndarray],
+        temperature: float = 0.05
+    ):
+        self.embeddings = embeddings
+        self.categories = list(centroids)
+        matrix = np.vstack([centroids[c] for c in self.categories]).astype(np.float32)
+        self.centroids = matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+        self.temperature = temperature
+
+    @classmethod
+    def from_vectorstore(
+        cls,
+        vectorstore,
+        categories: Iterable[str],
+        temperature: float = 0.05
+    ) -> "CentroidClassifier":
+        wanted = set(categories)
+        raw = vectorstore.get(include=["embeddings", "metadatas"])
+
+        sums: Dict[str, np.ndarray] = {}
+        for vector, meta in zip(raw["embeddings"], raw["metadatas"]):
+            category = str((meta or {}).get("category", "")).lower()
+            if category not in wanted:
+                continue
+            vector = np.asarray(vector, dtype=np.float32)
+            vector = vector / (np.linalg.norm(vector) or 1.0)
+            sums[category] = sums.get(category, 0) + vector
+
+        if not sums:
+            raise ValueError("No chunk embeddings found for any routing category")
+
+        return cls(vectorstore.embeddings, sums, temperature)
+
+    def _scores(self, vector) -> Tuple[str, float]:
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+
+        sims = self.centroids @ query
+        logits = (sims - sims.max()) / self.temperature
+        probs = np.exp(logits) / np.exp(logits).sum()
+
+        best = int(np.argmax(probs))
+        return self.categories[best], float(probs[best])
+
+    def classify(self, query: str) -> Tuple[str, float]:
+        """
+        Return (category, confidence).
+        """
+        return self._scores(self.embeddings.embed_query(query))
+
+    async def aclassify(self, query: str) -> Tuple[str, float]:
+        return self._scores(await self.embeddings.aembed_query(query))
+
+    def classify_batch(self, queries: List[str]) -> List[Tuple[str, float]]:
+        """
+        classify() for many queries with one embedding call.
+        """
+        if not queries:
+            return []
+        return [self._scores(v) for v in embed_queries(self.embeddings, queries)]
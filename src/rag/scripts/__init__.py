@@ -1,15 +1,23 @@
+import hashlib
 import os
+import random
 import re
-import uuid
+import time
 from pathlib import Path
+from typing import Dict, List, Optional
 
+import openai
 from langchain_community.document_loaders import PyPDFLoader, TextLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_chroma import Chroma
 from langchain_core.documents import Document
 
 from rag.settings import settings
+from rag.cache import PersistentCache
+from rag.embeddings import get_embeddings
+from rag.llm import build_chat_model
+from rag.retrievers.vectorstore import load_vectorstore
+from rag.scripts.manifest import IngestManifest, content_hash, make_chunk_id
+from rag.scripts.pipeline import IngestPipeline, print_stage_report
 
 
 # -------------------------------------------------------------
@@ -21,12 +29,20 @@ CHROMA_DIR = settings.CHROMA_DIR
 print("📂 DATA_DIR =", DATA_DIR)
 print("📁 Exists?", os.path.exists(DATA_DIR))
 
-summary_llm = ChatOpenAI(model=settings.MODEL_NAME, api_key=settings.OPENAI_API_KEY)
+summary_llm = build_chat_model()
+
+# Summaries keyed by chunk content hash: unchanged text is never re-summarized
+_summary_cache = None
+
+
+def get_summary_cache() -> PersistentCache:
+    global _summary_cache
+    if _summary_cache is None:
+        _summary_cache = PersistentCache(settings.SUMMARY_CACHE_PATH)
+    return _summary_cache
 
-embeddings = OpenAIEmbeddings(
-    model=settings.EMBED_MODEL,
-    api_key=settings.OPENAI_API_KEY
-)
+
+embeddings = get_embeddings()
 
 
 # -------------------------------------------------------------
@@ -66,81 +82,196 @@ def extract_metadata(root: str, file_name: str):
 # -------------------------------------------------------------
 # LOAD PDF / TXT DOCUMENTS
 # -------------------------------------------------------------
-def load_all_documents():
-    all_docs = []
-
-    print("🔍 Scanning data directory...")
+def list_source_files() -> List[str]:
+    paths = []
 
     for root, _, files in os.walk(DATA_DIR):
         for file in files:
-            full_path = os.path.join(root, file)
-            ext = file.lower()
+            if file.lower().endswith((".pdf", ".txt")):
+                paths.append(os.path.join(root, file))
 
-            if ext.endswith(".pdf"):
-                loader = PyPDFLoader(full_path)
-            elif ext.endswith(".txt"):
-                loader = TextLoader(full_path)
-            else:
-                continue
+    return sorted(paths)
 
-            print(f"📄 Loading: {full_path}")
-            docs = loader.load()
-            metadata = extract_metadata(root, file)
 
-            for d in docs:
-                page_num = d.metadata.get("page", None)
-                d.metadata.update({**metadata, "page_number": page_num})
+def load_file(full_path: str):
+    """
+    Parse one file into pages with folder metadata attached.
+    Module-level so it can run in worker processes.
+    """
+    root, file = os.path.split(full_path)
+
+    if file.lower().endswith(".pdf"):
+        loader = PyPDFLoader(full_path)
+    else:
+        loader = TextLoader(full_path)
 
-            all_docs.extend(docs)
+    print(f"📄 Loading: {full_path}")
+    docs = loader.load()
+    metadata = extract_metadata(root, file)
 
-    return all_docs
+    for d in docs:
+        page_num = d.metadata.get("page", None)
+        d.metadata.update({**metadata, "page_number": page_num})
+
+    return docs
 
 
 # -------------------------------------------------------------
 # LLM SUMMARY (SAFE MODE)
 # -------------------------------------------------------------
-def summarize_text(text: str):
+def _summary_prompt(text: str) -> str:
+    return f"Summarize this text in 1–2 sentences:\n\n{text}"
+
+
+def _summary_key(text: str) -> str:
+    return hashlib.sha256(f"{settings.MODEL_NAME}\x00{text}".encode("utf-8")).hexdigest()
+
+
+# Only these are worth waiting for; anything else fails the item at once
+_TRANSIENT_ERRORS = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError)
+
+
+def _retry_after(error: Exception) -> float:
+    """
+    Seconds the server asked us to wait (Retry-After), or 0.
+    """
+    response = getattr(error, "response", None)
+    if response is None:
+        return 0.0
     try:
-        response = summary_llm.invoke(
-            f"Summarize this text in 1–2 sentences:\n\n{text}"
+        if "retry-after-ms" in response.headers:
+            return float(response.headers["retry-after-ms"]) / 1000
+        return float(response.headers.get("retry-after", 0))
+    except ValueError:
+        # HTTP-date form: fall back to our own backoff
+        return 0.0
+
+
+def _summarize_batch(texts: List[str]) -> List[str]:
+    """
+    Summarize a batch concurrently (bounded by SUMMARY_CONCURRENCY).
+    Rate limits, timeouts and connection errors are retried with
+    exponential backoff (or the server's Retry-After, if longer); other
+    failures and items that still fail get an empty summary.
+    """
+    results: List[str] = [""] * len(texts)
+    pending = list(range(len(texts)))
+
+    for attempt in range(settings.SUMMARY_MAX_RETRIES + 1):
+        responses = summary_llm.batch(
+            [_summary_prompt(texts[i]) for i in pending],
+            config={"max_concurrency": settings.SUMMARY_CONCURRENCY},
+            return_exceptions=True,
         )
-        return response.content
-    except Exception as e:
-        print("⚠ Summary failed:", str(e))
-        return ""
+
+        failed = []
+        for i, response in zip(pending, responses):
+            if isinstance(response, _TRANSIENT_ERRORS):
+                failed.append((i, response))
+            elif isinstance(response, Exception):
+                print(f"⚠ Summary failed for chunk {i}: {response}")
+            else:
+                results[i] = response.content
+
+        if not failed:
+            break
+
+        pending = [i for i, _ in failed]
+
+        if attempt < settings.SUMMARY_MAX_RETRIES:
+            delay = max(
+                settings.SUMMARY_BACKOFF_S * (2 ** attempt) * (1 + random.random()),
+                max(_retry_after(error) for _, error in failed)
+            )
+            print(f"⚠ {len(failed)} summaries failed ({failed[0][1]}); retrying in {delay:.1f}s")
+            time.sleep(delay)
+        else:
+            print(f"⚠ Summary failed for {len(failed)} chunks:", str(failed[0][1]))
+
+    return results
+
+
+def summarize_texts(
+    texts: List[str],
+    cache: Optional[PersistentCache] = None
+) -> List[str]:
+    """
+    Summarize many chunks: cache lookup first, then concurrent
+    batches for the misses. Identical texts are summarized once.
+    """
+    if cache is None:
+        cache = get_summary_cache()
+    keys = [_summary_key(t) for t in texts]
+    summaries: Dict[str, str] = {
+        key: value.decode("utf-8")
+        for key, value in cache.get_many(keys).items()
+    }
+
+    missing = {key: text for key, text in zip(keys, texts) if key not in summaries}
+    if summaries:
+        print(f"♻️ {len(texts) - len(missing)} summaries served from cache")
+
+    todo = list(missing.items())
+    batch_size = settings.SUMMARY_BATCH_SIZE
+
+    for start in range(0, len(todo), batch_size):
+        batch = todo[start:start + batch_size]
+        results = _summarize_batch([text for _, text in batch])
+
+        for (key, _), summary in zip(batch, results):
+            summaries[key] = summary
+
+        # Persist per batch so an interrupted run keeps its progress
+        cache.set_many({
+            key: summary.encode("utf-8")
+            for (key, _), summary in zip(batch, results)
+            if summary
+        })
+        print(f"📝 Summarized {min(start + batch_size, len(todo))}/{len(todo)} chunks")
+
+    return [summaries[key] for key in keys]
 
 
 # -------------------------------------------------------------
 # CHUNKING FUNCTION
 # -------------------------------------------------------------
-def chunk_documents(documents):
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=150,
-        separators=["\n\n", "\n", ".", "?", "!", ";", ","],
-    )
+splitter = RecursiveCharacterTextSplitter(
+    chunk_size=1000,
+    chunk_overlap=150,
+    separators=["\n\n", "\n", ".", "?", "!", ";", ","],
+)
+
 
+def clean_document(doc: Document) -> Optional[Document]:
+    cleaned = clean_text(doc.page_content)
+    if not cleaned.strip():
+        return None
+    return Document(page_content=cleaned, metadata=doc.metadata)
+
+
+def split_documents(documents: List[Document]) -> List[Document]:
+    """
+    Split cleaned pages into chunks with deterministic IDs (no summaries).
+    """
     chunks = []
 
     for doc in documents:
-        cleaned = clean_text(doc.page_content)
-        if not cleaned.strip():
-            continue
+        text_chunks = splitter.split_text(doc.page_content)
 
-        text_chunks = splitter.split_text(cleaned)
-        parent_id = str(uuid.uuid4())
+        # Deterministic IDs: same file + page + position + text => same ID across runs
+        source = os.path.relpath(doc.metadata.get("source", ""), DATA_DIR)
+        page = doc.metadata.get("page_number")
+        parent_id = content_hash(source, page)[:24]
 
         for i, chunk_text in enumerate(text_chunks):
-            chunk_id = str(uuid.uuid4())
-
-            summary = summarize_text(chunk_text)
+            chunk_id = make_chunk_id(source, page, chunk_text, i)
 
             metadata = {
                 **doc.metadata,
                 "chunk_id": chunk_id,
                 "chunk_index": i,
                 "parent_id": parent_id,
-                "summary": summary,
+                "summary": "",
             }
 
             chunks.append(Document(page_content=chunk_text, metadata=metadata))
@@ -148,36 +279,46 @@ def chunk_documents(documents):
     return chunks
 
 
-# -------------------------------------------------------------
-# STORE IN CHROMA
-# -------------------------------------------------------------
-def store_in_chroma(chunks):
-    print(f"💽 Storing {len(chunks)} chunks into ChromaDB...")
-
-    vectordb = Chroma.from_documents(
-        documents=chunks,
-        embedding=embeddings,
-        persist_directory=CHROMA_DIR,
-    )
-
-    vectordb.persist()
-    print("✅ ChromaDB updated successfully!")
-
-
 # -------------------------------------------------------------
 # MAIN INGEST PIPELINE
 # -------------------------------------------------------------
 def ingest():
-    print("\n🚀 Loading documents...")
-    docs = load_all_documents()
-    print(f"📚 Loaded {len(docs)} raw pages")
+    manifest = IngestManifest(settings.INGEST_MANIFEST_PATH, DATA_DIR)
+    plan = manifest.diff(list_source_files())
+    print(
+        f"\n🧾 Files: {len(plan.new)} new, {len(plan.changed)} changed, "
+        f"{len(plan.unchanged)} unchanged, {len(plan.removed)} removed"
+    )
 
-    print("\n🔪 Chunking + summarizing...")
-    chunks = chunk_documents(docs)
-    print(f"🧩 Created {len(chunks)} chunks")
+    if not plan.to_ingest and not plan.removed:
+        manifest.save()
+        print("\n✅ Nothing to ingest — collection is up to date\n")
+        return
+
+    # Streaming: load → clean → split → summarize → embed → upsert,
+    # checkpointing the manifest as files complete
+    print("\n🚀 Streaming documents through the ingest pipeline...")
+    pipeline = IngestPipeline(
+        db=load_vectorstore(embeddings),
+        manifest=manifest,
+        load_fn=load_file,
+        clean_fn=clean_document,
+        split_fn=split_documents,
+        summarize_fn=summarize_texts,
+        embeddings=embeddings,
+        workers=settings.INGEST_WORKERS,
+        queue_size=settings.INGEST_QUEUE_SIZE,
+        summary_batch=settings.SUMMARY_BATCH_SIZE,
+        embed_batch=settings.INGEST_EMBED_BATCH,
+        upsert_batch=settings.INGEST_UPSERT_BATCH,
+        checkpoint_every=settings.INGEST_CHECKPOINT_EVERY,
+        generation_path=settings.INDEX_GENERATION_PATH,
+    )
+    stats = pipeline.run(plan.to_ingest, plan.removed)
+    print_stage_report(stats)
 
-    print("\n💾 Saving embeddings...")
-    store_in_chroma(chunks)
+    if pipeline.failures:
+        print(f"\n⚠ {len(pipeline.failures)} files failed to load; they will be retried next run")
 
     print("\n🎉 INGESTION COMPLETE!\n")
 
@@ -1,46 +1,53 @@
-import os
+from collections import Counter
 from pathlib import Path
 from typing import List
 
-from langchain_openai import OpenAIEmbeddings
-from langchain_chroma import Chroma
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 
 from rag.settings import settings
+from rag.embeddings import get_embeddings
+from rag.retrievers.vectorstore import load_vectorstore
+from rag.scripts.manifest import IngestManifest, make_chunk_id
+from rag.scripts.pipeline import IngestPipeline, print_stage_report
 
 
 DATA_DIR = Path("./data") 
 CHROMA_DIR = settings.CHROMA_DIR
 
-#Load documents
-def load_documents(data_dir: Path) -> List[Document]:
-    documents: List[Document] = []
-
+#List source files
+def list_files(data_dir: Path) -> List[Path]:
     if not data_dir.exists():
         raise RuntimeError(f"Data directory not found: {data_dir}")
 
-    for category_dir in data_dir.iterdir():
+    files: List[Path] = []
+
+    for category_dir in sorted(data_dir.iterdir()):
         if not category_dir.is_dir():
             continue  # ignore files at root level
 
-        category = category_dir.name.lower()
+        files.extend(sorted(category_dir.glob("*.pdf")))
+
+    return files
 
-        for file_path in category_dir.glob("*.pdf"):
-            loader = PyPDFLoader(str(file_path))
-            docs = loader.load()
+#Load one PDF (runs in a worker process)
+def load_pdf(path: str) -> List[Document]:
+    file_path = Path(path)
+    category = file_path.parent.name.lower()
 
-            for doc in docs:
-                doc.metadata.update({
-                    "category": category,
-                    "document_name": file_path.name,
-                    "source": "local",
-                })
+    loader = PyPDFLoader(str(file_path))
+    docs = loader.load()
 
-            documents.extend(docs)
+    for doc in docs:
+        doc.metadata.update({
+            "category": category,
+            "document_name": file_path.name,
+            "file_path": str(file_path),
+            "source": "local",
+        })
 
-    return documents
+    return docs
 
 #chunking
 def chunk_documents(documents: List[Document]) -> List[Document]:
@@ -52,41 +59,62 @@ def chunk_documents(documents: List[Document]) -> List[Document]:
 
     chunks = splitter.split_documents(documents)
 
-    for idx, chunk in enumerate(chunks):
-        chunk.metadata["chunk_index"] = idx
-        chunk.metadata["chunk_id"] = (
-            f"{chunk.metadata['category']}__"
-            f"{chunk.metadata['document_name']}__"
-            f"chunk_{idx}"
-        )
+    # Per-document index + content/position-hashed ID (stable across re-runs)
+    positions: Counter = Counter()
 
-    return chunks
+    for chunk in chunks:
+        meta = chunk.metadata
+        doc_key = meta["file_path"]
 
-def persist_chunks(chunks: List[Document]) -> None:
-    embeddings = OpenAIEmbeddings(
-        model=settings.EMBED_MODEL,
-        api_key=settings.OPENAI_API_KEY
-    )
+        meta["chunk_index"] = positions[doc_key]
+        positions[doc_key] += 1
 
-    db = Chroma(
-        persist_directory=CHROMA_DIR,
-        embedding_function=embeddings
-    )
+        meta["chunk_id"] = make_chunk_id(
+            doc_key,
+            meta.get("page"),
+            chunk.page_content,
+            meta["chunk_index"],
+            prefix=f"{meta['category']}__{meta['document_name']}__"
+        )
 
-    db.add_documents(chunks)
+    return chunks
 
 def main():
     print("Starting ingestion")
 
-    documents = load_documents(DATA_DIR)
-    print(f"Loaded {len(documents)} document pages")
-
-    chunks = chunk_documents(documents)
-    print(f"Created {len(chunks)} chunks")
+    manifest = IngestManifest(settings.INGEST_MANIFEST_PATH, str(DATA_DIR))
+    plan = manifest.diff(str(f) for f in list_files(DATA_DIR))
+    print(
+        f"Files: {len(plan.new)} new, {len(plan.changed)} changed, "
+        f"{len(plan.unchanged)} unchanged, {len(plan.removed)} removed"
+    )
 
-    persist_chunks(chunks)
-    print("Ingestion complete — ChromaDB updated")
+    if not plan.to_ingest and not plan.removed:
+        manifest.save()
+        print("Nothing to ingest — ChromaDB is up to date")
+        return
+
+    embeddings = get_embeddings()
+
+    # Streaming: load → split → embed → upsert with bounded queues,
+    # checkpointing the manifest as files complete
+    pipeline = IngestPipeline(
+        db=load_vectorstore(embeddings),
+        manifest=manifest,
+        load_fn=load_pdf,
+        split_fn=chunk_documents,
+        embeddings=embeddings,
+        workers=settings.INGEST_WORKERS,
+        queue_size=settings.INGEST_QUEUE_SIZE,
+        embed_batch=settings.INGEST_EMBED_BATCH,
+        upsert_batch=settings.INGEST_UPSERT_BATCH,
+        checkpoint_every=settings.INGEST_CHECKPOINT_EVERY,
+        generation_path=settings.INDEX_GENERATION_PATH,
+    )
+    stats = pipeline.run(plan.to_ingest, plan.removed)
+    print_stage_report(stats)
 
+    print(f"Ingestion complete — ChromaDB updated ({len(pipeline.failures)} files failed)")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,78 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Union
+
+from langchain_core.documents import Document
+
+
+LoadFn = Callable[[str], List[Document]]
+
+
+def iter_files_parallel(
+    paths: Iterable[str],
+    load_fn: LoadFn,
+    workers: Optional[int] = None
+) -> Iterator[Tuple[str, Union[List[Document], Exception]]]:
+    """
+    Parse files across a process pool and yield (path, pages) as each
+    file finishes, or (path, exception) if it failed to parse.
+
+    - load_fn must be a module-level function (it is pickled to workers)
+      and returns the file's pages with their metadata already attached
+    - workers <= 1 parses in-process (no pool)
+    """
+    paths = list(paths)
+    workers = workers or os.cpu_count() or 1
+
+    if workers <= 1 or len(paths) <= 1:
+        for path in paths:
+            try:
+                yield path, load_fn(path)
+            except Exception as e:
+                yield path, e
+        return
+
+    workers = min(workers, len(paths))
+    pending_paths = iter(paths)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Sliding window: at most workers * 2 files parsed or waiting to
+        # be consumed, so memory stays bounded by the consumer's pace
+        futures = {}
+        for path in islice(pending_paths, workers * 2):
+            futures[pool.submit(load_fn, path)] = path
+
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = futures.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = e
+
+                yield path, result
+
+                for next_path in islice(pending_paths, 1):
+                    futures[pool.submit(load_fn, next_path)] = next_path
+
+
+def iter_documents_parallel(
+    paths: Iterable[str],
+    load_fn: LoadFn,
+    workers: Optional[int] = None,
+    failures: Optional[List[Tuple[str, str]]] = None
+) -> Iterator[Document]:
+    """
+    Stream pages from iter_files_parallel.
+    A file that fails to parse is reported and skipped; the run goes on.
+    """
+    for path, result in iter_files_parallel(paths, load_fn, workers):
+        if isinstance(result, Exception):
+            print(f"⚠ Failed to load {path}: {result}")
+            if failures is not None:
+                failures.append((path, repr(result)))
+            continue
+
+        yield from result
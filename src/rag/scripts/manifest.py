@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def content_hash(*parts) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def make_chunk_id(source: str, page, text: str, position: int = 0, prefix: str = "") -> str:
+    """
+    Deterministic chunk ID from (source file, page, position, chunk text).
+
+    Unchanged text at an unchanged position keeps its ID across runs, so
+    re-ingest can skip it. The position is part of the hash because it is
+    stored with the chunk (chunk_index): a chunk that moved gets a new ID
+    and is re-upserted with its new metadata instead of keeping a stale one.
+    """
+    digest = content_hash(source, page, position, text)[:24]
+    return f"{prefix}{digest}" if prefix else digest
+
+
+@dataclass
+class ManifestDiff:
+    new: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+
+    @property
+    def to_ingest(self) -> List[str]:
+        return self.new + self.changed
+
+
+class IngestManifest:
+    """
+    Per-file ingest state persisted as JSON next to CHROMA_DIR:
+    relative path -> {mtime, size, sha256, chunk_ids}
+    """
+
+    def __init__(self, path: str, data_dir: str):
+        self.path = path
+        self.data_dir = os.path.abspath(data_dir)
+        self.files: Dict[str, Dict] = {}
+
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.files = json.load(f).get("files", {})
+
+    def key(self, path: str) -> str:
+        return os.path.relpath(os.path.abspath(path), self.data_dir)
+
+    def diff(self, paths: Iterable[str]) -> ManifestDiff:
+        """
+        Classify files against the last run.
+        mtime + size is the fast path; the content hash decides otherwise.
+        """
+        result = ManifestDiff()
+        seen = set()
+
+        for path in paths:
+            key = self.key(path)
+            seen.add(key)
+            entry = self.files.get(key)
+
+            if entry is None:
+                result.new.append(path)
+                continue
+
+            stat = os.stat(path)
+            if entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+                result.unchanged.append(path)
+                continue
+
+            if entry["sha256"] == file_sha256(path):
+                # Touched but identical: refresh the fast-path fields only
+                entry.update({"mtime": stat.st_mtime, "size": stat.st_size})
+                result.unchanged.append(path)
+            else:
+                result.changed.append(path)
+
+        result.removed = [
+            os.path.join(self.data_dir, key) for key in self.files if key not in seen
+        ]
+        return result
+
+    def chunk_ids(self, path: str) -> List[str]:
+        return list(self.files.get(self.key(path), {}).get("chunk_ids", []))
+
+    def record(self, path: str, chunk_ids: List[str]) -> None:
+        stat = os.stat(path)
+        self.files[self.key(path)] = {
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "sha256": file_sha256(path),
+            "chunk_ids": list(chunk_ids),
+        }
+
+    def forget(self, path: str) -> None:
+        self.files.pop(self.key(path), None)
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files}, f, indent=1)
+        os.replace(tmp_path, self.path)
+
@@ -0,0 +1,336 @@
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from rag import metrics
+from rag.retrievers.context import publish_generation
+from rag.scripts.loaders import LoadFn, iter_files_parallel
+from rag.scripts.manifest import IngestManifest
+
+
+_DONE = object()
+
+
+@dataclass
+class FileDone:
+    """
+    Marker that follows the last chunk of a file through the stages.
+    """
+    path: str
+    chunk_ids: List[str]
+
+
+@dataclass
+class StageStats:
+    name: str
+    items: int = 0
+    busy_s: float = 0.0
+
+    @property
+    def per_second(self) -> float:
+        return self.items / self.busy_s if self.busy_s else 0.0
+
+    def record(self, elapsed: float, items: int = 0) -> None:
+        # Per file / batch latency also goes to the ingest.<stage>_s histogram
+        self.busy_s += elapsed
+        self.items += items
+        metrics.observe(f"ingest.{self.name}_s", elapsed)
+
+
+class IngestPipeline:
+    """
+    Streaming ingest: load → clean → split → summarize → embed → upsert
+    - Every stage runs in its own thread; stages are connected by bounded
+      queues, so peak memory depends on queue/batch sizes, not corpus size
+    - Summaries, embeddings and upserts are batched
+    - Chunks whose IDs are already stored for a file skip all later stages
+    - The manifest is checkpointed as files complete, so an interrupted
+      run resumes with the files that were not finished
+    - With generation_path, a new index generation is published at the
+      end, so serving processes hot-reload the collection
+    """
+
+    def __init__(
+        self,
+        db,
+        manifest: IngestManifest,
+        load_fn: LoadFn,
+        split_fn: Callable[[List[Document]], List[Document]],
+        clean_fn: Optional[Callable[[Document], Optional[Document]]] = None,
+        summarize_fn: Optional[Callable[[List[str]], List[str]]] = None,
+        embeddings: Optional[Embeddings] = None,
+        workers: Optional[int] = None,
+        queue_size: int = 8,
+        summary_batch: int = 64,
+        embed_batch: int = 128,
+        upsert_batch: int = 256,
+        checkpoint_every: int = 10,
+        generation_path: Optional[str] = None
+    ):
+        self.db = db
+        self.manifest = manifest
+        self.load_fn = load_fn
+        self.split_fn = split_fn
+        self.clean_fn = clean_fn
+        self.summarize_fn = summarize_fn
+        self.embeddings = embeddings
+        self.workers = workers
+        self.queue_size = queue_size
+        self.summary_batch = summary_batch
+        self.embed_batch = embed_batch
+        self.upsert_batch = upsert_batch
+        self.checkpoint_every = checkpoint_every
+        self.generation_path = generation_path
+
+        self.failures: List[Tuple[str, str]] = []
+        self.stats: Dict[str, StageStats] = {}
+        self._stop = threading.Event()
+        self._errors: List[BaseException] = []
+        self._files_done = 0
+        # chunk ID -> vector, between the embed and upsert stages
+        self._vectors: Dict[str, List[float]] = {}
+
+    # ---------------------------------------------------------
+    # Queue helpers (never block forever once a stage has failed)
+    # ---------------------------------------------------------
+    def _put(self, q: queue.Queue, item) -> None:
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _items(self, q: queue.Queue):
+        while not self._stop.is_set():
+            try:
+                item = q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                return
+            yield item
+
+    def _spawn(
+        self,
+        name: str,
+        target,
+        source,
+        outbox: Optional[queue.Queue] = None
+    ) -> threading.Thread:
+        stats = self.stats[name] = StageStats(name)
+
+        def body():
+            try:
+                target(stats, source, outbox)
+            except BaseException as e:
+                self._errors.append(e)
+                self._stop.set()
+            finally:
+                if outbox is not None:
+                    self._put(outbox, _DONE)
+
+        thread = threading.Thread(target=body, name=f"ingest-{name}", daemon=True)
+        thread.start()
+        return thread
+
+    # ---------------------------------------------------------
+    # Stages
+    # ---------------------------------------------------------
+    def _load(self, stats: StageStats, paths: List[str], outbox: queue.Queue) -> None:
+        start = time.perf_counter()
+
+        for path, result in iter_files_parallel(paths, self.load_fn, self.workers):
+            # Time spent waiting on the parser pool, not on downstream stages
+            stats.record(time.perf_counter() - start)
+
+            if self._stop.is_set():
+                return
+            if isinstance(result, Exception):
+                # Left out of the manifest so the next run retries it
+                print(f"⚠ Failed to load {path}: {result}")
+                self.failures.append((path, repr(result)))
+            else:
+                stats.items += len(result)
+                self._put(outbox, (path, result))
+
+            start = time.perf_counter()
+
+    def _clean(self, stats: StageStats, inbox: queue.Queue, outbox: queue.Queue) -> None:
+        for path, pages in self._items(inbox):
+            start = time.perf_counter()
+            if self.clean_fn is not None:
+                pages = [p for p in map(self.clean_fn, pages) if p is not None]
+            stats.record(time.perf_counter() - start, len(pages))
+            self._put(outbox, (path, pages))
+
+    def _split(self, stats: StageStats, inbox: queue.Queue, outbox: queue.Queue) -> None:
+        for path, pages in self._items(inbox):
+            start = time.perf_counter()
+            chunks = self.split_fn(pages) if pages else []
+            stored = set(self.manifest.chunk_ids(path))
+            stats.record(time.perf_counter() - start, len(chunks))
+
+            for chunk in chunks:
+                if chunk.metadata["chunk_id"] not in stored:
+                    self._put(outbox, chunk)
+
+            self._put(outbox, FileDone(path, [c.metadata["chunk_id"] for c in chunks]))
+
+    def _batched(
+        self,
+        stats: StageStats,
+        inbox: queue.Queue,
+        outbox: Optional[queue.Queue],
+        size: int,
+        process: Callable[[List[Document]], None],
+        on_done: Optional[Callable[[FileDone], None]] = None
+    ) -> None:
+        """
+        Collect chunks into batches; FileDone markers ride along in order
+        and are released only after the chunks before them are processed.
+        """
+        pending: list = []
+        count = 0
+
+        def flush():
+            nonlocal count
+            chunks = [item for item in pending if not isinstance(item, FileDone)]
+            if chunks:
+                start = time.perf_counter()
+                process(chunks)
+                stats.record(time.perf_counter() - start, len(chunks))
+
+            for item in pending:
+                if isinstance(item, FileDone) and on_done is not None:
+                    on_done(item)
+                elif outbox is not None:
+                    self._put(outbox, item)
+
+            pending.clear()
+            count = 0
+
+        for item in self._items(inbox):
+            pending.append(item)
+            if not isinstance(item, FileDone):
+                count += 1
+            # A marker with no chunks ahead of it is released right away
+            if count >= size or count == 0:
+                flush()
+
+        flush()
+
+    def _summarize(self, chunks: List[Document]) -> None:
+        summaries = self.summarize_fn([c.page_content for c in chunks])
+        for chunk, summary in zip(chunks, summaries):
+            chunk.metadata["summary"] = summary
+
+    def _embed(self, chunks: List[Document]) -> None:
+        # Vectors travel to the upsert stage keyed by chunk ID
+        vectors = self.embeddings.embed_documents([c.page_content for c in chunks])
+        for chunk, vector in zip(chunks, vectors):
+            self._vectors[chunk.metadata["chunk_id"]] = vector
+
+    def _upsert(self, chunks: List[Document]) -> None:
+        ids = [c.metadata["chunk_id"] for c in chunks]
+        vectors = [self._vectors.pop(uid, None) for uid in ids]
+
+        if any(v is None for v in vectors):
+            # No embed stage: the store embeds them itself
+            self.db.add_documents(chunks, ids=ids)
+            return
+
+        # Precomputed vectors: nothing is embedded (or looked up) twice
+        self.db._collection.upsert(
+            ids=ids,
+            embeddings=vectors,
+            documents=[c.page_content for c in chunks],
+            metadatas=[c.metadata for c in chunks]
+        )
+
+    def _checkpoint(self, done: FileDone) -> None:
+        stale = set(self.manifest.chunk_ids(done.path)) - set(done.chunk_ids)
+        if stale:
+            self.db.delete(ids=sorted(stale))
+
+        self.manifest.record(done.path, done.chunk_ids)
+        self._files_done += 1
+
+        if self._files_done % self.checkpoint_every == 0:
+            self.manifest.save()
+
+    # ---------------------------------------------------------
+    # Run
+    # ---------------------------------------------------------
+    def run(self, paths: Iterable[str], removed: Iterable[str] = ()) -> Dict[str, StageStats]:
+        removed = list(removed)
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(5)]
+        loaded, cleaned, split, summarized, embedded = queues
+
+        started = time.perf_counter()
+        threads = [
+            self._spawn("load", self._load, list(paths), loaded),
+            self._spawn("clean", self._clean, loaded, cleaned),
+            self._spawn("split", self._split, cleaned, split),
+        ]
+
+        if self.summarize_fn is not None:
+            threads.append(self._spawn(
+                "summarize",
+                lambda stats, i, o: self._batched(stats, i, o, self.summary_batch, self._summarize),
+                split, summarized
+            ))
+        else:
+            summarized = split
+
+        if self.embeddings is not None:
+            threads.append(self._spawn(
+                "embed",
+                lambda stats, i, o: self._batched(stats, i, o, self.embed_batch, self._embed),
+                summarized, embedded
+            ))
+        else:
+            embedded = summarized
+
+        threads.append(self._spawn(
+            "upsert",
+            lambda stats, i, o: self._batched(
+                stats, i, o, self.upsert_batch, self._upsert, on_done=self._checkpoint
+            ),
+            embedded
+        ))
+
+        for thread in threads:
+            thread.join()
+
+        if self._errors:
+            removed = []
+        for path in removed:
+            stale = self.manifest.chunk_ids(path)
+            if stale:
+                self.db.delete(ids=stale)
+            self.manifest.forget(path)
+
+        # Final checkpoint (also keeps the progress of a failed run)
+        self.manifest.save()
+
+        # Published even after a failure: finished files are in the collection
+        if self.generation_path and (self._files_done or removed):
+            publish_generation(self.generation_path, files=self._files_done, removed=len(removed))
+
+        if self._errors:
+            raise self._errors[0]
+
+        self.stats["total"] = StageStats("total", self._files_done, time.perf_counter() - started)
+        return self.stats
+
+
+def print_stage_report(stats: Dict[str, StageStats]) -> None:
+    print(f"\n{'stage':<12}{'items':>10}{'busy (s)':>12}{'items/s':>12}")
+    for s in stats.values():
+        print(f"{s.name:<12}{s.items:>10}{s.busy_s:>12.2f}{s.per_second:>12.1f}")
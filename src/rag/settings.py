@@ -13,7 +13,156 @@ class Settings:
     ENVIRONMENT:str = os.getenv("ENVIRONMENT","Development")
     CHROMA_DIR:str = os.getenv("CHROMA_DIR","./storage/chroma_db")
     MODEL_NAME:str = os.getenv("MODEL_NAME","gpt-3.5-turbo")
+    # Chat backend: "openai" or "fake" (offline stand-in, rag.fakes)
+    LLM_BACKEND:str = os.getenv("LLM_BACKEND","openai")
+    # Simulated latency of the offline stand-ins
+    FAKE_LLM_LATENCY_MS:float = float(os.getenv("FAKE_LLM_LATENCY_MS","200"))
+    FAKE_LLM_TOKEN_MS:float = float(os.getenv("FAKE_LLM_TOKEN_MS","5"))
+    FAKE_EMBED_LATENCY_MS:float = float(os.getenv("FAKE_EMBED_LATENCY_MS","20"))
+    FAKE_EMBED_DIM:int = int(os.getenv("FAKE_EMBED_DIM","256"))
     EMBED_MODEL:str = os.getenv("EMBED_MODEL","text-embedding-3-small")
+
+    # Embedding backend: "openai", "local" (sentence-transformers on CPU;
+    # EMBED_MODEL then names the local model, e.g. all-MiniLM-L6-v2) or
+    # "fake" (offline stand-in, rag.fakes)
+    EMBED_BACKEND:str = os.getenv("EMBED_BACKEND","openai")
+    EMBED_RUNTIME:str = os.getenv("EMBED_RUNTIME","torch")  # "torch" or "onnx"
+    EMBED_INT8:bool = os.getenv("EMBED_INT8","false").lower() in ("1","true","yes")
+    EMBED_ONNX_FILE:str = os.getenv("EMBED_ONNX_FILE","")  # ONNX export to load (runtime "onnx")
+    EMBED_THREADS:int = int(os.getenv("EMBED_THREADS","0"))
+    EMBED_BATCH_SIZE:int = int(os.getenv("EMBED_BATCH_SIZE","32"))
+    EMBED_MAX_WAIT_MS:float = float(os.getenv("EMBED_MAX_WAIT_MS","5"))
+
+    # Embedding cache (memory LRU in front of a size-bounded disk cache)
+    EMBED_CACHE_PATH:str = os.getenv(
+        "EMBED_CACHE_PATH",
+        os.path.join(os.path.dirname(os.path.normpath(CHROMA_DIR)), "embedding_cache.sqlite")
+    )
+    EMBED_CACHE_MAX_ENTRIES:int = int(os.getenv("EMBED_CACHE_MAX_ENTRIES","200000"))
+    EMBED_CACHE_MEMORY_SIZE:int = int(os.getenv("EMBED_CACHE_MEMORY_SIZE","4096"))
+
+    # Metadata fields BM25 indexes are partitioned by (comma separated)
+    BM25_SHARD_FIELDS:tuple = tuple(
+        f.strip() for f in os.getenv("BM25_SHARD_FIELDS","category").split(",") if f.strip()
+    )
+    # Persisted sparse BM25 index (lives next to CHROMA_DIR)
+    BM25_INDEX_DIR:str = os.getenv(
+        "BM25_INDEX_DIR",
+        os.path.join(os.path.dirname(os.path.normpath(CHROMA_DIR)), "bm25_index")
+    )
+    BM25_K1:float = float(os.getenv("BM25_K1","1.5"))
+    BM25_B:float = float(os.getenv("BM25_B","0.75"))
+
+    # Hot index reload: ingestion bumps the generation file; serving
+    # processes poll it every INDEX_RELOAD_INTERVAL_S (0 disables) and
+    # swap in a rebuilt retrieval context
+    INDEX_GENERATION_PATH:str = os.getenv(
+        "INDEX_GENERATION_PATH",
+        os.path.join(os.path.dirname(os.path.normpath(CHROMA_DIR)), "index_generation.json")
+    )
+    INDEX_RELOAD_INTERVAL_S:float = float(os.getenv("INDEX_RELOAD_INTERVAL_S","5"))
+
+    # Vector search backend: "chroma" (client queries), "numpy" (in-process
+    # exact matmul over a memory-mapped matrix) or "hnsw" (hnswlib graph)
+    VECTOR_BACKEND:str = os.getenv("VECTOR_BACKEND","chroma")
+    DENSE_INDEX_DIR:str = os.getenv(
+        "DENSE_INDEX_DIR",
+        os.path.join(os.path.dirname(os.path.normpath(CHROMA_DIR)), "dense_index")
+    )
+    DENSE_DTYPE:str = os.getenv("DENSE_DTYPE","float16")  # "float16" or "int8"
+    DENSE_MASK_FIELDS:tuple = tuple(
+        f.strip() for f in os.getenv("DENSE_MASK_FIELDS","category").split(",") if f.strip()
+    )
+    HNSW_EF_SEARCH:int = int(os.getenv("HNSW_EF_SEARCH","64"))
+
+    # Concurrent retrieval legs (seconds); a slow leg is dropped
+    RETRIEVAL_WORKERS:int = int(os.getenv("RETRIEVAL_WORKERS","4"))
+    VECTOR_TIMEOUT_S:float = float(os.getenv("VECTOR_TIMEOUT_S","10"))
+    BM25_TIMEOUT_S:float = float(os.getenv("BM25_TIMEOUT_S","2"))
+
+    # Hybrid fusion: "rrf" (reciprocal rank) or "score" (min-max normalized)
+    FUSION_METHOD:str = os.getenv("FUSION_METHOD","rrf")
+    FUSION_VECTOR_WEIGHT:float = float(os.getenv("FUSION_VECTOR_WEIGHT","1.0"))
+    FUSION_BM25_WEIGHT:float = float(os.getenv("FUSION_BM25_WEIGHT","1.0"))
+    FUSION_FETCH_MULTIPLIER:int = int(os.getenv("FUSION_FETCH_MULTIPLIER","2"))
+    RRF_K:int = int(os.getenv("RRF_K","60"))
+
+    # Cross-encoder rerank (empty model disables it), e.g.
+    # cross-encoder/ms-marco-MiniLM-L-6-v2
+    RERANK_MODEL:str = os.getenv("RERANK_MODEL","")
+    RERANK_CANDIDATES:int = int(os.getenv("RERANK_CANDIDATES","20"))
+    RERANK_TOP_N:int = int(os.getenv("RERANK_TOP_N","3"))
+    RERANK_BATCH_SIZE:int = int(os.getenv("RERANK_BATCH_SIZE","16"))
+    RERANK_BUDGET_MS:float = float(os.getenv("RERANK_BUDGET_MS","300"))
+    RERANK_CACHE_SIZE:int = int(os.getenv("RERANK_CACHE_SIZE","4096"))
+
+    # Neighbour expansion: extra chunks (per query) taken from positions
+    # within NEIGHBOUR_WINDOW of the top hits; 0 disables
+    NEIGHBOUR_BUDGET:int = int(os.getenv("NEIGHBOUR_BUDGET","2"))
+    NEIGHBOUR_WINDOW:int = int(os.getenv("NEIGHBOUR_WINDOW","1"))
+
+    # Query routing: "llm" or "centroid" (local, LLM fallback below confidence)
+    ROUTER_MODE:str = os.getenv("ROUTER_MODE","llm")
+    ROUTER_CONFIDENCE:float = float(os.getenv("ROUTER_CONFIDENCE","0.6"))
+    ROUTER_TEMPERATURE:float = float(os.getenv("ROUTER_TEMPERATURE","0.05"))
+    ROUTER_CACHE_SIZE:int = int(os.getenv("ROUTER_CACHE_SIZE","1024"))
+
+    # Semantic answer cache (0 entries disables it; 0 TTL = no expiry)
+    ANSWER_CACHE_SIZE:int = int(os.getenv("ANSWER_CACHE_SIZE","2048"))
+    ANSWER_CACHE_THRESHOLD:float = float(os.getenv("ANSWER_CACHE_THRESHOLD","0.95"))
+    ANSWER_CACHE_TTL_S:float = float(os.getenv("ANSWER_CACHE_TTL_S","3600"))
+
+    # Context packing: token budget for retrieved text; chunks ranked
+    # below CONTEXT_FULL_CHUNKS are represented by their summaries
+    CONTEXT_TOKEN_BUDGET:int = int(os.getenv("CONTEXT_TOKEN_BUDGET","2500"))
+    CONTEXT_FULL_CHUNKS:int = int(os.getenv("CONTEXT_FULL_CHUNKS","3"))
+
+    # Identical concurrent queries share one execution (single-flight)
+    COALESCE_REQUESTS:bool = os.getenv("COALESCE_REQUESTS","true").lower() in ("1","true","yes")
+
+    # Batch answering (run_batch / rag-batch): queries per retrieval
+    # batch, and max concurrent LLM requests
+    BATCH_CHUNK_SIZE:int = int(os.getenv("BATCH_CHUNK_SIZE","64"))
+    BATCH_CONCURRENCY:int = int(os.getenv("BATCH_CONCURRENCY","8"))
+
+    # HTTP service (rag / rag.api): one process per worker, each with its
+    # own warmed-up indexes
+    API_HOST:str = os.getenv("API_HOST","0.0.0.0")
+    API_PORT:int = int(os.getenv("API_PORT","8000"))
+    API_WORKERS:int = int(os.getenv("API_WORKERS","1"))
+
+    # Sampling interval of the per-request profiler (rag.metrics.profile)
+    PROFILE_INTERVAL_MS:float = float(os.getenv("PROFILE_INTERVAL_MS","5"))
+
+    # Pooled OpenAI HTTP clients shared by chat + embeddings
+    OPENAI_MAX_CONNECTIONS:int = int(os.getenv("OPENAI_MAX_CONNECTIONS","64"))
+    OPENAI_KEEPALIVE_CONNECTIONS:int = int(os.getenv("OPENAI_KEEPALIVE_CONNECTIONS","32"))
+    OPENAI_TIMEOUT_S:float = float(os.getenv("OPENAI_TIMEOUT_S","60"))
+
+    # Ingest-time chunk summarization
+    SUMMARY_CONCURRENCY:int = int(os.getenv("SUMMARY_CONCURRENCY","8"))
+    SUMMARY_BATCH_SIZE:int = int(os.getenv("SUMMARY_BATCH_SIZE","64"))
+    SUMMARY_MAX_RETRIES:int = int(os.getenv("SUMMARY_MAX_RETRIES","5"))
+    SUMMARY_BACKOFF_S:float = float(os.getenv("SUMMARY_BACKOFF_S","1.0"))
+    SUMMARY_CACHE_PATH:str = os.getenv(
+        "SUMMARY_CACHE_PATH",
+        os.path.join(os.path.dirname(os.path.normpath(CHROMA_DIR)), "summary_cache.sqlite")
+    )
+
+    # Worker processes for document parsing (0 = one per CPU, 1 = in-process)
+    INGEST_WORKERS:int = int(os.getenv("INGEST_WORKERS","0"))
+
+    # Streaming ingest: bounded queues between stages + batch sizes
+    INGEST_QUEUE_SIZE:int = int(os.getenv("INGEST_QUEUE_SIZE","8"))
+    INGEST_EMBED_BATCH:int = int(os.getenv("INGEST_EMBED_BATCH","128"))
+    INGEST_UPSERT_BATCH:int = int(os.getenv("INGEST_UPSERT_BATCH","256"))
+    INGEST_CHECKPOINT_EVERY:int = int(os.getenv("INGEST_CHECKPOINT_EVERY","10"))
+
+    # Per-file hashes + chunk IDs from the last ingest (incremental re-runs)
+    INGEST_MANIFEST_PATH:str = os.getenv(
+        "INGEST_MANIFEST_PATH",
+        os.path.join(os.path.dirname(os.path.normpath(CHROMA_DIR)), "ingest_manifest.json")
+    )
 settings= Settings()
 
 
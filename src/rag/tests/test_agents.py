@@ -1,12 +1,13 @@
 from rag.agents import AgentSystem
+from rag.llm import build_chat_model
+from rag.tests.test_rag import offline_rag  # noqa: F401 (fixture)
 
 
-def test_agent_routing_and_execution():
+def test_agent_routing_and_execution(offline_rag):
     """
-    Integration test for router + agents + RAG pipeline.
+    Router + agents + RAG pipeline over the offline corpus.
     """
-
-    agent_system = AgentSystem()
+    agent_system = AgentSystem(rag=offline_rag, llm=build_chat_model())
 
     test_cases = [
         {
@@ -28,26 +29,11 @@ def test_agent_routing_and_execution():
     ]
 
     for case in test_cases:
-        print("\n" + "=" * 60)
-        print(f"QUERY: {case['query']}")
-
         result = agent_system.run(case["query"])
 
-        # Basic assertions
-        assert "answer" in result
-        assert "documents" in result
-
-        print("ANSWER:")
-        print(result["answer"])
-
-        if result["documents"]:
-            categories = {d["category"] for d in result["documents"]}
-            print("CATEGORIES FOUND:", categories)
-
-            # Category constraint check
-            assert case["expected_category"] in categories
-        else:
-            print(" No documents retrieved (acceptable if data missing)")
+        assert result["answer"]
+        assert result["documents"]
 
-if __name__ == "__main__":
-    test_agent_routing_and_execution()
\ No newline at end of file
+        # Category constraint check
+        categories = {d["category"] for d in result["documents"]}
+        assert categories == {case["expected_category"]}
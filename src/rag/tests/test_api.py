@@ -0,0 +1,73 @@
+import json
+import os
+from types import SimpleNamespace
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import pytest
+
+pytest.importorskip("fastapi")
+from fastapi.testclient import TestClient
+from langchain_core.documents import Document
+
+from rag.api import create_app
+
+
+class StubRAG:
+    def __init__(self):
+        doc = Document(page_content="Members may cancel within 30 days.", metadata={"chunk_id": "m1"})
+        self.retriever = SimpleNamespace(
+            context=SimpleNamespace(documents=[doc], neighbours=None, generation=3),
+            aretrieve=self._aretrieve,
+        )
+        self.context_builder = SimpleNamespace(count_tokens=len)
+        self.doc = doc
+
+    async def _aretrieve(self, query, category=None, k=6, expand=None):
+        return [self.doc]
+
+    async def arun(self, query, category=None, k=6):
+        return {"answer": f"scoped:{category}", "documents": [self.doc.metadata], "context": ""}
+
+    async def astream(self, query, category=None, k=6):
+        yield {"type": "sources", "documents": [self.doc.metadata], "context": ""}
+        yield {"type": "token", "content": "30 days"}
+        yield {"type": "done", "answer": "30 days", "ttft_s": 0.01}
+
+
+class StubSystem:
+    def __init__(self):
+        self.rag = StubRAG()
+
+    async def arun(self, query):
+        return {"answer": "routed", "documents": [], "context": ""}
+
+    def astream(self, query):
+        return self.rag.astream(query)
+
+
+def test_query_retrieve_and_stream_endpoints():
+    with TestClient(create_app(StubSystem())) as client:
+        assert client.get("/health").json() == {"status": "ok", "chunks": 1, "generation": 3}
+
+        assert client.post("/query", json={"query": "cancel?"}).json()["answer"] == "routed"
+        scoped = client.post("/query", json={"query": "cancel?", "category": "membership"})
+        assert scoped.json()["answer"] == "scoped:membership"
+        assert client.post("/query", json={"query": ""}).status_code == 422
+        assert "timings" in client.post("/query", json={"query": "cancel?"}).json()
+        assert client.get("/metrics").headers["content-type"].startswith("text/plain")
+
+        docs = client.post("/retrieve", json={"query": "cancel?"}).json()["documents"]
+        assert docs[0]["metadata"]["chunk_id"] == "m1"
+
+        with client.stream("POST", "/stream", json={"query": "cancel?"}) as response:
+            events = [json.loads(line) for line in response.iter_lines() if line]
+        assert [e["type"] for e in events] == ["sources", "token", "done"]
+
+
+def test_only_query_advertises_profile():
+    schemas = create_app(StubSystem()).openapi()["components"]["schemas"]
+
+    assert "profile" in schemas["AnswerRequest"]["properties"]
+    assert "profile" not in schemas["RetrieveRequest"]["properties"]
+    assert "profile" not in schemas["QueryRequest"]["properties"]
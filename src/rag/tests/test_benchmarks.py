@@ -0,0 +1,43 @@
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from rag.benchmarks import suite
+from rag.fakes import FakeChatModel, FakeEmbeddings
+from rag.settings import settings
+
+
+def test_fakes_are_deterministic_and_grounded():
+    embeddings = FakeEmbeddings(dim=64)
+    assert embeddings.embed_query("battery life") == FakeEmbeddings(dim=64).embed_query("battery life")
+    assert embeddings.embed_query("battery life") != embeddings.embed_query("cancel membership")
+
+    llm = FakeChatModel()
+    prompt = "Context:\n[Source: manual.pdf | Page: 1]\nThe battery lasts seven days. Charge weekly.\n\nQuestion:\nbattery?"
+    assert llm.invoke(prompt).content == "The battery lasts seven days."
+    assert "".join(c.content for c in llm.stream(prompt)) == "The battery lasts seven days."
+    assert llm.invoke("Classify the user query into ONE category:\nQuery:\nHow do I cancel my plan?").content == "membership"
+
+
+def test_suite_runs_offline_and_reports_every_benchmark(monkeypatch, tmp_path):
+    # configure() rewrites these; restore them after the test
+    for name in (
+        "LLM_BACKEND", "EMBED_BACKEND", "FAKE_LLM_LATENCY_MS", "FAKE_LLM_TOKEN_MS",
+        "FAKE_EMBED_LATENCY_MS", "CHROMA_DIR", "BM25_INDEX_DIR", "DENSE_INDEX_DIR",
+        "EMBED_CACHE_PATH", "SUMMARY_CACHE_PATH", "INGEST_MANIFEST_PATH", "ANSWER_CACHE_SIZE",
+        "INDEX_GENERATION_PATH",
+    ):
+        monkeypatch.setattr(settings, name, getattr(settings, name))
+
+    report = suite.run_suite(
+        str(tmp_path), files=4, pages=2, queries=8, concurrency=(1, 2),
+        llm_ms=0, token_ms=0, embed_ms=0, workers=1
+    )
+    results = report["results"]
+
+    assert results["ingest"]["files"] == 4
+    assert results["ingest"]["chunks"] > 0
+    assert set(results["retrieve"]) == {"embed", "vector", "bm25", "fused"}
+    assert set(results["agents"]) == {"1", "2"}
+    assert all(r["qps"] > 0 for r in results["agents"].values())
+    assert "agents.2.qps" in suite.flatten(results)
@@ -0,0 +1,176 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# rag.scripts builds its OpenAI clients at import; no request is ever sent
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import httpx
+import openai
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from rag import scripts
+from rag.cache import PersistentCache
+from rag.embeddings import CachedEmbeddings, MicroBatcher, embedding_signature
+from rag.retrievers.vectorstore import SIGNATURE_KEY, EmbeddingMismatchError, load_vectorstore
+from rag.settings import settings
+
+
+def test_persistent_cache_survives_reopen_and_evicts(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+
+    cache = PersistentCache(path, max_entries=2)
+    cache.set("a", b"1")
+    cache.set("b", b"2")
+    cache.get("a")
+    cache.set("c", b"3")
+
+    reopened = PersistentCache(path, max_entries=2)
+    assert reopened.get_many(["a", "b", "c"]) == {"a": b"1", "c": b"3"}
+
+
+def rate_limited(retry_after: str = "0") -> openai.RateLimitError:
+    response = httpx.Response(
+        429,
+        headers={"retry-after": retry_after},
+        request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    )
+    return openai.RateLimitError("429 Too Many Requests", response=response, body=None)
+
+
+class FlakyLLM:
+    """
+    Fails every prompt once (a rate limit by default), then answers.
+    """
+
+    def __init__(self, error=rate_limited):
+        self.prompts = []
+        self.seen = set()
+        self.error = error
+
+    def batch(self, prompts, config=None, return_exceptions=False):
+        results = []
+        for prompt in prompts:
+            self.prompts.append(prompt)
+            if prompt not in self.seen:
+                self.seen.add(prompt)
+                results.append(self.error())
+            else:
+                results.append(type("Msg", (), {"content": f"summary of {prompt[-5:]}"})())
+        return results
+
+
+def test_summaries_retry_and_are_cached(monkeypatch, tmp_path):
+    llm = FlakyLLM()
+    monkeypatch.setattr(scripts, "summary_llm", llm)
+    monkeypatch.setattr(scripts.settings, "SUMMARY_BACKOFF_S", 0.0)
+    cache = PersistentCache(str(tmp_path / "summaries.sqlite"))
+
+    texts = ["chunk one", "chunk two", "chunk one"]
+    first = scripts.summarize_texts(texts, cache=cache)
+
+    assert first == ["summary of k one", "summary of k two", "summary of k one"]
+    # Two unique texts, each tried twice
+    assert len(llm.prompts) == 4
+
+    # Re-ingesting unchanged text costs no LLM calls
+    assert scripts.summarize_texts(texts, cache=cache) == first
+    assert len(llm.prompts) == 4
+
+
+def test_summaries_honour_retry_after_and_skip_permanent_errors(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(scripts.time, "sleep", sleeps.append)
+    monkeypatch.setattr(scripts.settings, "SUMMARY_BACKOFF_S", 0.0)
+
+    llm = FlakyLLM(lambda: rate_limited(retry_after="7"))
+    monkeypatch.setattr(scripts, "summary_llm", llm)
+    assert scripts._summarize_batch(["chunk one"]) == ["summary of k one"]
+    assert sleeps == [7.0]
+
+    # A bad request is not retried: the item just gets no summary
+    llm = FlakyLLM(lambda: ValueError("context length exceeded"))
+    monkeypatch.setattr(scripts, "summary_llm", llm)
+    assert scripts._summarize_batch(["chunk one"]) == [""]
+    assert len(llm.prompts) == 1 and sleeps == [7.0]
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+    def embed_query(self, text):
+        self.calls.append([text])
+        return [float(len(text)), 0.5]
+
+
+def test_cached_embeddings_hit_memory_then_disk(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    underlying = CountingEmbeddings()
+
+    cached = CachedEmbeddings(underlying, "model-a", store=PersistentCache(path))
+    assert cached.embed_documents(["aa", "bbb", "aa"]) == [[2.0, 1.0], [3.0, 1.0], [2.0, 1.0]]
+    assert cached.embed_query("q") == [1.0, 0.5]
+    assert cached.embed_query("q") == [1.0, 0.5]
+    assert underlying.calls == [["aa", "bbb"], ["q"]]
+    assert cached.stats()["memory"]["hits"] == 1
+
+    # New process: served from the disk tier
+    fresh = CachedEmbeddings(underlying, "model-a", store=PersistentCache(path))
+    assert fresh.embed_documents(["bbb", "cccc"]) == [[3.0, 1.0], [4.0, 1.0]]
+    assert underlying.calls[-1] == ["cccc"]
+    assert fresh.stats()["disk"]["hits"] == 1
+
+    # Another model never sees these vectors
+    other = CachedEmbeddings(underlying, "model-b", store=PersistentCache(path))
+    other.embed_query("q")
+    assert underlying.calls[-1] == ["q"]
+
+
+def test_micro_batcher_coalesces_concurrent_queries():
+    calls = []
+    started, release = threading.Event(), threading.Event()
+
+    def encode(texts):
+        calls.append(sorted(texts))
+        started.set()
+        release.wait()
+        return [[float(len(t))] for t in texts]
+
+    batcher = MicroBatcher(encode, max_batch=8, max_wait_s=0)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        first = pool.submit(batcher.submit, "a")
+        started.wait()
+        # The worker is busy with "a": the rest queue up behind it
+        rest = [pool.submit(batcher.submit, text) for text in ["bb", "ccc", "dddd"]]
+        while batcher._queue.qsize() < 3:
+            time.sleep(0.001)
+        release.set()
+        vectors = [first.result()] + [future.result() for future in rest]
+
+    assert vectors == [[1.0], [2.0], [3.0], [4.0]]
+    assert calls == [["a"], ["bb", "ccc", "dddd"]]
+
+    batcher.close()
+    assert not batcher._worker.is_alive()
+    with pytest.raises(RuntimeError):
+        batcher.submit("e")
+
+
+def test_collection_records_embedding_backend(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "CHROMA_DIR", str(tmp_path / "chroma"))
+
+    store = load_vectorstore(CountingEmbeddings())
+    assert store._collection.metadata[SIGNATURE_KEY] == embedding_signature()
+    store.add_texts(["privacy policy"], ids=["p1"])
+
+    monkeypatch.setattr(settings, "EMBED_BACKEND", "local")
+    monkeypatch.setattr(settings, "EMBED_MODEL", "all-MiniLM-L6-v2")
+    with pytest.raises(EmbeddingMismatchError):
+        load_vectorstore(CountingEmbeddings())
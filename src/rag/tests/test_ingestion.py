@@ -0,0 +1,256 @@
+import os
+from types import SimpleNamespace
+
+# Importing rag.scripts builds its OpenAI clients; no request is ever sent
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from langchain_core.documents import Document
+
+from rag.benchmarks.corpus import write_pdf
+from rag.fakes import FakeEmbeddings
+from rag.scripts import clean_document, load_file, split_documents
+from rag.scripts.loaders import iter_documents_parallel
+from rag.scripts.pipeline import IngestPipeline
+from rag.scripts.manifest import IngestManifest, make_chunk_id
+
+
+class RecordingStore:
+    """
+    Stand-in for the Chroma collection: records upserts and deletes.
+    """
+
+    def __init__(self):
+        self.rows = {}
+        self.added = []
+        self.deleted = []
+        self.vectors = {}
+        # Upserts with precomputed vectors go to the raw collection
+        self._collection = SimpleNamespace(upsert=self.upsert)
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.vectors.update(zip(ids, embeddings))
+        self.add_documents(
+            [Document(page_content=d, metadata=m) for d, m in zip(documents, metadatas)],
+            ids
+        )
+
+    def add_documents(self, documents, ids):
+        self.added.extend(ids)
+        self.rows.update(zip(ids, documents))
+
+    def delete(self, ids):
+        self.deleted.extend(ids)
+        for uid in ids:
+            self.rows.pop(uid, None)
+
+
+def read_lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [
+            Document(page_content=line.strip(), metadata={"source": path})
+            for line in f if line.strip()
+        ]
+
+
+def split_lines(pages):
+    return [
+        Document(
+            page_content=page.page_content,
+            metadata={
+                **page.metadata,
+                "chunk_index": i,
+                "chunk_id": make_chunk_id(os.path.basename(page.metadata["source"]), 0, page.page_content, i)
+            }
+        )
+        for i, page in enumerate(pages)
+    ]
+
+
+def ingest(data_dir, manifest_path, store):
+    manifest = IngestManifest(manifest_path, str(data_dir))
+    files = sorted(str(p) for p in data_dir.iterdir())
+    plan = manifest.diff(files)
+    store.added.clear()
+    store.deleted.clear()
+    IngestPipeline(
+        db=store,
+        manifest=manifest,
+        load_fn=read_lines,
+        split_fn=split_lines,
+        workers=1,
+    ).run(plan.to_ingest, plan.removed)
+    return plan
+
+
+def test_reingest_only_touches_changed_and_removed_files(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    (data_dir / "a.txt").write_text("alpha one\nalpha two\n")
+    (data_dir / "b.txt").write_text("beta one\n")
+    manifest_path = str(tmp_path / "manifest.json")
+    store = RecordingStore()
+
+    plan = ingest(data_dir, manifest_path, store)
+    assert len(plan.new) == 2
+    assert len(store.added) == 3 and store.deleted == []
+
+    # Unchanged corpus: nothing parsed, embedded or deleted
+    plan = ingest(data_dir, manifest_path, store)
+    assert plan.to_ingest == [] and plan.removed == []
+    assert store.added == [] and store.deleted == []
+
+    # One line edited: only that chunk is re-embedded
+    (data_dir / "a.txt").write_text("alpha one\nalpha 2\n")
+    plan = ingest(data_dir, manifest_path, store)
+    assert [os.path.basename(p) for p in plan.changed] == ["a.txt"]
+    assert [store.rows[uid].page_content for uid in store.added] == ["alpha 2"]
+    assert len(store.deleted) == 1
+
+    # Removed file: its chunks are deleted
+    (data_dir / "b.txt").unlink()
+    plan = ingest(data_dir, manifest_path, store)
+    assert [os.path.basename(p) for p in plan.removed] == ["b.txt"]
+    assert len(store.deleted) == 1
+    assert sorted(r.page_content for r in store.rows.values()) == ["alpha 2", "alpha one"]
+
+
+def test_moved_chunk_is_restored_with_its_new_position(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    (data_dir / "a.txt").write_text("alpha one\nalpha two\n")
+    manifest_path = str(tmp_path / "manifest.json")
+    store = RecordingStore()
+    ingest(data_dir, manifest_path, store)
+
+    # A line inserted on top shifts the others: stored positions follow
+    (data_dir / "a.txt").write_text("alpha zero\nalpha one\nalpha two\n")
+    ingest(data_dir, manifest_path, store)
+
+    assert sorted((d.metadata["chunk_index"], d.page_content) for d in store.rows.values()) == [
+        (0, "alpha zero"), (1, "alpha one"), (2, "alpha two")
+    ]
+
+
+def test_parallel_loader_keeps_metadata_and_skips_broken_files(tmp_path):
+    folder = tmp_path / "data" / "Device" / "Specs" / "2024"
+    folder.mkdir(parents=True)
+    write_pdf(str(folder / "manual.pdf"), ["first page", "second page"])
+    (folder / "broken.pdf").write_bytes(b"not a pdf")
+    (folder / "notes.txt").write_text("plain text notes")
+
+    failures = []
+    docs = list(iter_documents_parallel(
+        sorted(str(p) for p in folder.iterdir()),
+        load_file,
+        workers=2,
+        failures=failures
+    ))
+
+    assert [os.path.basename(path) for path, _ in failures] == ["broken.pdf"]
+    assert sorted((d.metadata["file_name"], d.metadata["page_number"]) for d in docs) == [
+        ("manual.pdf", 0), ("manual.pdf", 1), ("notes.txt", None)
+    ]
+    assert {d.metadata["category"] for d in docs} == {"Device"}
+    assert {d.metadata["year"] for d in docs} == {"2024"}
+
+
+class FailingStore(RecordingStore):
+    def __init__(self, fail_after: int):
+        super().__init__()
+        self.fail_after = fail_after
+
+    def add_documents(self, documents, ids):
+        if len(self.added) >= self.fail_after:
+            raise RuntimeError("connection reset")
+        super().add_documents(documents, ids)
+
+
+def run_pipeline(store, manifest, paths, summaries):
+    pipeline = IngestPipeline(
+        db=store,
+        manifest=manifest,
+        load_fn=load_file,
+        clean_fn=clean_document,
+        split_fn=split_documents,
+        summarize_fn=lambda texts: summaries.extend(texts) or [t.upper() for t in texts],
+        workers=1,
+        queue_size=1,
+        summary_batch=2,
+        upsert_batch=1,
+        checkpoint_every=1,
+    )
+    return pipeline.run(paths)
+
+
+def test_streaming_pipeline_checkpoints_and_resumes(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    for name in ("a", "b", "c"):
+        (data_dir / f"{name}.txt").write_text(f"{name} first line")
+    paths = sorted(str(p) for p in data_dir.iterdir())
+    manifest_path = str(tmp_path / "manifest.json")
+
+    # Interrupted after the first file was stored
+    store = FailingStore(fail_after=1)
+    summaries = []
+    try:
+        run_pipeline(store, IngestManifest(manifest_path, str(data_dir)), paths, summaries)
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("pipeline should surface the upsert failure")
+
+    manifest = IngestManifest(manifest_path, str(data_dir))
+    plan = manifest.diff(paths)
+    assert [os.path.basename(p) for p in plan.unchanged] == ["a.txt"]
+
+    # Resume: only the unfinished files go through the stages
+    store.fail_after = 10
+    summaries.clear()
+    stats = run_pipeline(store, manifest, plan.to_ingest, summaries)
+
+    assert summaries == ["b first line", "c first line"]
+    assert stats["upsert"].items == 2
+    assert sorted(d.page_content for d in store.rows.values()) == [
+        "a first line", "b first line", "c first line"
+    ]
+    assert {d.metadata["summary"] for d in store.rows.values()} == {
+        "A FIRST LINE", "B FIRST LINE", "C FIRST LINE"
+    }
+    assert IngestManifest(manifest_path, str(data_dir)).diff(paths).to_ingest == []
+
+
+class CountingEmbeddings(FakeEmbeddings):
+    def __init__(self):
+        super().__init__(dim=8)
+        self.texts = []
+
+    def embed_documents(self, texts):
+        self.texts.extend(texts)
+        return super().embed_documents(texts)
+
+
+def test_pipeline_upserts_the_vectors_it_embedded(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    for name in ("a", "b"):
+        (data_dir / f"{name}.txt").write_text(f"{name} first line")
+    paths = sorted(str(p) for p in data_dir.iterdir())
+
+    store = RecordingStore()
+    embeddings = CountingEmbeddings()
+    IngestPipeline(
+        db=store,
+        manifest=IngestManifest(str(tmp_path / "manifest.json"), str(data_dir)),
+        load_fn=load_file,
+        split_fn=split_documents,
+        embeddings=embeddings,
+        workers=1,
+        embed_batch=1,
+    ).run(paths)
+
+    # Each chunk embedded once, and that vector is the one stored
+    assert sorted(embeddings.texts) == ["a first line", "b first line"]
+    assert set(store.vectors) == set(store.rows)
+    for uid, doc in store.rows.items():
+        assert store.vectors[uid] == embeddings.embed_query(doc.page_content)
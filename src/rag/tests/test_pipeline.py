@@ -0,0 +1,371 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from rag import metrics
+from rag.batch import completed_ids
+from rag.answer_cache import AnswerCache
+from rag.context_builder import ContextBuilder
+from rag.embeddings import CachedEmbeddings
+from rag.rag_pipeline import RAGPipeline
+from rag.settings import settings
+from rag.tests.test_routing import KeywordEmbeddings
+
+
+@pytest.fixture(autouse=True)
+def no_default_answer_cache(monkeypatch):
+    # The process-wide cache would embed through OpenAI
+    monkeypatch.setattr(settings, "ANSWER_CACHE_SIZE", 0)
+
+
+class StaticRetriever:
+    def __init__(self, docs):
+        self.docs = docs
+        self.calls = 0
+        self.context = SimpleNamespace(
+            id_set=frozenset(d.metadata["chunk_id"] for d in docs), generation=0
+        )
+
+    def retrieve(self, query, category=None, k=6):
+        self.calls += 1
+        return self.docs[:k]
+
+    async def aretrieve(self, query, category=None, k=6):
+        return self.retrieve(query, category, k)
+
+
+def make_docs():
+    return [
+        Document(
+            page_content="Members may cancel within 30 days.",
+            metadata={"chunk_id": "m1", "document_name": "terms", "category": "membership"},
+        )
+    ]
+
+
+def fake_llm(*answers):
+    return GenericFakeChatModel(messages=iter([AIMessage(content=a) for a in answers]))
+
+
+def test_stream_emits_sources_then_tokens():
+    rag = RAGPipeline(retriever=StaticRetriever(make_docs()), llm=fake_llm("Within 30 days."))
+    before = metrics.get_metric("rag.ttft_s").count
+
+    events = list(rag.stream("How do I cancel?"))
+
+    assert events[0]["type"] == "sources"
+    assert events[0]["documents"][0]["chunk_id"] == "m1"
+    tokens = [e["content"] for e in events if e["type"] == "token"]
+    assert len(tokens) > 1
+    assert "".join(tokens) == "Within 30 days."
+    assert events[-1]["type"] == "done"
+    assert events[-1]["answer"] == "Within 30 days."
+    assert events[-1]["ttft_s"] is not None
+    assert metrics.get_metric("rag.ttft_s").count == before + 1
+
+
+def test_astream_without_results_answers_immediately():
+    rag = RAGPipeline(retriever=StaticRetriever([]), llm=fake_llm())
+
+    async def collect():
+        return [e async for e in rag.astream("anything")]
+
+    events = asyncio.run(collect())
+
+    assert [e["type"] for e in events] == ["sources", "token", "done"]
+    assert events[-1]["answer"] == RAGPipeline._no_results()["answer"]
+
+
+def test_answer_cache_serves_paraphrases_until_cited_chunk_changes():
+    retriever = StaticRetriever(make_docs())
+    cache = AnswerCache(KeywordEmbeddings(), threshold=0.95, maxsize=8)
+    rag = RAGPipeline(
+        retriever=retriever,
+        llm=fake_llm("Within 30 days.", "Within 14 days."),
+        answer_cache=cache,
+    )
+
+    first = rag.run("How do I cancel my membership?", category="membership")
+    again = rag.run("  how do I CANCEL my   membership? ", category="membership")
+    other_scope = rag.run("How do I cancel my membership?", category="device")
+
+    assert again["answer"] == first["answer"] == "Within 30 days."
+    assert retriever.calls == 2
+    assert other_scope["answer"] == "Within 14 days."
+
+    # Re-ingest changed the cited chunk: its ID is gone from the collection
+    retriever.context = SimpleNamespace(id_set=frozenset({"m2"}), generation=0)
+    assert cache.lookup("How do I cancel my membership?", "membership:6",
+                        retriever.context.id_set) is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["stale"] == 1
+    assert stats["hit_rate"] == 0.25
+
+
+def test_answer_retrieved_before_a_reload_is_not_cached():
+    retriever = StaticRetriever(make_docs())
+    cache = AnswerCache(KeywordEmbeddings(), threshold=0.95, maxsize=8)
+    rag = RAGPipeline(retriever=retriever, llm=fake_llm("Within 30 days."), answer_cache=cache)
+
+    class ReloadingRetriever:
+        # The index is reloaded while this query is being answered
+        context = retriever.context
+
+        def retrieve(self, query, category=None, k=6):
+            cache.clear(generation=1)
+            return retriever.retrieve(query, category, k)
+
+    rag.retriever = ReloadingRetriever()
+    rag.run("How do I cancel my membership?", category="membership")
+
+    assert len(cache) == 0
+
+
+def test_cache_miss_embeds_the_query_once():
+    class CountingEmbeddings(KeywordEmbeddings):
+        texts = []
+
+        def embed_query(self, text):
+            self.texts.append(text)
+            return super().embed_query(text)
+
+    counting = CountingEmbeddings()
+    embeddings = CachedEmbeddings(counting, namespace="test")
+
+    class EmbeddingRetriever(StaticRetriever):
+        def retrieve(self, query, category=None, k=6):
+            embeddings.embed_query(query)
+            return super().retrieve(query, category, k)
+
+    rag = RAGPipeline(
+        retriever=EmbeddingRetriever(make_docs()),
+        llm=fake_llm("Within 30 days."),
+        answer_cache=AnswerCache(embeddings, threshold=0.95, maxsize=8),
+    )
+    rag.run("How do I cancel my membership?", category="membership")
+
+    # Answer cache lookup + store and the vector search share one call
+    assert counting.texts == ["How do I cancel my membership?"]
+
+
+class SlowLLM:
+    def __init__(self, answer="Within 30 days.", error=None, delay=0.2):
+        self.answer = answer
+        self.error = error
+        self.delay = delay
+        self.calls = 0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return AIMessage(content=self.answer)
+
+    async def ainvoke(self, prompt):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return AIMessage(content=self.answer)
+
+
+def test_identical_inflight_queries_share_one_execution():
+    llm = SlowLLM()
+    rag = RAGPipeline(retriever=StaticRetriever(make_docs()), llm=llm)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda q: rag.run(q), ["How do I cancel?", "how do i  cancel?"] * 2))
+
+    assert llm.calls == 1
+    assert {r["answer"] for r in results} == {"Within 30 days."}
+    assert rag.inflight.stats() == {"leaders": 1, "followers": 3}
+
+    # Sequential calls are not coalesced
+    rag.run("How do I cancel?")
+    assert llm.calls == 2
+
+
+def test_coalesced_followers_receive_leader_error():
+    llm = SlowLLM(error=RuntimeError("rate limited"))
+    rag = RAGPipeline(retriever=StaticRetriever(make_docs()), llm=llm)
+
+    async def ask_all():
+        return await asyncio.gather(
+            *(rag.arun("How do I cancel?") for _ in range(3)),
+            return_exceptions=True
+        )
+
+    errors = asyncio.run(ask_all())
+
+    assert llm.calls == 1
+    assert all(isinstance(e, RuntimeError) and str(e) == "rate limited" for e in errors)
+
+
+def chunk(index, text, score, summary="", parent="p1"):
+    return Document(
+        page_content=text,
+        metadata={
+            "chunk_id": f"{parent}-{index}",
+            "parent_id": parent,
+            "chunk_index": index,
+            "document_name": "benefits",
+            "category": "membership",
+            "fused_score": score,
+            "summary": summary,
+        },
+    )
+
+
+def test_context_builder_dedupes_neighbours_and_falls_back_to_summaries():
+    shared = "members keep their discount for the whole year"
+    docs = [
+        chunk(1, f"{shared} and may add family members at any time", 0.5),
+        chunk(0, f"Gold membership includes free shipping; {shared}", 0.9),
+        chunk(5, "A long unrelated paragraph " * 20, 0.3, summary="Refunds take 5 days."),
+        chunk(9, "Another long paragraph " * 40, 0.1, summary="Fees are listed online."),
+    ]
+    builder = ContextBuilder(token_budget=70, full_chunks=2, count_tokens=lambda t: len(t.split()))
+
+    packed = builder.build(docs)
+
+    # Highest fused score first; the overlap is only sent once
+    assert packed.text.index("Gold membership") < packed.text.index("add family members")
+    assert packed.text.count(shared) == 1
+    assert packed.modes == {1: "full", 0: "trimmed", 2: "summary", 3: "summary"}
+    assert "Refunds take 5 days." in packed.text
+    assert packed.tokens <= 70
+
+    # A tighter budget drops what no longer fits
+    packed = ContextBuilder(token_budget=35, full_chunks=2, count_tokens=lambda t: len(t.split())).build(docs)
+    assert packed.modes[1] == "full"
+    assert "dropped" in packed.modes.values()
+
+
+def test_context_builder_follows_rerank_order():
+    docs = [
+        chunk(0, "fused favourite " * 10, 0.9, summary="Fused summary."),
+        chunk(4, "reranked favourite " * 10, 0.2, summary="Reranked summary."),
+        chunk(5, "neighbour of the reranked chunk", 0.2),
+    ]
+    docs[0].metadata["rerank_rank"] = 2
+    docs[1].metadata["rerank_rank"] = 1
+    docs[2].metadata["expanded_from"] = "p1-4"
+
+    packed = ContextBuilder(token_budget=60, full_chunks=1, count_tokens=lambda t: len(t.split())).build(docs)
+
+    # The cross-encoder's top chunk gets the full text; the fused favourite
+    # is demoted to its summary
+    assert packed.modes == {1: "full", 2: "full", 0: "summary"}
+    assert packed.text.index("reranked favourite") < packed.text.index("neighbour") < packed.text.index("Fused summary.")
+
+
+class BatchRetriever(StaticRetriever):
+    def retrieve_batch(self, queries, categories=None, k=6):
+        self.calls += 1
+        return [[] if "nothing" in q else self.docs[:k] for q in queries]
+
+
+class EchoBatchLLM:
+    """
+    llm.batch() stand-in: answers with the question, fails on "boom".
+    """
+
+    def __init__(self):
+        self.configs = []
+
+    def batch(self, prompts, config=None, return_exceptions=False):
+        self.configs.append(config)
+        answers = []
+        for prompt in prompts:
+            question = prompt.split("Question:")[1].split("Answer clearly")[0].strip()
+            answers.append(
+                RuntimeError("rate limited") if "boom" in question else AIMessage(content=f" {question} ")
+            )
+        return answers
+
+
+def test_run_batch_keeps_order_and_isolates_failures(monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_CHUNK_SIZE", 2)
+    retriever = BatchRetriever(make_docs())
+    llm = EchoBatchLLM()
+    rag = RAGPipeline(retriever=retriever, llm=llm)
+
+    results = list(rag.run_batch(["q1", "boom", "nothing here", "q4"], concurrency=3))
+
+    assert [r["answer"] for r in results] == [
+        "q1", "", RAGPipeline._no_results()["answer"], "q4"
+    ]
+    assert "rate limited" in results[1]["error"]
+    assert results[0]["documents"][0]["chunk_id"] == "m1"
+    # One retrieval + one generation batch per chunk
+    assert retriever.calls == 2
+    assert llm.configs == [{"max_concurrency": 3}] * 2
+
+
+def test_batch_resume_skips_answered_ids_and_partial_lines(monkeypatch, tmp_path):
+    output = tmp_path / "answers.jsonl"
+    original = (
+        '{"id": 1, "answer": "a"}\n{"id": 4, "error": "timeout"}\n{"answer": "no id"}\n'
+        '{"id": "q2", "answer": "b"}\n{"id": 3, "ans'
+    )
+    output.write_text(original, encoding="utf-8")
+
+    # Interrupted while rewriting: the answers already written survive
+    def interrupted(src, dst):
+        raise KeyboardInterrupt
+
+    with monkeypatch.context() as m:
+        m.setattr(os, "replace", interrupted)
+        with pytest.raises(KeyboardInterrupt):
+            completed_ids(str(output))
+    assert output.read_text(encoding="utf-8") == original
+    assert os.listdir(tmp_path) == ["answers.jsonl"]
+
+    # Failed ids are retried: their records are dropped with the partial line
+    assert completed_ids(str(output)) == {"1", "q2"}
+    assert output.read_text(encoding="utf-8") == '{"id": 1, "answer": "a"}\n{"id": "q2", "answer": "b"}\n'
+
+
+def test_trace_collects_stage_timings_and_exports_prometheus():
+    rag = RAGPipeline(retriever=StaticRetriever(make_docs()), llm=fake_llm("Within 30 days."))
+
+    with metrics.trace() as timings:
+        rag.run("How do I cancel?")
+
+    for stage in ("rag.request_s", "rag.retrieve_s", "rag.context_s", "rag.llm_s"):
+        assert timings[stage] >= 0
+    assert timings["rag.completion_tokens"] > 0
+
+    text = metrics.prometheus_text()
+    assert "# TYPE rag_llm_s histogram" in text
+    assert 'rag_llm_s_bucket{le="+Inf"}' in text
+
+
+def test_profiler_samples_the_calling_thread():
+    def busy():
+        deadline = time.perf_counter() + 0.1
+        while time.perf_counter() < deadline:
+            pass
+
+    with metrics.profile(interval_s=0.002) as profiler:
+        busy()
+
+    assert profiler.samples > 0
+    # Innermost frame of (almost) every sample: the busy loop
+    in_busy = sum(n for stack, n in profiler.stacks.items() if stack.endswith(":busy"))
+    assert in_busy / profiler.samples > 0.5
+
+    with metrics.profile(enabled=False) as disabled:
+        assert disabled is None
@@ -1,11 +1,54 @@
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import pytest
+
+from rag.benchmarks import suite
+from rag.benchmarks.corpus import generate_category_corpus
+from rag.embeddings import build_embedding_backend
+from rag.llm import build_chat_model
 from rag.rag_pipeline import RAGPipeline
+from rag.retrievers.context import RetrievalContext
+from rag.retrievers.production import ProductionRetriever
+from rag.retrievers.vectorstore import load_vectorstore
+from rag.settings import settings
+
+
+@pytest.fixture
+def offline_rag(monkeypatch, tmp_path):
+    """
+    RAGPipeline over a synthetic corpus ingested into tmp_path, with the
+    fake chat model and embeddings (no network, nothing left in storage/).
+    """
+    # configure() rewrites these; restore them after the test
+    for name in (
+        "LLM_BACKEND", "EMBED_BACKEND", "FAKE_LLM_LATENCY_MS", "FAKE_LLM_TOKEN_MS",
+        "FAKE_EMBED_LATENCY_MS", "CHROMA_DIR", "BM25_INDEX_DIR", "DENSE_INDEX_DIR",
+        "EMBED_CACHE_PATH", "SUMMARY_CACHE_PATH", "INGEST_MANIFEST_PATH", "ANSWER_CACHE_SIZE",
+        "INDEX_GENERATION_PATH",
+    ):
+        monkeypatch.setattr(settings, name, getattr(settings, name))
+    suite.configure(str(tmp_path), llm_ms=0, token_ms=0, embed_ms=0)
+
+    embeddings = build_embedding_backend()
+    data_dir = str(tmp_path / "data")
+    paths = generate_category_corpus(data_dir, files=8, pages_per_file=2)
+    suite.bench_ingest(data_dir, paths, embeddings, workers=1)
+
+    retriever = ProductionRetriever(
+        context=RetrievalContext(vectorstore=load_vectorstore(embeddings)),
+        reranker=None
+    )
+    return RAGPipeline(retriever=retriever, llm=build_chat_model())
 
-rag = RAGPipeline()
 
-result = rag.run(
-    query="what are the privacy policies?",
-    category="policies"
-)
+def test_rag_pipeline_answers_with_documents(offline_rag):
+    result = offline_rag.run(
+        query="what are the privacy policies?",
+        category="policies"
+    )
 
-print("\nANSWER:\n", result["answer"])
-print("\nDOCUMENTS:\n", result["documents"])
+    assert result["answer"]
+    assert result["documents"]
+    assert {d["category"] for d in result["documents"]} == {"policies"}
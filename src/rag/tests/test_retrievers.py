@@ -0,0 +1,555 @@
+import asyncio
+import gc
+import math
+import os
+import threading
+import time
+import weakref
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from langchain_core.documents import Document
+
+from rag import metrics
+from rag.agents import AgentSystem
+from rag.fakes import FakeEmbeddings
+from rag.retrievers.context import ContextHolder, IndexReloader, RetrievalContext, publish_generation
+from rag.retrievers.dense import DenseIndex, load_or_build_dense
+from rag.retrievers.fusion import fuse
+from rag.retrievers.sparse_bm25 import SparseBM25, load_or_build_bm25
+from rag.retrievers.vectorstore import load_vectorstore
+from rag.retrievers.production import ProductionRetriever
+from rag.retrievers.rerank import CrossEncoderReranker
+from rag.rag_pipeline import RAGPipeline
+from rag.settings import settings
+
+
+class InMemoryStore:
+    """
+    Minimal stand-in for the Chroma collection used at startup.
+    """
+
+    def __init__(self, documents, delay: float = 0.0):
+        self.documents = documents
+        self.delay = delay
+        self.get_calls = 0
+        self.fetched = []
+
+    def get(self, ids=None, include=None, **kwargs):
+        self.get_calls += 1
+        docs = [d for d in self.documents if ids is None or d.metadata["chunk_id"] in ids]
+        if include != []:
+            self.fetched.extend(d.metadata["chunk_id"] for d in docs)
+        return {
+            "ids": [d.metadata["chunk_id"] for d in docs],
+            "documents": [d.page_content for d in docs],
+            "metadatas": [d.metadata for d in docs],
+        }
+
+    def similarity_search_with_score(self, query, k=4, filter=None):
+        hits = [
+            d for d in self.documents
+            if not filter or d.metadata.get("category") == filter.get("category")
+        ][:k]
+        return [(d, float(i)) for i, d in enumerate(hits)]
+
+    async def asimilarity_search_with_score(self, query, k=4, filter=None):
+        await asyncio.sleep(self.delay)
+        return self.similarity_search_with_score(query, k=k, filter=filter)
+
+
+def make_corpus():
+    texts = {
+        "policies": "privacy policy data retention consent",
+        "medical": "medical records processing clinical data",
+        "device": "device accuracy sensor calibration",
+        "membership": "membership benefits discounts renewal",
+    }
+    return [
+        Document(
+            page_content=text,
+            metadata={"category": cat, "chunk_id": f"{cat}-0", "document_name": f"{cat}.pdf"}
+        )
+        for cat, text in texts.items()
+    ]
+
+
+def test_agents_share_one_retrieval_context(monkeypatch, tmp_path):
+    # Router builds the pooled client; no request is ever sent
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", settings.OPENAI_API_KEY or "sk-test")
+    monkeypatch.setattr(settings, "BM25_INDEX_DIR", str(tmp_path))
+
+    store = InMemoryStore(make_corpus())
+    context = RetrievalContext(vectorstore=store)
+
+    rag = RAGPipeline(retriever=ProductionRetriever(context=context), llm=object())
+    system = AgentSystem(rag=rag)
+
+    retrievers = {id(a.rag.retriever.context) for a in system.router.agents.values()}
+
+    assert retrievers == {id(context)}
+    assert store.get_calls == 1
+
+
+def test_sharded_bm25_filtered_query_fills_k():
+    # Many "policies" chunks outrank every "device" chunk for this query
+    docs = [
+        Document(page_content=f"data privacy data policy {i}", metadata={"category": "policies", "chunk_id": f"p{i}"})
+        for i in range(10)
+    ] + [
+        Document(page_content=f"device data sheet {i}", metadata={"category": "device", "chunk_id": f"d{i}"})
+        for i in range(4)
+    ]
+    ids = [d.metadata["chunk_id"] for d in docs]
+    bm25 = SparseBM25.build(docs, ids, shard_fields=("category",))
+
+    filtered = bm25.search("data privacy", k=3, filters={"category": "device"})
+    assert len(filtered) == 3
+    assert all(d.metadata["category"] == "device" for d, _ in filtered)
+
+    merged = bm25.search("data privacy", k=3)
+    assert [d.metadata["category"] for d, _ in merged] == ["policies"] * 3
+    assert [s for _, s in merged] == sorted((s for _, s in merged), reverse=True)
+
+
+def test_sparse_bm25_persists_and_invalidates(tmp_path):
+    docs = make_corpus()
+    ids = [d.metadata["chunk_id"] for d in docs]
+
+    built = load_or_build_bm25(docs, ids, index_dir=str(tmp_path))
+    loaded = load_or_build_bm25(docs, ids, index_dir=str(tmp_path))
+
+    # Second load is memory-mapped (read-only) from disk, not rebuilt
+    assert not loaded.weights.data.flags.writeable
+    assert [
+        (d.metadata["chunk_id"], round(s, 5)) for d, s in built.search("privacy data", k=4)
+    ] == [
+        (d.metadata["chunk_id"], round(s, 5)) for d, s in loaded.search("privacy data", k=4)
+    ]
+
+    # A changed collection invalidates the persisted index
+    extra = Document(page_content="privacy notice", metadata={"category": "policies", "chunk_id": "policies-1"})
+    rebuilt = load_or_build_bm25(docs + [extra], ids + ["policies-1"], index_dir=str(tmp_path))
+
+    assert rebuilt.weights.data.flags.writeable
+    assert "policies-1" in rebuilt.doc_ids
+
+
+def test_concurrent_builders_build_the_index_once(monkeypatch, tmp_path):
+    docs = make_corpus()
+    ids = [d.metadata["chunk_id"] for d in docs]
+    builds = []
+    build = SparseBM25.build.__func__
+
+    def slow_build(cls, *args, **kwargs):
+        builds.append(1)
+        time.sleep(0.1)
+        return build(cls, *args, **kwargs)
+
+    monkeypatch.setattr(SparseBM25, "build", classmethod(slow_build))
+
+    # Like API workers starting together on the same collection
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        indexes = list(pool.map(
+            lambda _: load_or_build_bm25(docs, ids, index_dir=str(tmp_path)), range(4)
+        ))
+
+    assert len(builds) == 1
+    assert sum(index.weights.data.flags.writeable for index in indexes) == 1
+    assert not [name for name in os.listdir(tmp_path / indexes[0].fingerprint[:16]) if name.endswith(".tmp")]
+
+
+def test_aretrieve_degrades_to_bm25_when_vector_leg_times_out(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "BM25_INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "VECTOR_TIMEOUT_S", 0.05)
+
+    store = InMemoryStore(make_corpus(), delay=1.0)
+    retriever = ProductionRetriever(context=RetrievalContext(vectorstore=store))
+
+    docs = asyncio.run(retriever.aretrieve("device calibration", k=2))
+
+    assert [d.metadata["chunk_id"] for d in docs] == ["device-0"]
+
+
+def test_async_dense_search_runs_off_the_event_loop(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "BM25_INDEX_DIR", str(tmp_path))
+    store = InMemoryStore(make_corpus())
+    store.embeddings = FakeEmbeddings(dim=8)
+    retriever = ProductionRetriever(context=RetrievalContext(vectorstore=store))
+
+    threads = []
+
+    class RecordingDense:
+        def search(self, vector, k, filters=None, ef=64):
+            threads.append(threading.current_thread().name)
+            return []
+
+    retriever.context.dense = RecordingDense()
+    asyncio.run(retriever._avector_search("device calibration", 2, {}))
+
+    assert threads and threads[0].startswith("retrieval")
+
+
+def test_rrf_promotes_hits_found_by_both_legs():
+    a, b, c = (
+        Document(page_content=text, metadata={"chunk_id": uid})
+        for text, uid in [("a", "a"), ("b", "b"), ("c", "c")]
+    )
+    # No chunk_id: deduplicated by content hash instead of being dropped
+    orphan = Document(page_content="orphan", metadata={"source": "x.pdf"})
+
+    fused = fuse(
+        {"vector": [(a, 0.9), (b, 0.8)], "bm25": [(orphan, 7.0), (b, 5.0), (c, 1.0)]},
+        k=3,
+        weights={"vector": 1.0, "bm25": 1.0}
+    )
+
+    assert fused[0].metadata["chunk_id"] == "b"
+    assert fused[0].metadata["vector_rank"] == 2
+    assert fused[0].metadata["bm25_rank"] == 2
+    assert fused[0].metadata["fused_score"] > fused[1].metadata["fused_score"]
+    assert any(d.page_content == "orphan" for d in fused)
+    # Snapshot documents are never mutated
+    assert "fused_score" not in b.metadata
+
+
+def test_top_hit_is_expanded_with_neighbours_from_snapshot(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "BM25_INDEX_DIR", str(tmp_path))
+    words = ["warranty terms", "battery care", "sensor calibration steps", "firmware updates", "returns"]
+    chunks = [
+        Document(
+            page_content=text,
+            metadata={"category": "device", "chunk_id": f"d-{i}", "parent_id": "manual", "chunk_index": i},
+        )
+        for i, text in enumerate(words)
+    ]
+    # Vector stand-in returns documents in list order: put the match first
+    store = InMemoryStore([chunks[2]] + chunks[:2] + chunks[3:] + make_corpus())
+    retriever = ProductionRetriever(context=RetrievalContext(vectorstore=store))
+
+    docs = retriever.retrieve("sensor calibration", category="device", k=1, expand=2)
+
+    assert [d.metadata["chunk_id"] for d in docs] == ["d-2", "d-1", "d-3"]
+    assert docs[1].metadata["expanded_from"] == "d-2"
+    assert docs[1].metadata["fused_score"] == docs[0].metadata["fused_score"]
+    assert store.get_calls == 1
+
+    # Budget caps the expansion; 0 turns it off
+    assert len(retriever.retrieve("sensor calibration", category="device", k=1, expand=1)) == 2
+    assert len(retriever.retrieve("sensor calibration", category="device", k=1, expand=0)) == 1
+
+
+class BatchStore(InMemoryStore):
+    """
+    InMemoryStore with the embedding function and raw collection query
+    that retrieve_batch() uses.
+    """
+
+    embeddings = FakeEmbeddings(dim=8)
+
+    @property
+    def _collection(self):
+        return SimpleNamespace(query=self.query)
+
+    def query(self, query_embeddings, n_results, where=None, include=None):
+        hits = self.similarity_search_with_score("", k=n_results, filter=where)
+        return {
+            field: [values] * len(query_embeddings)
+            for field, values in {
+                "ids": [d.metadata["chunk_id"] for d, _ in hits],
+                "documents": [d.page_content for d, _ in hits],
+                "metadatas": [d.metadata for d, _ in hits],
+                "distances": [distance for _, distance in hits],
+            }.items()
+        }
+
+
+def test_retrieve_batch_traces_the_bm25_leg(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "BM25_INDEX_DIR", str(tmp_path))
+    retriever = ProductionRetriever(context=RetrievalContext(vectorstore=BatchStore(make_corpus())))
+    queries = ["sensor calibration", "membership renewal"]
+
+    with metrics.trace() as timings:
+        batched = retriever.retrieve_batch(queries, categories=[None, "membership"], k=2, expand=0)
+
+    # The BM25 leg runs on the executor and still reports to the caller
+    assert "rag.bm25_s" in timings
+    assert [[d.metadata["chunk_id"] for d in docs] for docs in batched] == [
+        [d.metadata["chunk_id"] for d in retriever.retrieve(query, category=category, k=2, expand=0)]
+        for query, category in zip(queries, [None, "membership"])
+    ]
+
+
+def test_retrieve_only_reports_stages_without_generating(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "BM25_INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "ANSWER_CACHE_SIZE", 0)
+
+    store = InMemoryStore(make_corpus())
+    retriever = ProductionRetriever(context=RetrievalContext(vectorstore=store))
+    # Any LLM call would fail: object() has no invoke()
+    rag = RAGPipeline(retriever=retriever, llm=object())
+
+    report = rag.retrieve_only("device sensor calibration", category="device", k=2, expand=0)
+
+    assert [d["chunk_id"] for d in report["documents"]] == ["device-0"]
+    # Same fusion as the answering path
+    retrieved = retriever.retrieve("device sensor calibration", category="device", k=2, expand=0)
+    assert report["documents"][0]["fused_score"] == retrieved[0].metadata["fused_score"]
+    assert report["vector"][0]["rank"] == 1 and report["bm25"][0]["chunk_id"] == "device-0"
+    assert "device accuracy sensor calibration" in report["context"]
+    for stage in ("rag.retrieve_s", "rag.vector_s", "rag.bm25_s", "rag.merge_s", "rag.context_s"):
+        assert stage in report["timings"]
+
+    # The category filter removed the other categories' unfiltered hits
+    effect = report["filter_effect"]
+    assert effect["eligible"] == 1 and effect["corpus"] == 4
+    assert {row["category"] for row in effect["excluded"]} == {"policies", "medical", "membership"}
+    assert all(("distance" in row) == (row["leg"] == "vector") for row in effect["excluded"])
+
+    # The re-run legs stay out of the serving latency histograms
+    counts = [metrics.get_metric(name).count for name in ("rag.vector_s", "rag.bm25_s")]
+    retriever.filter_effect("device sensor calibration", {"category": "device"}, 4)
+    assert [metrics.get_metric(name).count for name in ("rag.vector_s", "rag.bm25_s")] == counts
+
+    assert rag.retrieve_only("device sensor calibration", k=2)["filter_effect"] is None
+
+
+def test_dense_index_matches_exact_search_and_filters(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(400, 32)).astype(np.float32)
+    categories = ["policies", "medical", "device", "membership"]
+    docs = [
+        Document(page_content=f"chunk {i}", metadata={"chunk_id": f"c{i}", "category": categories[i % 4]})
+        for i in range(len(vectors))
+    ]
+    ids = [d.metadata["chunk_id"] for d in docs]
+    query = rng.normal(size=32).astype(np.float32)
+
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    exact = [f"c{i}" for i in np.argsort(-(unit @ query))[:10]]
+
+    for dtype in ("float16", "int8"):
+        index = DenseIndex.build(docs, ids, vectors, dtype=dtype, signature="test:model")
+        index.save(str(tmp_path / dtype))
+        loaded = DenseIndex.load(str(tmp_path / dtype), dict(zip(ids, docs)))
+
+        hits = loaded.search(query, k=10)
+        found = [d.metadata["chunk_id"] for d, _ in hits]
+        assert len(set(found) & set(exact)) >= 9
+        assert all(a <= b for (_, a), (_, b) in zip(hits, hits[1:]))
+        assert isinstance(loaded.vectors, np.memmap)
+
+        filtered = loaded.search(query, k=5, filters={"category": "device"})
+        assert len(filtered) == 5
+        assert {d.metadata["category"] for d, _ in filtered} == {"device"}
+
+    assert DenseIndex.load(str(tmp_path / "int8"), {}) is None
+
+
+def reference_bm25(docs, query, k, category=None, k1=1.5, b=0.75):
+    """
+    Textbook BM25 over whitespace tokens, one document at a time.
+    """
+    tokenized = [d.page_content.split() for d in docs]
+    avgdl = sum(map(len, tokenized)) / len(tokenized)
+    hits = []
+    for doc, terms in zip(docs, tokenized):
+        if category and doc.metadata["category"] != category:
+            continue
+        score = 0.0
+        for term in query.split():
+            tf = terms.count(term)
+            if tf:
+                df = sum(term in t for t in tokenized)
+                idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+                score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(terms) / avgdl))
+        if score > 0:
+            hits.append((doc.metadata["chunk_id"], round(score, 4)))
+    return sorted(hits, key=lambda hit: -hit[1])[:k]
+
+
+def test_batch_search_matches_reference_scores():
+    docs = [
+        Document(page_content=text, metadata={"chunk_id": f"c{i}", "category": cat})
+        for i, (text, cat) in enumerate([
+            ("privacy policy data retention", "policies"),
+            ("medical data processing", "medical"),
+            ("device sensor data calibration", "device"),
+            ("device battery policy", "device"),
+        ])
+    ]
+    ids = [d.metadata["chunk_id"] for d in docs]
+    queries = ["data policy", "unknown words", "device calibration data"]
+
+    bm25 = SparseBM25.build(docs, ids, shard_fields=("category",))
+    for category in (None, "device"):
+        filters = {"category": category} if category else None
+        batched = bm25.search_batch(queries, k=2, filters=filters)
+        assert [[(d.metadata["chunk_id"], round(s, 4)) for d, s in hits] for hits in batched] == [
+            reference_bm25(docs, q, k=2, category=category) for q in queries
+        ]
+    assert batched[1] == []
+
+    # Dense: squared L2 between unit vectors, device rows only
+    rng = np.random.default_rng(0)
+    matrix = rng.normal(size=(4, 8)).astype(np.float32)
+    index = DenseIndex.build(docs, ids, matrix)
+    vectors = rng.normal(size=(3, 8)).astype(np.float32)
+    batched = index.search_batch(vectors, k=2, filters={"category": "device"})
+
+    unit = matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+    for query, hits in zip(vectors, batched):
+        distances = 2 - 2 * unit[[2, 3]] @ (query / np.linalg.norm(query))
+        expected = sorted(zip(["c2", "c3"], distances), key=lambda pair: pair[1])
+        assert [d.metadata["chunk_id"] for d, _ in hits] == [uid for uid, _ in expected]
+        assert np.allclose([s for _, s in hits], [s for _, s in expected], atol=1e-2)
+
+
+class OverlapScorer:
+    """
+    Stand-in cross-encoder: score = shared words, optionally slow.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.pairs = 0
+
+    def __call__(self, pairs):
+        time.sleep(self.delay)
+        self.pairs += len(pairs)
+        return [len(set(q.split()) & set(text.split())) for q, text in pairs]
+
+
+def test_reranker_reorders_within_budget_and_caches_scores(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "BM25_INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "RERANK_CANDIDATES", 4)
+    monkeypatch.setattr(settings, "RERANK_TOP_N", 2)
+    scorer = OverlapScorer()
+    reranker = CrossEncoderReranker(batch_size=2, budget_s=1.0, scorer=scorer)
+
+    store = InMemoryStore(make_corpus())
+    retriever = ProductionRetriever(context=RetrievalContext(vectorstore=store), reranker=reranker)
+
+    docs = retriever.retrieve("device sensor calibration", k=6, expand=0)
+
+    # Candidates come from the over-retrieved pool, only the top few survive
+    assert [d.metadata["chunk_id"] for d in docs][0] == "device-0"
+    assert len(docs) == 2
+    assert docs[0].metadata["rerank_score"] == 3
+    assert scorer.pairs == 4
+
+    retriever.retrieve("device sensor calibration", k=6, expand=0)
+    assert scorer.pairs == 4
+    assert reranker.stats()["cache"]["hits"] == 4
+
+    # Over budget: only the first batch is scored, the rest keep fused order
+    slow = CrossEncoderReranker(batch_size=1, budget_s=0.05, scorer=OverlapScorer(delay=0.04))
+    fused = [Document(page_content=t, metadata={"chunk_id": t}) for t in ["a", "b c", "c"]]
+    reranked = slow.rerank("c", fused, top_n=3)
+    assert [d.metadata["rerank_score"] for d in reranked] == [0, None, None]
+    assert slow.stats()["budget_exhausted"] == 1
+
+
+def test_hot_reload_swaps_generation_and_fetches_only_new_chunks(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "BM25_INDEX_DIR", str(tmp_path / "bm25"))
+    monkeypatch.setattr(settings, "INDEX_GENERATION_PATH", str(tmp_path / "generation.json"))
+    monkeypatch.setattr(settings, "ANSWER_CACHE_SIZE", 0)
+    store = InMemoryStore(make_corpus())
+    holder = ContextHolder(RetrievalContext(vectorstore=store))
+    retriever = ProductionRetriever(holder=holder)
+
+    # Ingestion adds a chunk, drops another and publishes a generation;
+    # the reload opens a fresh client that sees it
+    warranty = Document(
+        page_content="device warranty coverage",
+        metadata={"category": "device", "chunk_id": "device-1", "document_name": "device.pdf"}
+    )
+    fresh = InMemoryStore([d for d in make_corpus() if d.metadata["chunk_id"] != "policies-0"] + [warranty])
+    reloader = IndexReloader(holder, settings.INDEX_GENERATION_PATH, interval_s=0, load_fn=lambda: fresh)
+
+    assert not reloader.check()
+    publish_generation(settings.INDEX_GENERATION_PATH)
+
+    with holder.pin() as old:
+        assert reloader.check()
+        # A query already running stays on its generation
+        in_flight = retriever.retrieve("warranty coverage", k=5, expand=0)
+        assert retriever.context is old
+        assert old.vectorstore is store
+
+    # The old generation drops its client once nothing has it pinned
+    assert old.vectorstore is None
+    assert "device-1" not in {d.metadata["chunk_id"] for d in in_flight}
+
+    live = holder.latest
+    assert live is not old and live.generation == 1
+    assert (live.added, live.removed) == (["device-1"], ["policies-0"])
+    # Unchanged chunks came from the old snapshot
+    assert fresh.fetched == ["device-1"]
+
+    docs = retriever.retrieve("warranty coverage", k=5, expand=0)
+    assert docs[0].metadata["chunk_id"] == "device-1"
+    assert "policies-0" not in {d.metadata["chunk_id"] for d in docs}
+    assert not reloader.check()
+
+
+def test_fresh_chroma_clients_release_the_replaced_system(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "CHROMA_DIR", str(tmp_path / "chroma"))
+    embeddings = FakeEmbeddings(dim=8)
+
+    first = load_vectorstore(embeddings)
+    first.add_texts(["privacy policy"], ids=["p1"])
+    released = []
+
+    # Two hot reloads: each fresh client sees the data, and the System
+    # behind the client it replaced is freed once that client is dropped
+    for generation in range(2):
+        fresh = load_vectorstore(embeddings, fresh=True)
+        assert fresh._client is not first._client
+        assert first._collection.count() == fresh._collection.count() == 1
+
+        replaced = weakref.ref(first._client._server)
+        del first
+        gc.collect()
+        released.append(replaced() is None)
+        first = fresh
+
+    assert released == [True, True]
+
+
+def test_dense_rebuild_reuses_rows_of_previous_index(tmp_path):
+    class VectorStore:
+        def __init__(self, vectors):
+            self.vectors = vectors
+            self.requested = []
+
+        def get(self, ids=None, include=None):
+            ids = ids if ids is not None else list(self.vectors)
+            self.requested.append(list(ids))
+            found = [uid for uid in ids if uid in self.vectors]
+            return {"ids": found, "embeddings": [self.vectors[uid] for uid in found]}
+
+    rng = np.random.default_rng(0)
+    docs = make_corpus()
+    ids = [d.metadata["chunk_id"] for d in docs]
+    store = VectorStore({uid: rng.normal(size=8).tolist() for uid in ids})
+
+    previous = load_or_build_dense(store, docs[:3], ids[:3], index_dir=str(tmp_path))
+    store.requested.clear()
+
+    index = load_or_build_dense(store, docs, ids, index_dir=str(tmp_path), previous=previous)
+
+    assert store.requested == [[ids[3]]]
+    query = store.vectors[ids[1]]
+    assert index.search(query, 1, {})[0][0].metadata["chunk_id"] == ids[1]
+    # Each collection version has its own directory; older ones are pruned
+    assert len([p for p in tmp_path.iterdir() if p.is_dir()]) == 1
+
+    # A chunk deleted between the snapshot and the fetch is left out
+    late = Document(page_content="late chunk", metadata={"category": "device", "chunk_id": "device-9"})
+    index = load_or_build_dense(
+        store, docs + [late], ids + ["device-9"], index_dir=str(tmp_path / "late"), previous=index
+    )
+    assert list(index.doc_ids) == ids
+    assert index.search(query, 1, {"category": "device"})[0][0].metadata["chunk_id"] == "device-0"
@@ -0,0 +1,71 @@
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from rag.cache import LRUCache
+from rag.routing import CentroidClassifier, normalize_query
+
+
+AXES = {"privacy": 0, "medical": 1, "device": 2, "membership": 3}
+
+
+class KeywordEmbeddings(Embeddings):
+    """
+    Deterministic 4-d embeddings: one axis per topic keyword.
+    """
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = [0.01] * len(AXES)
+        for word, axis in AXES.items():
+            if word in text.lower():
+                vector[axis] += 1.0
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(t) for t in texts]
+
+
+class EmbeddingStore:
+    def __init__(self, chunks):
+        self.embeddings = KeywordEmbeddings()
+        self.chunks = chunks
+
+    def get(self, include=None):
+        return {
+            "embeddings": self.embeddings.embed_documents([text for text, _ in self.chunks]),
+            "metadatas": [{"category": cat} for _, cat in self.chunks],
+        }
+
+
+def test_centroid_classifier_routes_and_reports_confidence():
+    store = EmbeddingStore([
+        ("privacy notice", "Policies"),
+        ("medical records", "medical"),
+        ("device manual", "device"),
+        ("membership plans", "membership"),
+        ("unrelated", "archive"),
+    ])
+    classifier = CentroidClassifier.from_vectorstore(
+        store, categories=["policies", "medical", "device", "membership"]
+    )
+
+    category, confidence = classifier.classify("Is my medical history shared?")
+    assert category == "medical"
+    assert confidence > 0.9
+
+    # Nothing to go on: low confidence, so the router would ask the LLM
+    _, confidence = classifier.classify("hello there")
+    assert confidence < 0.5
+
+
+def test_lru_cache_evicts_and_counts():
+    cache = LRUCache(maxsize=2)
+    cache.set(normalize_query("  What is  the Policy? "), "policies")
+    cache.set("b", "device")
+    cache.get("what is the policy?")
+    cache.set("c", "medical")
+
+    assert cache.get("b") is None
+    assert cache.get("what is the policy?") == "policies"
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
@@ -1,5 +1,7 @@
 import streamlit as st
 
+from rag import metrics
+from rag.settings import settings
 from rag.tracing import init_tracing
 from rag.rag_pipeline import RAGPipeline
 from rag.agents import AgentSystem
@@ -29,7 +31,8 @@ def load_rag():
 
 @st.cache_resource
 def load_agents():
-    return AgentSystem()
+    # Agents borrow the debugger pipeline (one shared retrieval context)
+    return AgentSystem(rag=load_rag())
 
 rag = load_rag()
 agent_system = load_agents()
@@ -42,6 +45,10 @@ mode = st.sidebar.radio(
     ["Chat Assistant", "Retrieval Debugger"]
 )
 
+# The retriever follows hot index reloads; no restart after an ingest
+live = rag.retriever.context
+st.sidebar.caption(f"📚 Index generation {live.generation} · {len(live.documents)} chunks")
+
 category = st.sidebar.selectbox(
     "Optional category filter",
     options=[None, "policies", "medical", "device", "membership"],
@@ -56,6 +63,10 @@ if mode == "Chat Assistant":
     if "messages" not in st.session_state:
         st.session_state["messages"] = []
 
+    for msg in st.session_state["messages"]:
+        with st.chat_message(msg["role"]):
+            st.write(msg["content"])
+
     user_query = st.chat_input("Ask a question...")
 
     if user_query:
@@ -63,16 +74,30 @@ if mode == "Chat Assistant":
             {"role": "user", "content": user_query}
         )
 
-        result = agent_system.run(user_query)
+        with st.chat_message("user"):
+            st.write(user_query)
+
+        with st.chat_message("assistant"):
+            sources = st.empty()
+
+            def answer_tokens():
+                # Sources arrive before the first answer token
+                for event in agent_system.stream(user_query):
+                    if event["type"] == "sources" and event["documents"]:
+                        names = sorted({
+                            meta.get("document_name", meta.get("file_name"))
+                            for meta in event["documents"]
+                        })
+                        sources.caption("📄 Sources: " + ", ".join(map(str, names)))
+                    elif event["type"] == "token":
+                        yield event["content"]
+
+            answer = st.write_stream(answer_tokens())
 
         st.session_state["messages"].append(
-            {"role": "assistant", "content": result["answer"]}
+            {"role": "assistant", "content": answer}
         )
 
-    for msg in st.session_state["messages"]:
-        with st.chat_message(msg["role"]):
-            st.write(msg["content"])
-
 
 # Retrieval Debugger Mode (Raw RAG)
 else:
@@ -83,20 +108,136 @@ else:
         placeholder="e.g. What is the privacy policy?"
     )
 
-    if st.button("Run Debugger") and query:
-        result = rag.run(query=query, category=category)
+    col_k, col_vector, col_bm25, col_expand = st.columns(4)
+    k = col_k.slider("k", 1, 20, 6)
+    vector_weight = col_vector.number_input("Vector weight", 0.0, 5.0, settings.FUSION_VECTOR_WEIGHT, 0.1)
+    bm25_weight = col_bm25.number_input("BM25 weight", 0.0, 5.0, settings.FUSION_BM25_WEIGHT, 0.1)
+    expand = col_expand.number_input("Neighbours", 0, 10, settings.NEIGHBOUR_BUDGET)
+
+    # Generation costs an LLM call per run: opt-in
+    generate = st.checkbox("Generate answer", value=False)
+    profile_query = st.checkbox("Profile this query", value=False)
 
-        st.subheader("🧠 Answer")
-        st.info(result["answer"])
+    # Runs survive reruns: (query, category, k, weights, expand) -> report
+    runs = st.session_state.setdefault("debug_runs", {})
+    run_key = (query, category, k, vector_weight, bm25_weight, expand)
+
+    if st.button("Run Debugger") and query:
+        with metrics.profile(
+            enabled=profile_query,
+            interval_s=settings.PROFILE_INTERVAL_MS / 1000
+        ) as profiler:
+            report = rag.retrieve_only(
+                query=query,
+                category=category,
+                k=k,
+                weights={"vector": vector_weight, "bm25": bm25_weight},
+                expand=int(expand)
+            )
+            if generate:
+                with metrics.trace() as generation:
+                    report["answer"] = rag.answer_context(query, report["context"])
+                report["timings"].update(generation)
+
+        if profiler is not None:
+            report["profile"] = {
+                "samples": profiler.samples,
+                "top": profiler.top(),
+                "folded": profiler.folded(),
+            }
+        runs[run_key] = report
+
+    report = runs.get(run_key)
+
+    if report is not None:
+        if report.get("answer"):
+            st.subheader("🧠 Answer")
+            st.info(report["answer"])
+
+        st.subheader("⏱️ Timings")
+        st.table([
+            {"stage": name, "ms": round(value * 1000, 1)}
+            for name, value in report["timings"].items() if name.endswith("_s")
+        ])
+        st.caption(f"Packed context: {report['context_tokens']} tokens")
+
+        if report.get("profile"):
+            with st.expander(f"🔬 Profile ({report['profile']['samples']} samples)"):
+                st.table([
+                    {"function": frame, "share": f"{share:.0%}"}
+                    for frame, share in report["profile"]["top"]
+                ])
+                st.download_button("Folded stacks", report["profile"]["folded"], file_name="profile.folded")
+
+        st.subheader("🧮 Candidates")
+        col_v, col_b = st.columns(2)
+        col_v.caption(f"Vector (top {report['candidates']}, distance: lower is better)")
+        col_v.dataframe([{field: value for field, value in row.items() if field != "preview"} for row in report["vector"]])
+        col_b.caption(f"BM25 (top {report['candidates']})")
+        col_b.dataframe([{field: value for field, value in row.items() if field != "preview"} for row in report["bm25"]])
+
+        with st.expander(f"Fused pool ({len(report['fused'])})"):
+            st.dataframe([
+                {
+                    "chunk_id": meta.get("chunk_id"),
+                    "fused_score": meta.get("fused_score"),
+                    "vector_rank": meta.get("vector_rank"),
+                    "bm25_rank": meta.get("bm25_rank"),
+                }
+                for meta in report["fused"]
+            ])
+
+        effect = report.get("filter_effect")
+        if effect is not None:
+            with st.expander(f"🚫 Filter {report['filters']}: {effect['eligible']}/{effect['corpus']} chunks eligible"):
+                if effect["excluded"]:
+                    st.write("Unfiltered hits removed by the filter:")
+                    st.dataframe([{field: value for field, value in row.items() if field != "preview"} for row in effect["excluded"]])
+                else:
+                    st.write("The filter removed none of the unfiltered top hits.")
 
         st.subheader("📄 Retrieved Chunks")
 
-        if not result["documents"]:
+        if not report["documents"]:
             st.warning("No documents retrieved.")
         else:
-            for i, meta in enumerate(result["documents"], 1):
+            for i, meta in enumerate(report["documents"], 1):
                 with st.expander(
-                    f"Chunk {i} — {meta['document_name']}"
+                    f"Chunk {i} — {meta.get('document_name', meta.get('file_name'))}"
                 ):
                     st.write(f"**Category:** {meta['category']}")
-                    st.write(f"**Chunk ID:** {meta['chunk_id']}")
+                    st.write(f"**Chunk ID:** {meta.get('chunk_id')}")
+                    st.write(f"**Fused score:** {meta.get('fused_score', 0):.4f}")
+                    if meta.get("rerank_rank") is not None:
+                        st.write(
+                            f"**Rerank:** #{meta['rerank_rank']} "
+                            f"(score {meta.get('rerank_score', '—')})"
+                        )
+                    st.write(f"**In context as:** {meta.get('context_mode', '—')}")
+                    if meta.get("expanded_from"):
+                        st.write(f"**Neighbour of:** {meta['expanded_from']}")
+                    st.write(
+                        f"**Vector rank:** {meta.get('vector_rank', '—')} "
+                        f"(distance {meta.get('vector_distance', '—')}) | "
+                        f"**BM25 rank:** {meta.get('bm25_rank', '—')} "
+                        f"(score {meta.get('bm25_score', '—')})"
+                    )
+
+    # Side-by-side: every cached run of this query, one column per setting
+    compared = [(key, runs[key]) for key in runs if key[0] == query and key[1] == category]
+    if len(compared) > 1:
+        st.subheader("🆚 Settings Comparison")
+        if st.button("Clear comparison"):
+            for key, _ in compared:
+                runs.pop(key)
+            st.rerun()
+
+        for column, ((_, _, run_k, run_vector, run_bm25, run_expand), run) in zip(
+            st.columns(len(compared)), compared
+        ):
+            column.markdown(f"**k={run_k}, vector={run_vector}, bm25={run_bm25}, neighbours={run_expand}**")
+            column.caption(f"{run['timings'].get('rag.retrieve_s', 0) * 1000:.0f} ms retrieval")
+            column.table([
+                {"#": i, "chunk_id": meta.get("chunk_id")}
+                for i, meta in enumerate(run["documents"], 1)
+            ])